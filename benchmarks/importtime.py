@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""
+Checks that ``import chump`` stays cheap: that it doesn't import the
+transport, (``ssl``, ``http.client`` and ``urllib.request``), or probe for
+timezone libraries, exiting non-zero if it does. How long it takes, as
+measured by ``python -X importtime``, is reported, split between chump's
+own modules and what they import. Wall time depends on the machine, so
+it's only checked against a budget if one's given, (``tests/test_importtime.py``
+checks both, against a generous budget):
+	
+	$ python benchmarks/importtime.py
+	$ python benchmarks/importtime.py --budget 40
+
+"""
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import argparse
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RUNS = 5
+
+# Modules that must wait for a request or a datetime to be imported.
+DEFERRED = (
+	'ssl',
+	'http.client',
+	'httplib',
+	'urllib.request',
+	'urllib2',
+	'email.utils',
+	'pytz',
+	'dateutil',
+	'chump.connection_pool',
+	'chump.callback',
+	'chump.metrics',
+	'chump.attachment',
+)
+
+
+def measure():
+	"""
+	Returns a :py:obj:`tuple` of (``microseconds``, ``modules``) for a fresh
+	interpreter to ``import chump``, where ``modules`` is a :py:obj:`list`
+	of (``name``, ``self_microseconds``) for those it imported.
+	
+	"""
+	
+	environment = dict(os.environ, PYTHONPATH=ROOT)
+	environment.pop('PYTHONDONTWRITEBYTECODE', None)
+	
+	output = subprocess.check_output(
+		[sys.executable, '-X', 'importtime', '-c', 'import chump'],
+		stderr=subprocess.STDOUT,
+		env=environment,
+	).decode('utf-8')
+	
+	modules = []
+	microseconds = None
+	
+	for line in output.splitlines():
+		if not line.startswith('import time:') or 'self [us]' in line:
+			continue
+		
+		own, cumulative, name = line[len('import time:'):].split('|')
+		modules.append((name.strip(), int(own)))
+		
+		if name.strip() == 'chump':
+			microseconds = int(cumulative)
+	
+	return microseconds, modules
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+	parser.add_argument('--budget', type=float, help='milliseconds import chump may take (default: not checked)')
+	args = parser.parse_args()
+	
+	# Once to write bytecode, so compiling isn't measured.
+	measure()
+	
+	results = [measure() for _ in range(RUNS)]
+	microseconds, modules = min(results, key=lambda result: result[0])
+	milliseconds = microseconds / 1000
+	own = sum(self_microseconds for name, self_microseconds in modules if name == 'chump' or name.startswith('chump.')) / 1000
+	deferred = sorted(set(name for name, _ in modules) & set(DEFERRED))
+	
+	print('import chump: {milliseconds:.1f}ms ({own:.1f}ms in chump, {dependencies:.1f}ms in what it imports){budget}, {count} modules'.format(
+		milliseconds=milliseconds,
+		own=own,
+		dependencies=milliseconds - own,
+		budget='' if args.budget is None else ' (budget {budget:.1f}ms)'.format(budget=args.budget),
+		count=len(modules),
+	))
+	
+	if deferred:
+		print('Imported eagerly: {modules}'.format(modules=', '.join(deferred)))
+	
+	if deferred or (args.budget is not None and milliseconds > args.budget):
+		sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""
+Measures the memory held per message, counting the message, its attributes,
+and anything they hold, but not the :class:`~chump.User` or
+:class:`~chump.Application` shared between messages.
+
+	$ python benchmarks/memory.py
+
+"""
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import os
+import sys
+
+try: from urllib.parse import parse_qsl # Python 3
+except ImportError: from urlparse import parse_qsl # Python 2
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import chump
+
+
+COUNT = 10000
+SCALARS = (type(None), bool, int, float, type(''), type(b''))
+
+
+def sent_response(request, data=None, url=None, body=None):
+	response = {'status': 1, 'request': 'a' * 36}
+	
+	if body is not None:
+		data = dict(parse_qsl(body.decode('utf-8')))
+	
+	if int(data.get('priority', chump.NORMAL)) == chump.EMERGENCY:
+		response['receipt'] = 'r' * 30
+	
+	return (response, chump.utc_now())
+
+
+def footprint(obj, seen, shared):
+	if id(obj) in seen or isinstance(obj, shared):
+		return 0
+	
+	seen.add(id(obj))
+	size = sys.getsizeof(obj)
+	
+	if isinstance(obj, dict):
+		size += sum(footprint(key, seen, shared) + footprint(value, seen, shared) for key, value in obj.items())
+	
+	elif isinstance(obj, (list, tuple, set, frozenset)):
+		size += sum(footprint(item, seen, shared) for item in obj)
+	
+	elif not isinstance(obj, SCALARS):
+		if hasattr(obj, '__dict__'):
+			size += footprint(obj.__dict__, seen, shared)
+		
+		for cls in type(obj).__mro__:
+			for name in getattr(cls, '__slots__', ()):
+				if name != '__weakref__' and hasattr(obj, name):
+					size += footprint(getattr(obj, name), seen, shared)
+	
+	return size
+
+
+def measure(create, send=False, shared=(chump.Application, chump.User)):
+	messages = [create(i) for i in range(COUNT)]
+	
+	if send:
+		for message in messages:
+			message.send()
+	
+	# Small ints and interned strings are shared, so only count them once.
+	seen = set()
+	
+	return sum(footprint(message, seen, shared) for message in messages) / len(messages)
+
+
+def main():
+	app = chump.Application('a' * 30)
+	app.is_authenticated = True
+	app.sounds = {'bike': 'Bike'}
+	app._request = sent_response
+	
+	user = app.get_user('u' * 30)
+	user.is_authenticated = True
+	user.devices = {'iphone'}
+	
+	# Keep EmergencyMessage.send from polling, we're only measuring the message.
+	chump.EmergencyMessage.poll = lambda self: True
+	
+	cases = (
+		('Message (queued)', lambda i: user.create_message('Message {i}'.format(i=i), title='Title'), {}),
+		('Message (sent)', lambda i: user.create_message('Message {i}'.format(i=i), title='Title'), {'send': True}),
+		('EmergencyMessage (queued)', lambda i: user.create_message('Message {i}'.format(i=i), priority=chump.EMERGENCY), {}),
+		('EmergencyMessage (sent)', lambda i: user.create_message('Message {i}'.format(i=i), priority=chump.EMERGENCY), {'send': True}),
+		('User', lambda i: chump.User(app, 'u' * 30), {'shared': (chump.Application,)}),
+	)
+	
+	for name, create, kwargs in cases:
+		print('{name:<28}{size:>8.0f} bytes'.format(name=name, size=measure(create, **kwargs)))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+"""
+Times the CPU bound steps of sending a message, without any network:
+constructing and validating messages, encoding their payloads, and parsing
+responses in :meth:`~chump.Application._request`, and receiving them over a
+pooled connection.
+	
+	$ python benchmarks/micro.py
+
+"""
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import io
+import json
+import os
+import sys
+import timeit
+from email.utils import formatdate
+
+try: # Python 3
+	from urllib.request import Request
+
+except ImportError: # Python 2
+	from urllib2 import Request
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import chump
+from chump.connection_pool import FreeingHTTPResponse, PushoverPooledConnectionHandler
+from chump.recorder import RecordedResponse
+
+
+NUMBER = 20000
+
+
+class CannedTransport(object):
+	headers = [
+		['Date', formatdate(usegmt=True)],
+		['Content-Type', 'application/json; charset=utf-8'],
+		['X-Limit-App-Limit', '10000'],
+		['X-Limit-App-Remaining', '9999'],
+		['X-Limit-App-Reset', '1700000000'],
+	]
+	content = json.dumps({'status': 1, 'request': 'b' * 36}).encode('utf-8')
+	
+	def open(self, request, data=None):
+		return RecordedResponse(request, 200, self.headers, self.content)
+
+
+class CannedSocket(object):
+	def __init__(self, data):
+		self.data = data
+	
+	def makefile(self, mode, *args):
+		return io.BytesIO(self.data)
+
+
+class CannedConnection(object):
+	"""
+	Answers every request with the same raw response, so that
+	:meth:`~chump.connection_pool.PushoverPooledConnectionHandler.make_request`
+	can be timed without a socket.
+	
+	"""
+	
+	timeout = None
+	raw = b'\r\n'.join(
+		['HTTP/1.1 200 OK'.encode('ascii')] +
+		['{name}: {value}'.format(name=name, value=value).encode('ascii') for name, value in CannedTransport.headers] +
+		['Content-Length: {length}'.format(length=len(CannedTransport.content)).encode('ascii'), b'', CannedTransport.content]
+	)
+	
+	def request(self, method, url, body=None, headers=None):
+		pass
+	
+	def getresponse(self, buffering=False):
+		response = FreeingHTTPResponse(CannedSocket(self.raw))
+		response.begin()
+		
+		return response
+
+
+def run(number=NUMBER):
+	"""
+	Returns a :py:class:`dict` of results, keyed on benchmark name.
+	
+	"""
+	
+	app = chump.Application('a' * 30, transport=CannedTransport())
+	app.is_authenticated = True
+	app.sounds = {'pushover': 'Pushover (default)', 'bike': 'Bike'}
+	
+	user = app.get_user('u' * 30)
+	user.is_authenticated = True
+	user.devices = {'iphone', 'ipad', 'desktop'}
+	
+	deferred = user.create_message('Hello', title='Micro', sound='bike', device='iphone', defer_validation=True)
+	message = user.create_message('Hello', title='Micro', sound='bike', device='iphone')
+	payload = message._payload()
+	
+	handler = PushoverPooledConnectionHandler()
+	connection = CannedConnection()
+	request = Request(chump.ENDPOINT + 'messages.json', payload)
+	request.timeout = None # Set by the opener.
+	
+	def receive():
+		handler.make_request(connection, request).read()
+	
+	def encode():
+		message._encoded = None
+		message._payload()
+	
+	def validate():
+		deferred.is_deferred = True
+		deferred.validate()
+	
+	cases = (
+		('micro.message_construct', lambda: user.create_message('Hello', title='Micro', sound='bike', device='iphone')),
+		('micro.message_construct_deferred', lambda: user.create_message('Hello', title='Micro', sound='bike', device='iphone', defer_validation=True)),
+		('micro.message_validate', validate),
+		('micro.payload_encode', encode),
+		('micro.response_parse', lambda: app._request('message', body=payload)),
+		('micro.response_receive', receive),
+	)
+	
+	return dict(
+		(name, {'ops_per_second': number / timeit.timeit(case, number=number)})
+		for name, case in cases
+	)
+
+
+def main():
+	for name, result in sorted(run().items()):
+		print('{name:<36}{ops_per_second:>10.0f} ops/s'.format(name=name, **result))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""
+Runs the throughput, micro and import time benchmarks, optionally saving
+the results as ``json`` and comparing them with those saved from
+another run.
+	
+	$ python benchmarks/run.py --output before.json
+	$ python benchmarks/run.py --output after.json --compare before.json
+
+"""
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import chump
+
+import importtime
+import micro
+import throughput
+
+
+def revision():
+	try:
+		with open(os.devnull, 'w') as devnull:
+			return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=devnull).decode('ascii').strip()
+	
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def compare(baseline, results):
+	for name in sorted(set(baseline['results']) & set(results['results'])):
+		for metric, value in sorted(results['results'][name].items()):
+			old = baseline['results'][name].get(metric)
+			
+			if old is None:
+				continue
+			
+			change = (value - old) / old if old else 0.0
+			
+			print('{name:<36}{metric:<22}{old:>12.2f}{value:>12.2f}{change:>+9.1%}'.format(
+				name=name,
+				metric=metric,
+				old=old,
+				value=value,
+				change=change,
+			))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+	parser.add_argument('--output', help='save the results to this json file')
+	parser.add_argument('--compare', help='compare the results with those in this json file')
+	parser.add_argument('--quick', action='store_true', help='run fewer iterations')
+	args = parser.parse_args()
+	
+	if args.quick:
+		results = dict(throughput.run(concurrency=(1, 16), count=200), **micro.run(number=2000))
+	
+	else:
+		results = dict(throughput.run(), **micro.run())
+	
+	importtime.measure()
+	results['import.chump'] = {'milliseconds': min(importtime.measure()[0] for _ in range(importtime.RUNS)) / 1000}
+	
+	results = {
+		'meta': {
+			'chump': chump.__version__,
+			'revision': revision(),
+			'python': platform.python_version(),
+			'implementation': platform.python_implementation(),
+			'platform': platform.platform(),
+			'time': int(time.time()),
+		},
+		'results': results,
+	}
+	
+	for name, result in sorted(results['results'].items()):
+		print('{name:<36}{metrics}'.format(name=name, metrics='  '.join(
+			'{metric} {value:.2f}'.format(metric=metric, value=value)
+			for metric, value in sorted(result.items())
+		)))
+	
+	if args.output:
+		with open(args.output, 'w') as output:
+			json.dump(results, output, indent=2, sort_keys=True)
+	
+	if args.compare:
+		with open(args.compare) as baseline:
+			print()
+			compare(json.load(baseline), results)
+
+
+if __name__ == '__main__':
+	main()
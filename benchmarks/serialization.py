@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compares round tripping messages through :meth:`~chump.Message.to_compact`
+and :meth:`~chump.Message.from_compact` against pickling them whole.
+
+	$ python benchmarks/serialization.py
+
+"""
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import os
+import pickle
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import chump
+
+
+NUMBER = 20000
+
+
+def sent_response(request, data=None, url=None, body=None):
+	return ({'status': 1, 'request': 'a' * 36, 'receipt': 'r' * 30}, chump.utc_now())
+
+
+def main():
+	app = chump.Application('a' * 30)
+	app.is_authenticated = True
+	app.sounds = dict(('sound{i}'.format(i=i), 'Sound {i}'.format(i=i)) for i in range(22))
+	app._request = sent_response
+	
+	user = app.get_user('u' * 30)
+	user.is_authenticated = True
+	user.devices = {'iphone', 'ipad', 'desktop'}
+	
+	# Keep EmergencyMessage.send from polling, we're only serializing.
+	chump.EmergencyMessage.poll = lambda self: True
+	
+	cases = (
+		('Message', user.send_message("What's up, dog?", title='Greetings', sound='sound1')),
+		('EmergencyMessage', user.send_message('Do something, Gromit!', priority=chump.EMERGENCY, tags=['oncall'])),
+	)
+	
+	for name, message in cases:
+		pickled = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+		compact = pickle.dumps(message.to_compact(), pickle.HIGHEST_PROTOCOL)
+		
+		results = (
+			('pickle', len(pickled), timeit.timeit(lambda: pickle.loads(pickle.dumps(message, pickle.HIGHEST_PROTOCOL)), number=NUMBER)),
+			('compact', len(compact), timeit.timeit(lambda: chump.Message.from_compact(pickle.loads(pickle.dumps(message.to_compact(), pickle.HIGHEST_PROTOCOL))), number=NUMBER)),
+		)
+		
+		for method, size, seconds in results:
+			print('{name:<18}{method:<9}{size:>6} bytes{rate:>12.0f} round trips/s'.format(
+				name=name,
+				method=method,
+				size=size,
+				rate=NUMBER / seconds,
+			))
+
+
+if __name__ == '__main__':
+	main()
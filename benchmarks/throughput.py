@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""
+Measures :meth:`~chump.User.send_message` over real TLS connections to a
+local :class:`~chump.fake.FakeServer`: messages per second and latency
+percentiles at several concurrency levels, and how often the connection
+pool reused a connection rather than opening one.
+	
+	$ python benchmarks/throughput.py
+
+"""
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import chump
+from chump.cache import clock
+from chump.connection_pool import handler
+from chump.fake import FakeServer
+
+
+CONCURRENCY = (1, 4, 16, 64)
+COUNT = 2000
+
+
+def percentile(ordered, fraction):
+	return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(user, concurrency, count):
+	lock = threading.Lock()
+	remaining = [count]
+	latencies = []
+	
+	def work():
+		while True:
+			lock.acquire()
+			try:
+				if remaining[0] <= 0:
+					return
+				
+				remaining[0] -= 1
+			
+			finally:
+				lock.release()
+			
+			started_at = clock()
+			user.send_message('Benchmark', title='Throughput')
+			latency = clock() - started_at
+			
+			lock.acquire()
+			try: latencies.append(latency)
+			finally: lock.release()
+	
+	threads = [threading.Thread(target=work) for _ in range(concurrency)]
+	before = handler.stats()
+	started_at = clock()
+	
+	for thread in threads:
+		thread.start()
+	
+	for thread in threads:
+		thread.join()
+	
+	seconds = clock() - started_at
+	after = handler.stats()
+	
+	latencies.sort()
+	created = after['created'] - before['created']
+	reused = after['reused'] - before['reused']
+	
+	return {
+		'messages_per_second': count / seconds,
+		'p50_ms': percentile(latencies, 0.5) * 1000,
+		'p90_ms': percentile(latencies, 0.9) * 1000,
+		'p99_ms': percentile(latencies, 0.99) * 1000,
+		'reuse_ratio': reused / (created + reused) if created + reused else 0.0,
+		'connections_created': created,
+	}
+
+
+def run(concurrency=CONCURRENCY, count=COUNT):
+	"""
+	Returns a :py:class:`dict` of results, keyed on benchmark name.
+	
+	"""
+	
+	results = {}
+	
+	with FakeServer():
+		app = chump.Application('a' * 30)
+		user = app.get_user('u' * 30)
+		
+		# Authenticate up front, so only sending is measured.
+		assert app.is_authenticated and user.is_authenticated
+		
+		for level in concurrency:
+			results['send.concurrency_{level}'.format(level=level)] = measure(user, level, count)
+	
+	return results
+
+
+def main():
+	for name, result in sorted(run().items(), key=lambda item: int(item[0].rsplit('_', 1)[1])):
+		print('{name:<24}{messages_per_second:>8.0f} msgs/s  p50 {p50_ms:>7.2f}ms  p90 {p90_ms:>7.2f}ms  p99 {p99_ms:>7.2f}ms  reuse {reuse_ratio:>6.1%}'.format(name=name, **result))
+
+
+if __name__ == '__main__':
+	main()
@@ -2,26 +2,30 @@
 
 from __future__ import division, absolute_import, print_function, unicode_literals
 
+import importlib
 import logging
+import os
 import re
+import sys
+import threading
 import warnings
-from calendar import timegm
+import weakref
 from datetime import datetime, timedelta
-from email.utils import parsedate_tz
 
 try: import ujson as json
 except ImportError: import json
 
-from .connection_pool import pool
+from .cache import USER_NEGATIVE_TTL, clock, user_cache
 
 try: # Python 3
-	from urllib.error import HTTPError
-	from urllib.parse import urlencode
+	from queue import Queue
+	from urllib.parse import parse_qsl, quote, urlencode
 	unicode = basestring = str
 
 except ImportError: # Python 2
-	from urllib import urlencode
-	from urllib2 import HTTPError
+	from Queue import Queue
+	from urllib import quote, urlencode
+	from urlparse import parse_qsl
 	def bytes(s, encoding=None, errors=None): return s.encode(encoding, errors)
 
 
@@ -40,48 +44,129 @@ logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
 
-try: # pytz installed
-	from pytz import utc
-	def utc_now(): return utc.localize(datetime.utcnow())
-	def epoch_to_datetime(e): return utc.localize(datetime.utcfromtimestamp(int(e)))
-
-except ImportError:
-	try: # dateutil installed
-		from dateutil.tz import tzutc
-		utc = tzutc()
+def load_timezone():
+	# Probing for pytz and dateutil is slow, so it waits for the first
+	# datetime, replacing _utc_now and _epoch_to_datetime below, (once, so
+	# that modules that imported utc_now and epoch_to_datetime by name don't
+	# probe again), and defining utc.
+	global utc, _utc_now, _epoch_to_datetime
+	
+	try: # pytz installed
+		from pytz import utc
+		def _utc_now(): return utc.localize(datetime.utcnow())
+		def _epoch_to_datetime(e): return utc.localize(datetime.utcfromtimestamp(int(e)))
 	
 	except ImportError:
-		try: # Python >= 3.2
-			from datetime import timezone
-			utc = timezone.utc
-		
-		except ImportError: # Python < 3.2
-			from datetime import tzinfo
-			class UTC(tzinfo):
-				ZERO = timedelta(0)
-				def utcoffset(self, dt): return self.ZERO
-				def tzname(self, dt): return 'UTC'
-				def dst(self, dt): return self.ZERO
-				def __unicode__(self): return 'UTC'
-				__str__ = __unicode__
-				def __repr__(self): return 'chump.UTC'
-			utc = UTC()
-	
-	def utc_now(): return datetime.utcnow().replace(tzinfo=utc)
-	def epoch_to_datetime(e): return datetime.utcfromtimestamp(int(e)).replace(tzinfo=utc)
+		try: # dateutil installed
+			from dateutil.tz import tzutc
+			utc = tzutc()
+		
+		except ImportError:
+			try: # Python >= 3.2
+				from datetime import timezone
+				utc = timezone.utc
+			
+			except ImportError: # Python < 3.2
+				from datetime import tzinfo
+				class UTC(tzinfo):
+					ZERO = timedelta(0)
+					def utcoffset(self, dt): return self.ZERO
+					def tzname(self, dt): return 'UTC'
+					def dst(self, dt): return self.ZERO
+					def __unicode__(self): return 'UTC'
+					__str__ = __unicode__
+					def __repr__(self): return 'chump.UTC'
+				utc = UTC()
+		
+		def _utc_now(): return datetime.utcnow().replace(tzinfo=utc)
+		def _epoch_to_datetime(e): return datetime.utcfromtimestamp(int(e)).replace(tzinfo=utc)
+
+
+def _utc_now():
+	load_timezone()
+	return _utc_now()
+
+
+def _epoch_to_datetime(e):
+	load_timezone()
+	return _epoch_to_datetime(e)
+
+
+def utc_now(): return _utc_now()
+def epoch_to_datetime(e): return _epoch_to_datetime(e)
 
 
 def datetime_to_epoch(dt):
-	if dt.tzinfo is not None: dt = dt.astimezone(utc)
-	else: warnings.warn('Naïve datetime received: assuming UTC', RuntimeWarning)
-	return timegm(dt.timetuple())
+	from calendar import timegm
+	if dt.tzinfo is None: warnings.warn('Naïve datetime received: assuming UTC', RuntimeWarning)
+	return timegm(dt.utctimetuple())
+
+
+def slots_of(cls):
+	"""
+	Returns the names of the ``__slots__`` of ``cls`` and its bases, less
+	``__weakref__``.
+	
+	"""
+	
+	return tuple(
+		name
+		for base in cls.__mro__
+		for name in getattr(base, '__slots__', ())
+		if name != '__weakref__'
+	)
+
+
+def get_slots_state(obj):
+	return dict((name, getattr(obj, name)) for name in slots_of(obj.__class__) if hasattr(obj, name))
+
+
+def set_slots_state(obj, state):
+	# Restored state was validated when it was set, and must skip __setattr__,
+	# which expects attributes to be set in __init__'s order.
+	for name, value in state.items():
+		object.__setattr__(obj, name, value)
+
+
+_last_http_date = (None, None) # Responses in the same second share a date.
 
 
 def http_date_to_datetime(d):
+	global _last_http_date
+	
+	last_d, last_datetime = _last_http_date
+	
+	if d == last_d:
+		return last_datetime
+	
+	from email.utils import mktime_tz, parsedate_tz
 	d_tuple = parsedate_tz(d)
+	d_datetime = epoch_to_datetime(mktime_tz(d_tuple)) if d_tuple is not None else None
+	_last_http_date = (d, d_datetime)
+	
+	return d_datetime
+
+
+# Response headers read by Application._request.
+RESPONSE_HEADERS = frozenset(('date', 'x-limit-app-limit', 'x-limit-app-remaining', 'x-limit-app-reset'))
+
+
+def read_headers(headers):
+	# One pass over the headers, rather than a search of them per header.
+	found = {}
 	
-	if d_tuple is not None:
-		return datetime(*d_tuple[:6]).replace(tzinfo=utc) - timedelta(seconds=d_tuple[9])
+	for name, value in headers.items():
+		name = name.lower()
+		
+		if name in RESPONSE_HEADERS:
+			found[name] = value
+	
+	return found
+
+
+def parse_json(content):
+	try: return json.loads(content)
+	except TypeError: return json.loads(content.decode('utf-8')) # Python < 3.6
 
 
 LOWEST = -2 #: Message priority: No sound, no vibration, no banner.
@@ -93,6 +178,33 @@ EMERGENCY = 2 #: Message priority: Sound, vibration, and banner regardless of us
 
 TOKEN_RE = re.compile(r'^[a-zA-Z0-9]{30}$') # Matches correct application/user tokens.
 DEVICE_RE = re.compile(r'^[A-Za-z0-9_-]{,25}$') # Matches correct device names.
+TAG_RE = re.compile(r'^[^,]+$') # Matches correct emergency message tags.
+NO_TAGS = frozenset() # Shared by every untagged emergency message.
+
+# Message fields that are the same for every recipient, in payload order.
+SHARED_FIELDS = ('message', 'html', 'title', 'url', 'url_title', 'priority', 'sound', 'retry', 'expire', 'callback', 'tags')
+
+MAX_MESSAGE_LENGTH = 1024 #: The most characters a message may have.
+MAX_TITLE_LENGTH = 250 #: The most characters a message's title may have.
+MAX_URL_LENGTH = 512 #: The most characters a message's URL may have.
+MAX_URL_TITLE_LENGTH = 100 #: The most characters a message's URL title may have.
+
+# Arguments of User.create_message a message's spec, (as read by
+# validate_batch and the command line), may give.
+MESSAGE_FIELDS = frozenset((
+	'message', 'html', 'title', 'timestamp', 'url', 'url_title', 'device',
+	'priority', 'callback', 'retry', 'expire', 'sound', 'tags', 'attachment',
+))
+
+# String fields checked by validate_batch, and their most characters.
+FIELD_LENGTHS = (
+	('message', MAX_MESSAGE_LENGTH), ('title', MAX_TITLE_LENGTH),
+	('url', MAX_URL_LENGTH), ('url_title', MAX_URL_TITLE_LENGTH),
+	('device', None), ('sound', None), ('callback', None),
+)
+
+
+COMPACT_VERSION = 1 # Version of the tuples made by Message.to_compact.
 
 
 ENDPOINT = 'https://api.pushover.net/1/'
@@ -117,6 +229,10 @@ REQUESTS = {
 		'method': 'post',
 		'path': 'receipts/'
 	},
+	'cancel_by_tag': {
+		'method': 'post',
+		'path': 'receipts/cancel_by_tag/'
+	},
 }
 
 
@@ -128,14 +244,17 @@ class APIError(Exception):
 	:param dict request: The original request payload.
 	:param dict response: The ``json`` response from the endpoint.
 	:param datetime timestamp: When this error was raised.
+	:param int code: (optional) The response's HTTP status code. Defaults
+		to :py:obj:`None`.
 	
 	"""
 	
-	def __init__(self, url, request, response, timestamp):
+	def __init__(self, url, request, response, timestamp, code=None):
 		self.url = url #: A :py:obj:`string` of the URL of the original request.
 		self.request = request #: A :py:obj:`dict` of the original request payload.
 		self.response = response #: A :py:obj:`dict` of the ``json`` response from the endpoint.
 		self.timestamp = timestamp #: A :py:class:`~datetime.datetime` of when this error was raised.
+		self.code = code #: An :py:obj:`int` of the response's HTTP status code, if known, otherwise :py:obj:`None`.
 		
 		self.id = self.response['request'] #: A :py:obj:`string` of the request's id.
 		self.status = self.response['status'] #: An :py:obj:`int` of the status code.
@@ -153,6 +272,16 @@ class APIError(Exception):
 		
 		logger.debug('APIError raised. Endpoint response was {response}'.format(response=self.response))
 	
+	@property
+	def is_over_limit(self):
+		"""
+		A :py:obj:`bool` indicating whether the request was refused for the
+		application's message limit or request rate, rather than being bad.
+		
+		"""
+		
+		return self.code == 429
+	
 	def __unicode__(self):
 		return "({id}) {errors}".format(id=self.id, errors=", ".join(self.errors))
 	
@@ -167,22 +296,78 @@ class APIError(Exception):
 		)
 
 
+class AmbiguousSendError(Exception):
+	"""
+	Raised on sending a message whose
+	:attr:`~chump.Message.idempotency_key` has a send that's still going, or
+	that failed in a way that may or may not have reached Pushover, so
+	sending it again could page its user twice.
+	
+	:param string key: The message's idempotency key.
+	:param dict record: The key's record in the application's
+		:attr:`~chump.Application.key_store`.
+	
+	"""
+	
+	def __init__(self, key, record):
+		self.key = key #: A :py:obj:`string` of the message's idempotency key.
+		self.record = record #: A :py:class:`dict` of the key's record.
+		self.state = record['state'] #: A :py:obj:`string` of the state of the key's last send, :const:`~chump.idempotency.PENDING` or :const:`~chump.idempotency.AMBIGUOUS`.
+	
+	def __unicode__(self):
+		return "({key}) message may already have been sent, its last send is {state}".format(key=self.key, state=self.state)
+	
+	__str__ = __unicode__
+	
+	def __repr__(self):
+		return "AmbiguousSendError(key={key!r}, record={record!r})".format(key=self.key, record=self.record)
+
+
 class Application(object):
 	"""
 	The Pushover application in use.
 	
 	:param string token: The application's API token.
+	:param cache: (optional) A cache to load and store the application's
+		authentication and sounds with, so that they needn't be fetched
+		on startup. Defaults to :py:obj:`None`.
+	:type cache: :class:`~chump.cache.FileCache`
+	:param transport: (optional) An opener to make requests with instead of
+		the shared connection pool, such as a
+		:class:`~chump.recorder.Recorder` or
+		:class:`~chump.recorder.ReplayTransport`. Defaults to :py:obj:`None`.
+	:param string relay: (optional) Path of a :class:`~chump.relay.RelayServer`
+		socket to send requests through whenever it's running, or
+		:py:obj:`False` to never do so. Defaults to the
+		``CHUMP_RELAY_SOCKET`` environment variable, if set.
+	:param key_store: (optional) A store to record the outcomes of sends in
+		by their messages' :attr:`Message.idempotency_key`, so that messages
+		already sent aren't sent again. Defaults to :py:obj:`None`.
+	:type key_store: :class:`~chump.idempotency.MemoryKeyStore` or
+		:class:`~chump.idempotency.FileKeyStore`
 	
 	"""
 	
-	def __init__(self, token):
+	def __init__(self, token, cache=None, transport=None, relay=None, key_store=None):
 		self.token = token #: A :py:obj:`string` of the application's API token.
 		self._is_authenticated = None
 		self._sounds = None
+		self._emergency_messages = weakref.WeakValueDictionary() # Live sent emergency messages, by id(), as copies can share a receipt.
 		
 		self.limit = None #: If a message has been sent, an :py:obj:`int` of the application's monthly message limit, otherwise :py:obj:`None`.
 		self.remaining = None #: If a message has been sent, an :py:obj:`int` of the application's remaining message allotment, otherwise :py:obj:`None`.
 		self.reset = None #: If a message has been sent, :py:class:`~datetime.datetime` of when the application's monthly message limit will reset, otherwise :py:obj:`None`.
+		
+		self.cache = cache #: The :class:`~chump.cache.FileCache` the application's authentication and sounds are kept in, otherwise :py:obj:`None`.
+		self.transport = transport #: The opener requests are made with if not the shared connection pool, otherwise :py:obj:`None`.
+		self.relay = os.environ.get('CHUMP_RELAY_SOCKET') if relay is None else relay or None #: A :py:obj:`string` of the path of the relay socket requests are sent through when it's running, otherwise :py:obj:`None`.
+		self.key_store = key_store #: The store the outcomes of sends are recorded in, otherwise :py:obj:`None`.
+		
+		if self.cache is not None:
+			self._load_cache()
+		
+		# So Message.from_compact binds to this, unless another's in use.
+		_shared_apps.setdefault(token, self)
 	
 	@property
 	def is_authenticated(self):
@@ -229,7 +414,7 @@ class Application(object):
 			
 			except TypeError:
 				raise TypeError('Bad token: expected string, got {value_type}'.format(value_type=type(value)))
-			
+		
 		super(Application, self).__setattr__(name, value)
 		
 		if name == 'token' and self.token != old_token:
@@ -244,6 +429,16 @@ class Application(object):
 	def __repr__(self):
 		return 'Application(token={token!r})'.format(token=self.token)
 	
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		del state['_emergency_messages']
+		
+		return state
+	
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._emergency_messages = weakref.WeakValueDictionary()
+	
 	def __eq__(self, other):
 		return isinstance(other, self.__class__) and self.token and self.token == other.token
 	
@@ -258,10 +453,14 @@ class Application(object):
 	def _authenticate(self):
 		"""
 		Authenticates the supplied application token and populates available
-		notification sounds.
+		notification sounds. Returns the :exc:`~chump.APIError` of a request
+		that failed without settling either, (such as a server error),
+		otherwise :py:obj:`None`.
 		
 		"""
 		
+		unsettled = None
+		
 		# We'll make a request for sounds (which we need to make regardless),
 		# and if that error fails with a token error we know we're
 		# unauthenticated.
@@ -271,9 +470,51 @@ class Application(object):
 		except APIError as error:
 			if 'token' in error.bad_inputs:
 				self._is_authenticated = False
+			
+			else:
+				unsettled = error
 		
 		else:
 			self._is_authenticated = True
+		
+		if self.cache is not None and self._is_authenticated is not None:
+			try: self.cache.set(self.token, (self._is_authenticated, self._sounds))
+			except (IOError, OSError) as error: logger.warning('Could not write application cache: {error}'.format(error=error))
+		
+		return unsettled
+	
+	def _load_cache(self):
+		"""
+		Populates authentication and sounds from :attr:`.cache` if a fresh
+		enough entry exists, refreshing it in the background if it's aging.
+		
+		"""
+		
+		entry = self.cache.get(self.token)
+		
+		if entry is not None:
+			(self._is_authenticated, self._sounds), age = entry
+			
+			if age >= self.cache.refresh_after:
+				thread = threading.Thread(target=self._refresh_cache)
+				thread.daemon = True
+				thread.start()
+	
+	def _refresh_cache(self):
+		"""
+		Refreshes :attr:`.cache` in the background, logging failures, (after
+		which the aging entry is still used until it expires).
+		
+		"""
+		
+		try:
+			unsettled = self._authenticate()
+		
+		except (APIError, IOError, OSError) as error: # Including URLErrors.
+			unsettled = error
+		
+		if unsettled is not None:
+			logger.warning('Could not refresh application cache: {error}'.format(error=unsettled))
 	
 	def get_user(self, token):
 		"""
@@ -287,17 +528,132 @@ class Application(object):
 		
 		return User(self, token)
 	
-	def _request(self, request, data=None, url=None):
+	def validate_users(self, tokens, concurrency=8):
+		"""
+		Validates many users at once, ``concurrency`` at a time, over the
+		pooled connections. Results are yielded as they arrive, (so not
+		necessarily in order), and can be collected with :py:func:`dict`.
+		
+		Each :class:`~chump.User` is authenticated just as by
+		:attr:`User.is_authenticated`, so its :attr:`User.devices` are
+		filled, and malformed tokens are yielded with :py:obj:`None` rather
+		than a user. A token whose validation fails, (such as with a
+		:exc:`~urllib.error.URLError` as the connection drops), is yielded
+		with the exception, and the rest are still validated.
+		
+		:param tokens: User API tokens to validate.
+		:type tokens: An iterable of :py:obj:`string`
+		:param int concurrency: (optional) How many validations to make at
+			once. Defaults to 8.
+		
+		:returns: (``token``, ``user``) pairs, where ``user`` is a
+			:class:`~chump.User`, :py:obj:`None`, or an :exc:`Exception`.
+		:rtype: An iterator.
+		
+		"""
+		
+		tokens = iter(tokens)
+		tokens_lock = threading.Lock()
+		results = Queue()
+		stopped = threading.Event()
+		done = object()
+		
+		def validate():
+			while not stopped.is_set():
+				tokens_lock.acquire()
+				try: token = next(tokens, done)
+				finally: tokens_lock.release()
+				
+				if token is done:
+					break
+				
+				try:
+					user = User(self, token)
+				
+				except (TypeError, ValueError):
+					results.put((token, None))
+					continue
+				
+				try:
+					user._authenticate()
+				
+				except Exception as error:
+					results.put((token, error))
+				
+				else:
+					results.put((token, user))
+			
+			results.put(done)
+		
+		workers = [threading.Thread(target=validate) for _ in range(max(1, concurrency))]
+		
+		for worker in workers:
+			worker.daemon = True
+			worker.start()
+		
+		running = len(workers)
+		
+		try:
+			while running:
+				result = results.get()
+				
+				if result is done:
+					running -= 1
+				
+				else:
+					yield result
+		
+		finally:
+			stopped.set()
+	
+	def cancel_by_tag(self, tag):
+		"""
+		Cancels the request for acknowledgment of every sent
+		:class:`~chump.EmergencyMessage` with the given tag, in one request.
+		Messages sent by this application with the tag are marked as
+		cancelled.
+		
+		:param string tag: The tag to cancel messages by.
+		
+		:returns: An :py:obj:`int` of the number of messages cancelled.
+		:rtype: An :py:obj:`int`.
+		
+		"""
+		
+		if not isinstance(tag, basestring) or not TAG_RE.match(tag):
+			raise ValueError('Bad tag: expected string matching r{pattern!r}, got {value!r}'.format(pattern=TAG_RE.pattern, value=tag))
+		
+		response, timestamp = self._request('cancel_by_tag', url='{endpoint}{path}{tag}.json'.format(
+			endpoint=ENDPOINT,
+			path=REQUESTS['cancel_by_tag']['path'],
+			tag=quote(tag.encode('utf-8'), safe=''),
+		))
+		
+		for message in list(self._emergency_messages.values()):
+			if tag in message.tags:
+				message.is_cancelled = True
+				message.last_polled_at = timestamp
+		
+		return int(response.get('canceled', 0))
+	
+	def _request(self, request, data=None, url=None, body=None, attachment=None):
 		"""
 		Handles the request/response cycle to Pushover's API endpoint. Request
 		types are defined in :attr:`.requests`.
 		
 		:param string request: The type of request to make. One of 'message',
-			'validate', 'sound', 'receipt', or 'cancel'.
+			'validate', 'sound', 'receipt', 'cancel', or 'cancel_by_tag'.
 		:param dict data: (optional) Payload to send to endpoint.
 			Defaults to :py:obj:`None`.
 		:param string url: (optional) URL to send payload to. Defaults to the
 			URL specified by :param:request.
+		:param bytes body: (optional) An already urlencoded payload to post
+			instead of ``data``, without the application's token. Defaults
+			to :py:obj:`None`.
+		:param attachment: (optional) An attachment to stream, as
+			``multipart/form-data`` alongside ``data``. Defaults
+			to :py:obj:`None`.
+		:type attachment: :class:`~chump.attachment.Attachment`
 		
 		:returns: An :py:obj:`tuple` of (``response``, ``timestamp``), where
 			``response`` is a :py:obj:`dict` of the ``json`` response and
@@ -313,49 +669,95 @@ class Application(object):
 		if data is None:
 			data = {}
 		
+		if self.relay and self.transport is None and attachment is None:
+			from .relay import relay_request
+			
+			result = relay_request(self, request, data, url, body)
+			
+			if result is not None:
+				return result
+		
 		data['token'] = self.token
 		
 		if url is None:
 			url = ENDPOINT + REQUESTS[request]['path']
 		
-		logger.debug('Making request ({request}): {data}'.format(request=request, data=data))
+		if logger.isEnabledFor(logging.DEBUG):
+			logger.debug('Making request ({request}): {data}'.format(request=request, data=data))
+		
+		from .connection_pool import URLError, pool
+		from .metrics import registry
+		
+		try: from urllib.error import HTTPError # Python 3
+		except ImportError: from urllib2 import HTTPError # Python 2
 		
 		method = REQUESTS[request]['method']
+		opener = pool if self.transport is None else self.transport
+		started_at = clock()
 		
 		try:
 			if method == 'get':
 				if data:
 					url += '?' + urlencode(data)
 				
-				response = pool.open(url)
+				response = opener.open(url)
 			
 			elif method == 'post':
-				response = pool.open(url, bytes(urlencode(data), 'utf-8', 'strict') if data else None)
+				if attachment is not None:
+					from .attachment import MultipartBody
+					
+					try: from urllib.request import Request # Python 3
+					except ImportError: from urllib2 import Request # Python 2
+					
+					multipart = MultipartBody(data, attachment)
+					response = opener.open(Request(url, multipart, multipart.headers))
+				
+				else:
+					if body is not None:
+						body = bytes(urlencode(data), 'utf-8', 'strict') + b'&' + body
+					
+					else:
+						body = bytes(urlencode(data), 'utf-8', 'strict') if data else None
+					
+					response = opener.open(url, body)
 		
 		except HTTPError as error_response:
 			response = error_response
 			response.__dict__['headers'] = error_response.hdrs
 		
-		response.content = response.read().decode()
+		except URLError:
+			registry.observe(request, 0, clock() - started_at)
+			raise
 		
-		logger.debug('Response ({code}):\n{headers}\n{content}'.format(
-			code=response.code,
-			headers=response.headers,
-			content=response.content,
-		))
+		if body is not None and response.code != 200:
+			data = dict(parse_qsl(body.decode('utf-8')))
+		
+		content = response.read()
+		registry.observe(request, response.code, clock() - started_at)
+		
+		if logger.isEnabledFor(logging.DEBUG):
+			logger.debug('Response ({code}):\n{headers}\n{content}'.format(
+				code=response.code,
+				headers=response.headers,
+				content=content.decode('utf-8', 'replace'),
+			))
+		
+		headers = read_headers(response.headers)
+		date = headers.get('date')
+		timestamp = http_date_to_datetime(date) if date else utc_now()
 		
 		if response.code == 200 or 400 <= response.code < 500:
-			response_json = json.loads(response.content)
-			timestamp = http_date_to_datetime(response.headers['date'])
+			response_json = parse_json(content)
 			
 			if 400 <= response.code < 500:
-				raise APIError(url, data, response_json, timestamp)
+				raise APIError(url, data, response_json, timestamp, response.code)
 			
 			else:
 				if request == 'message':
-					self.limit = int(response.headers['X-Limit-App-Limit'])
-					self.remaining = int(response.headers['X-Limit-App-Remaining'])
-					self.reset = epoch_to_datetime(response.headers['X-Limit-App-Reset'])
+					self.limit = int(headers['x-limit-app-limit'])
+					self.remaining = int(headers['x-limit-app-remaining'])
+					self.reset = epoch_to_datetime(headers['x-limit-app-reset'])
+					registry.track(self)
 				
 				return (response_json, timestamp)
 		
@@ -363,8 +765,8 @@ class Application(object):
 			raise APIError(url, data, {
 				'request': None,
 				'status': 0,
-				'errors': ['unknown error ({code}): {content}'.format(code=response.code, content=response.content)],
-			}, timestamp)
+				'errors': ['unknown error ({code}): {content}'.format(code=response.code, content=content.decode('utf-8', 'replace'))],
+			}, timestamp, response.code)
 
 
 class User(object):
@@ -379,6 +781,8 @@ class User(object):
 	
 	"""
 	
+	__slots__ = ('app', 'token', '_is_authenticated', '_devices', '__weakref__')
+	
 	def __init__(self, app, token):
 		self.app = app #: The Pushover application to send messages with.
 		self.token = token #: A :py:obj:`string` of the user's API token.
@@ -444,6 +848,9 @@ class User(object):
 	def __repr__(self):
 		return 'User(app={app!r}, token={token!r})'.format(app=self.app, token=self.token)
 	
+	__getstate__ = get_slots_state
+	__setstate__ = set_slots_state
+	
 	def __eq__(self, other):
 		return isinstance(other, self.__class__) and self.token and self.token == other.token and self.app == other.app
 	
@@ -457,10 +864,20 @@ class User(object):
 	
 	def _authenticate(self):
 		"""
-		Authenticates the supplied user token.
+		Authenticates the supplied user token, consulting and filling
+		:data:`~chump.cache.user_cache`.
 		
 		"""
 		
+		cache_key = (self.app.token, self.token)
+		cached = user_cache.get(cache_key)
+		
+		if cached is not None:
+			self.app._is_authenticated = True
+			self._is_authenticated, devices = cached
+			self._devices = set(devices) if devices is not None else None
+			return
+		
 		try:
 			response, _ = self.app._request('validate', {'user': self.token})
 		
@@ -477,19 +894,23 @@ class User(object):
 				if 'user' not in error.bad_inputs or error.bad_inputs['user'].startswith('valid'):
 					self._is_authenticated = True
 					self._devices = set()
+					user_cache.set(cache_key, (True, frozenset()))
 				
 				else:
 					self._is_authenticated = False
 					self._devices = None
+					user_cache.set(cache_key, (False, None), USER_NEGATIVE_TTL)
 		
 		else:
 			self.app._is_authenticated = True
 			self._is_authenticated = True
 			self._devices = set(response['devices'])
+			user_cache.set(cache_key, (True, frozenset(self._devices)))
 	
 	def create_message(self, message, html=False, title=None, timestamp=None,
 		               url=None, url_title=None, device=None, priority=NORMAL,
-		               callback=None, retry=30, expire=86400, sound=None):
+		               callback=None, retry=30, expire=86400, sound=None, tags=None,
+		               defer_validation=False, attachment=None):
 		"""
 		Creates a message to the User with :attr:`.app`.
 		
@@ -523,6 +944,20 @@ class User(object):
 		:param string sound: (optional) The sound from :attr:`.app.sounds`
 			to play when the message is received. Defaults to the user's
 			default sound.
+		:param tags: (optional) If priority is :const:`~chump.EMERGENCY`,
+			tags to attach to the message, for use with
+			:meth:`Application.cancel_by_tag`. Defaults to :py:obj:`None`.
+		:type tags: An iterable of :py:obj:`string`
+		:param bool defer_validation: (optional) Whether to skip checking
+			``device`` and ``sound`` against the user's devices and the
+			application's sounds, which may make requests, until the message
+			is validated or sent. Only local checks run on construction.
+			Defaults to :py:obj:`False`.
+		:param attachment: (optional) An image to attach to the message. Its
+			size and type are checked now, but it's only read as it's sent.
+			Defaults to :py:obj:`None`.
+		:type attachment: A path, binary file object, buffer, or
+			:class:`~chump.attachment.Attachment`
 		
 		:returns: An unsent message.
 		:rtype: A :class:`~chump.Message` or :class:`~chump.EmergencyMessage`.
@@ -541,12 +976,14 @@ class User(object):
 			kwargs.pop('callback')
 			kwargs.pop('retry')
 			kwargs.pop('expire')
+			kwargs.pop('tags')
 		
 		return message_class(self, **kwargs)
 	
 	def send_message(self, message, html=False, title=None, timestamp=None,
 		             url=None, url_title=None, device=None, priority=NORMAL,
-		             callback=None, retry=30, expire=86400, sound=None):
+		             callback=None, retry=30, expire=86400, sound=None, tags=None,
+		             defer_validation=False, attachment=None):
 		"""
 		Does the same as :meth:`.create_message`, but then sends the message
 		with :attr:`.app`.
@@ -559,7 +996,8 @@ class User(object):
 		message = self.create_message(
 			message, html, title, timestamp,
 			url, url_title, device, priority,
-			callback, retry, expire, sound,
+			callback, retry, expire, sound, tags,
+			defer_validation, attachment,
 		)
 		
 		message.send()
@@ -580,9 +1018,25 @@ class Message(object):
 	
 	"""
 	
+	__slots__ = (
+		'user', 'message', 'html', 'title', 'timestamp', 'url', 'url_title',
+		'device', 'priority', 'sound', 'id', 'is_sent', 'sent_at', 'error',
+		'is_deferred', 'attachment', 'idempotency_key', '_encoded',
+		'__weakref__',
+	)
+	
+	# Attributes kept by to_compact, in order.
+	_compact_fields = (
+		'message', 'html', 'title', 'timestamp', 'url', 'url_title', 'device',
+		'priority', 'sound', 'is_deferred', 'id', 'is_sent', 'sent_at',
+	)
+	
 	def __init__(self, user, message, html=False, title=None, timestamp=None,
-	             url=None, url_title=None, device=None, priority=0, sound=None):
+	             url=None, url_title=None, device=None, priority=0, sound=None,
+	             defer_validation=False, attachment=None):
 		self.user = user
+		self.is_deferred = bool(defer_validation) #: A :py:obj:`bool` indicating whether the device and sound checks are deferred until :meth:`.validate`.
+		self._encoded = None
 		self.message = message
 		self.html = html
 		self.title = title
@@ -592,6 +1046,7 @@ class Message(object):
 		self.device = device
 		self.priority = priority
 		self.sound = sound
+		self.attachment = attachment #: An :class:`~chump.attachment.Attachment` to send with the message, otherwise :py:obj:`None`.
 		
 		self.id = None #: A :py:obj:`string` of the id of the message if sent, otherwise :py:obj:`None`.
 		
@@ -599,6 +1054,9 @@ class Message(object):
 		self.sent_at = None #: A :py:class:`~datetime.datetime` of when the message was sent, otherwise :py:obj:`None`.
 		
 		self.error = None #: An :exc:`~chump.APIError` if there was an error sending the message, otherwise :py:obj:`None`.
+		
+		#: A :py:obj:`string` identifying the message, for an application with a :attr:`~chump.Application.key_store`. Given one on its first send if not set, but set it to something stable, (like a row's id), to stop messages made again, (such as after a restart), being sent twice.
+		self.idempotency_key = None
 	
 	def __unicode__(self):
 		if self.title:
@@ -612,6 +1070,9 @@ class Message(object):
 	def __eq__(self, other):
 		return isinstance(other, self.__class__) and self.id and self.id == other.id
 	
+	__getstate__ = get_slots_state
+	__setstate__ = set_slots_state
+	
 	def __ne__(self, other):
 		return not self.__eq__(other)
 	
@@ -637,43 +1098,27 @@ class Message(object):
 				if not isinstance(value, basestring):
 					raise TypeError('Bad {name}: expected string, got {type}'.format(name=name, type=type(value)))
 				
-				elif name == 'message' and not (0 < len(value) <= 1024):
-					raise ValueError('Bad message: must be 0-1024 characters, was {length}'.format(length=len(value)))
+				elif name == 'message' and not (0 < len(value) <= MAX_MESSAGE_LENGTH):
+					raise ValueError('Bad message: must be 0-{max_length} characters, was {length}'.format(max_length=MAX_MESSAGE_LENGTH, length=len(value)))
 				
-				if name == 'title' and len(value) > 250:
-					raise ValueError('Bad title: must be <= 250 characters, was {length}'.format(length=len(value)))
+				if name == 'title' and len(value) > MAX_TITLE_LENGTH:
+					raise ValueError('Bad title: must be <= {max_length} characters, was {length}'.format(max_length=MAX_TITLE_LENGTH, length=len(value)))
 				
-				elif name == 'url' and len(value) > 512:
-					raise ValueError('Bad url: must be <= 512 characters, was {length}'.format(length=len(value)))
+				elif name == 'url' and len(value) > MAX_URL_LENGTH:
+					raise ValueError('Bad url: must be <= {max_length} characters, was {length}'.format(max_length=MAX_URL_LENGTH, length=len(value)))
 				
-				elif name == 'url_title' and len(value) > 100:
-					raise ValueError('Bad url_title: must be <= 100 characters, was {length}'.format(length=len(value)))
+				elif name == 'url_title' and len(value) > MAX_URL_TITLE_LENGTH:
+					raise ValueError('Bad url_title: must be <= {max_length} characters, was {length}'.format(max_length=MAX_URL_TITLE_LENGTH, length=len(value)))
 				
 				elif name == 'device':
 					if not DEVICE_RE.match(value):
 						raise ValueError('Bad device: expected string matching r{pattern!r}, got {value!r}'.format(pattern=DEVICE_RE.pattern, value=value))
 					
-					elif self.user.is_authenticated:
-						if value not in self.user.devices:
-							raise ValueError('Bad device: must be in ({devices}), was {value!r}'.format(
-								devices=', '.join(repr(s) for s in sorted(self.user.devices)),
-								value=value,
-							))
-					else:
-						logger.warning('Unverified device: {ancestor} is unauthenticated, {value!r} may be bad'.format(
-							ancestor='application' if self.user.app._is_authenticated is False else 'user',
-							value=value
-						))
-				
-				elif name == 'sound':
-					if self.user.app.is_authenticated:
-						if value not in self.user.app.sounds:
-							raise ValueError('Bad sound: must be in ({sounds}), was {value!r}'.format(
-								sounds=', '.join(repr(s) for s in sorted(self.user.app.sounds.keys())),
-								value=value,
-							))
-					else:
-						logger.warning('Unverified sound: application is unauthenticated, {value!r} may be bad'.format(value=value))
+					elif not self.is_deferred:
+						self._check_device(value)
+				
+				elif name == 'sound' and not self.is_deferred:
+					self._check_sound(value)
 		
 		elif name == 'priority':
 			try:
@@ -681,6 +1126,9 @@ class Message(object):
 			
 			except ValueError:
 				raise TypeError('Bad {name}: expected int, got {type}'.format(name=name, type=type(value)))
+			
+			if not LOWEST <= value <= EMERGENCY:
+				raise ValueError('Bad priority: must be between -2 and 2, was {value!r}'.format(value=value))
 		
 		elif name == 'timestamp':
 			if value is not None:
@@ -691,27 +1139,105 @@ class Message(object):
 				except (TypeError, ValueError):
 					raise TypeError('Bad timestamp: expected valid int or datetime, got {value_type}.'.format(value_type=type(value)))
 		
-		elif name == 'priority':
-			try:
-				if not -2 <= int(value) <= 2:
-					raise ValueError('Bad priority: must be between -2 and 2, was {value!r}'.format(value=value))
+		elif name == 'attachment' and value is not None:
+			from .attachment import Attachment
 			
-			except TypeError:
-				raise TypeError('Bad priority: expected int, got {value_type}.'.format(value_type=type(value)))
+			if not isinstance(value, Attachment):
+				value = Attachment(value)
+		
+		if name in SHARED_FIELDS:
+			super(Message, self).__setattr__('_encoded', None)
 		
 		super(Message, self).__setattr__(name, value)
 	
+	def _check_device(self, value):
+		if self.user.is_authenticated:
+			if value not in self.user.devices:
+				raise ValueError('Bad device: must be in ({devices}), was {value!r}'.format(
+					devices=', '.join(repr(s) for s in sorted(self.user.devices)),
+					value=value,
+				))
+		else:
+			logger.warning('Unverified device: {ancestor} is unauthenticated, {value!r} may be bad'.format(
+				ancestor='application' if self.user.app._is_authenticated is False else 'user',
+				value=value
+			))
+	
+	def _check_sound(self, value):
+		if self.user.app.is_authenticated:
+			if value not in self.user.app.sounds:
+				raise ValueError('Bad sound: must be in ({sounds}), was {value!r}'.format(
+					sounds=', '.join(repr(s) for s in sorted(self.user.app.sounds.keys())),
+					value=value,
+				))
+		else:
+			logger.warning('Unverified sound: application is unauthenticated, {value!r} may be bad'.format(value=value))
+	
+	def validate(self):
+		"""
+		Runs the checks of :attr:`.device` against :attr:`User.devices` and
+		of :attr:`.sound` against :attr:`Application.sounds` that were
+		deferred at construction. These may make requests if the user or
+		application haven't been authenticated yet, so prefer
+		:func:`~chump.validate_messages` for many messages.
+		
+		:raises: :exc:`ValueError` if the device or sound is bad.
+		
+		"""
+		
+		if self.device is not None:
+			self._check_device(self.device)
+		
+		if self.sound is not None:
+			self._check_sound(self.sound)
+		
+		self.is_deferred = False
+	
 	def send(self):
 		"""
 		Sends the message. If called after the message has been sent,
-		resends it.
+		resends it, unless the application has a
+		:attr:`~chump.Application.key_store` in which the message's
+		:attr:`.idempotency_key` is recorded as sent, in which case the
+		recorded send is used instead.
 		
 		:returns: A :py:obj:`bool` indicating if the message was
 			successfully sent.
 		:rtype: A :py:obj:`bool`.
 		
+		:raises: :exc:`ValueError` if the message's validation was deferred
+			and fails.
+		:raises: :exc:`~chump.AmbiguousSendError` if the message's
+			:attr:`.idempotency_key` has a send that's still going, or that
+			may or may not have reached Pushover.
+		
 		"""
 		
+		if self.is_deferred:
+			self.validate()
+		
+		key_store = self.user.app.key_store
+		
+		if key_store is not None:
+			from .idempotency import SENT
+			
+			if self.idempotency_key is None:
+				import uuid
+				self.idempotency_key = uuid.uuid4().hex
+			
+			record = key_store.claim(self.idempotency_key)
+			
+			if record is not None:
+				if record['state'] != SENT:
+					raise AmbiguousSendError(self.idempotency_key, record)
+				
+				self.is_sent = True
+				self.sent_at = epoch_to_datetime(record['sent_at'])
+				self.error = None
+				self._sent(record)
+				
+				return self.is_sent
+		
 		self.id = None
 		
 		self.is_sent = False
@@ -719,27 +1245,22 @@ class Message(object):
 		
 		self.error = None
 		
-		data = {
-			'user': self.user.token,
-		}
-		
-		for kwarg in ('message', 'html', 'title', 'url', 'url_title', 'device', 'priority', 'sound', 'retry', 'expire', 'callback'):
-			if getattr(self, kwarg, None):
-				data[kwarg] = getattr(self, kwarg)
-		
-		if self.timestamp:
-			data['timestamp'] = datetime_to_epoch(self.timestamp)
-		
 		try:
-			# We've got to store this somewhere so that EmergencyMessage can check it for a receipt.
-			self._response, self.sent_at = self.user.app._request('message', data)
+			if self.attachment is None:
+				response, self.sent_at = self.user.app._request('message', body=self._payload())
+			
+			else:
+				response, self.sent_at = self.user.app._request('message', self._data(), attachment=self.attachment)
 		
 		except APIError as error:
 			self.is_sent = False
 			self.error = error
 			
 			# This could be handled by calling {user,app}._authenticate, but that's two extra requests.
-			if 'token' in error.bad_inputs:
+			if error.is_over_limit:
+				pass # The token's good, it's just been used too much.
+			
+			elif 'token' in error.bad_inputs:
 				self.user.app._is_authenticated = False
 				self.user.app._sounds = None
 				self.user._is_authenticated = None
@@ -748,14 +1269,199 @@ class Message(object):
 			elif 'user' in error.bad_inputs:
 				self.user._is_authenticated = False
 				self.user._devices = None
+				user_cache.invalidate((self.user.app.token, self.user.token))
+			
+			if key_store is not None:
+				self._record_failure(key_store, error)
+		
+		except Exception as error:
+			if key_store is not None:
+				self._record_failure(key_store, error)
+			
+			raise
 		
 		else:
 			self.is_sent = True
 			self.user._is_authenticated = True
 			self.user.app._is_authenticated = True
-			self.id = self._response['request']
+			self._sent(response)
+			
+			if key_store is not None:
+				key_store.set(self.idempotency_key, {
+					'state': SENT,
+					'request': response['request'],
+					'receipt': response.get('receipt'),
+					'sent_at': datetime_to_epoch(self.sent_at),
+				})
 		
 		return self.is_sent
+	
+	def _record_failure(self, key_store, error):
+		"""
+		Records a failed send as :const:`~chump.idempotency.AMBIGUOUS` if
+		Pushover may have received it, (as when it answered with a server
+		error, or the connection failed mid-request), otherwise forgets it, so
+		that it may be sent again, (as when it was rejected, or failed before
+		anything was sent).
+		
+		"""
+		
+		from .idempotency import AMBIGUOUS, TRANSPORT_ERRORS, is_unsent
+		
+		if isinstance(error, APIError) and error.id is None or isinstance(error, TRANSPORT_ERRORS) and not is_unsent(error):
+			logger.warning('Ambiguous send of message {key}: {error}'.format(key=self.idempotency_key, error=error))
+			key_store.set(self.idempotency_key, {'state': AMBIGUOUS, 'error': '{error}'.format(error=error)})
+		
+		else:
+			key_store.invalidate(self.idempotency_key)
+	
+	def _payload(self):
+		"""
+		Returns the message's urlencoded payload, (less the application's
+		token). The fields shared between recipients are only encoded once,
+		until one of them changes.
+		
+		"""
+		
+		if self._encoded is None:
+			self._encoded = bytes(urlencode(self._shared_data()), 'utf-8', 'strict')
+		
+		return bytes(urlencode(self._recipient_data()), 'utf-8', 'strict') + b'&' + self._encoded
+	
+	def _data(self):
+		"""
+		Returns the message's payload as a :py:class:`dict`, (less the
+		application's token).
+		
+		"""
+		
+		return dict(self._recipient_data() + self._shared_data())
+	
+	def _shared_data(self):
+		data = []
+		
+		for kwarg in SHARED_FIELDS:
+			value = getattr(self, kwarg, None)
+			
+			if value:
+				data.append((kwarg, ','.join(sorted(value)) if kwarg == 'tags' else value))
+		
+		return data
+	
+	def _recipient_data(self):
+		data = [('user', self.user.token)]
+		
+		if self.device:
+			data.append(('device', self.device))
+		
+		if self.timestamp:
+			data.append(('timestamp', datetime_to_epoch(self.timestamp)))
+		
+		return data
+	
+	def _sent(self, response):
+		"""
+		Extracts what's needed from a successful send's response, which isn't
+		kept.
+		
+		"""
+		
+		self.id = response['request']
+	
+	def to_compact(self):
+		"""
+		Serializes the message, including whether and when it was sent, to a
+		flat :py:obj:`tuple` of strings, numbers, and :py:obj:`None`, that
+		can be cheaply pickled, marshalled, or ``json`` encoded. Only the
+		tokens of the message's user and application are kept. The error of
+		a failed send and any attachment aren't kept.
+		
+		:rtype: A :py:obj:`tuple`.
+		
+		"""
+		
+		_shared_apps.setdefault(self.user.app.token, self.user.app)
+		_shared_users.setdefault((self.user.app.token, self.user.token), self.user)
+		
+		values = [COMPACT_VERSION, self.__class__ is EmergencyMessage, self.user.app.token, self.user.token]
+		
+		for name in self._compact_fields:
+			value = getattr(self, name)
+			
+			if isinstance(value, datetime):
+				value = datetime_to_epoch(value)
+			
+			elif isinstance(value, frozenset):
+				value = tuple(sorted(value))
+			
+			elif isinstance(value, User):
+				value = value.token
+			
+			values.append(value)
+		
+		values.append(self.idempotency_key) # Last, so older versions ignore it.
+		
+		return tuple(values)
+	
+	@staticmethod
+	def from_compact(data, app=None):
+		"""
+		Deserializes a message made by :meth:`.to_compact`, without
+		revalidating it. The message is bound to ``app``, or otherwise the
+		first :class:`~chump.Application` made for its token that's still
+		alive, (so the one a process configured with its cache, transport
+		and key store), and the :class:`~chump.User` already in use for its
+		user's token, rather than new copies.
+		
+		:param tuple data: The serialized message.
+		:param app: (optional) The application to bind the message to.
+			Defaults to :py:obj:`None`.
+		:type app: :class:`~chump.Application`
+		
+		:returns: The message.
+		:rtype: A :class:`~chump.Message` or :class:`~chump.EmergencyMessage`.
+		
+		:raises: :exc:`ValueError` if ``data`` is from an incompatible version,
+			or ``app`` has a different token.
+		
+		"""
+		
+		if data[0] != COMPACT_VERSION:
+			raise ValueError('Bad data: expected compact version {expected}, got {version!r}'.format(expected=COMPACT_VERSION, version=data[0]))
+		
+		elif app is not None and app.token != data[2]:
+			raise ValueError('Bad app: expected token {expected!r}, got {token!r}'.format(expected=data[2], token=app.token))
+		
+		message_class = EmergencyMessage if data[1] else Message
+		user = _shared_user(app if app is not None else _shared_app(data[2]), data[3])
+		
+		message = message_class.__new__(message_class)
+		object.__setattr__(message, 'user', user)
+		object.__setattr__(message, 'error', None)
+		object.__setattr__(message, 'attachment', None)
+		object.__setattr__(message, '_encoded', None)
+		
+		# Kept last, so tuples made before it was kept still load.
+		key_index = 4 + len(message_class._compact_fields)
+		object.__setattr__(message, 'idempotency_key', data[key_index] if len(data) > key_index else None)
+		
+		for name, value in zip(message_class._compact_fields, data[4:]):
+			if name == 'tags':
+				value = frozenset(value) if value else NO_TAGS
+			
+			elif value is not None:
+				if name in ('timestamp', 'sent_at', 'last_polled_at', 'last_delivered_at', 'acknowledged_at', 'expires_at', 'called_back_at'):
+					value = epoch_to_datetime(value)
+				
+				elif name == 'acknowledged_by':
+					value = user if value == user.token else _shared_user(user.app, value)
+			
+			object.__setattr__(message, name, value)
+		
+		if getattr(message, 'receipt', None):
+			user.app._emergency_messages[id(message)] = message
+		
+		return message
 
 
 class EmergencyMessage(Message):
@@ -764,24 +1470,41 @@ class EmergencyMessage(Message):
 	:const:`~chump.EMERGENCY`).
 	
 	All arguments are the same as in :class:`~chump.Message`, with the
-	additions of ``callback``, ``retry``, and ``timeout``, which
+	additions of ``callback``, ``retry``, ``timeout``, and ``tags``, which
 	are all, too, as defined in :meth:`User.create_message`.
 	
 	"""
 	
+	__slots__ = (
+		'callback', 'retry', 'expire', 'tags', 'receipt', 'last_polled_at',
+		'last_delivered_at', 'is_acknowledged', 'acknowledged_at',
+		'acknowledged_by', 'is_expired', 'expires_at', 'is_called_back',
+		'called_back_at', 'is_cancelled',
+	)
+	
+	_compact_fields = Message._compact_fields + (
+		'callback', 'retry', 'expire', 'tags', 'receipt', 'last_polled_at',
+		'last_delivered_at', 'is_acknowledged', 'acknowledged_at',
+		'acknowledged_by', 'is_expired', 'expires_at', 'is_called_back',
+		'called_back_at', 'is_cancelled',
+	)
+	
 	def __init__(self, user, message, html=False, title=None, timestamp=None,
 		         url=None, url_title=None, device=None, sound=None,
-		         callback=None, retry=30, expire=86400):
+		         callback=None, retry=30, expire=86400, tags=None,
+		         defer_validation=False, attachment=None):
 		priority = EMERGENCY
 		
 		super(EmergencyMessage, self).__init__(
 			user, message, html, title, timestamp, url,
-			url_title, device, priority, sound
+			url_title, device, priority, sound, defer_validation,
+			attachment
 		)
 		
 		self.callback = callback
 		self.retry = retry
 		self.expire = expire
+		self.tags = tags #: A :py:class:`frozenset` of the message's tags as :py:obj:`string`\s.
 		
 		self.receipt = None #: A :py:obj:`string` of the receipt returned by the endpoint, for polling.
 		self.last_polled_at = None #: A :py:class:`~datetime.datetime` of when the message was last polled.
@@ -797,6 +1520,8 @@ class EmergencyMessage(Message):
 		
 		self.is_called_back = None #: A :py:obj:`bool` indicating whether the message has been called back.
 		self.called_back_at = None #: A :py:class:`~datetime.datetime` of when the message was called back, otherwise :py:obj:`None`.
+		
+		self.is_cancelled = None #: A :py:obj:`bool` indicating whether the message has been cancelled.
 	
 	def __eq__(self, other):
 		return isinstance(other, self.__class__) and self.receipt and self.receipt == other.receipt
@@ -818,6 +1543,24 @@ class EmergencyMessage(Message):
 			elif name == 'expire' and not 0 < value <= 86400:
 				raise ValueError('Bad expire: must be 0-86400, was {value}'.format(value=value))
 		
+		elif name == 'tags':
+			if value is None:
+				value = NO_TAGS
+			
+			else:
+				if isinstance(value, basestring):
+					value = (value,)
+				
+				try:
+					value = frozenset(value)
+				
+				except TypeError:
+					raise TypeError('Bad tags: expected iterable of strings, got {value_type}'.format(value_type=type(value)))
+				
+				for tag in value:
+					if not isinstance(tag, basestring) or not TAG_RE.match(tag):
+						raise ValueError('Bad tag: expected string matching r{pattern!r}, got {value!r}'.format(pattern=TAG_RE.pattern, value=tag))
+		
 		super(EmergencyMessage, self).__setattr__(name, value)
 	
 	def send(self):
@@ -845,14 +1588,21 @@ class EmergencyMessage(Message):
 		self.is_called_back = None
 		self.called_back_at = None
 		
+		self.is_cancelled = None
+		
 		super(EmergencyMessage, self).send()
 		
 		if self.is_sent:
-			self.receipt = self._response['receipt']
+			self.user.app._emergency_messages[id(self)] = self
 			self.poll() # Poll immediately to fill attributes.
 		
 		return self.is_sent
 	
+	def _sent(self, response):
+		super(EmergencyMessage, self)._sent(response)
+		
+		self.receipt = response['receipt']
+	
 	def poll(self):
 		"""
 		Polls for the results of the sent message. If the message has not been
@@ -870,25 +1620,28 @@ class EmergencyMessage(Message):
 		
 		if self.receipt:
 			if not (self.is_expired and self.is_acknowledged and self.is_called_back):
-				self._response, self.last_polled_at = self.user.app._request('receipt', url='{endpoint}{path}{receipt}.json'.format(
+				response, self.last_polled_at = self.user.app._request('receipt', url='{endpoint}{path}{receipt}.json'.format(
 					endpoint=ENDPOINT,
 					path=REQUESTS['receipt']['path'],
 					receipt=self.receipt,
 				))
 				
 				for attr in ('acknowledged', 'expired', 'called_back'):
-					setattr(self, 'is_{attr}'.format(attr=attr), bool(self._response[attr]))
+					setattr(self, 'is_{attr}'.format(attr=attr), bool(response[attr]))
 				
 				for attr_at in ('acknowledged_at', 'expires_at', 'called_back_at', 'last_delivered_at'):
-					if self._response[attr_at]:
-						setattr(self, attr_at, epoch_to_datetime(self._response[attr_at]))
+					if response[attr_at]:
+						setattr(self, attr_at, epoch_to_datetime(response[attr_at]))
 				
-				if self._response['acknowledged_by']:
-					if self._response['acknowledged_by'] == self.user.token:
+				if response['acknowledged_by']:
+					if response['acknowledged_by'] == self.user.token:
 						self.acknowledged_by = self.user
 					
 					else:
-						self.acknowledged_by = self.user.app.get_user(self._response['acknowledged_by'])
+						self.acknowledged_by = self.user.app.get_user(response['acknowledged_by'])
+				
+				from .analytics import delivery
+				delivery.observe(self)
 			
 			return not (self.is_acknowledged or self.is_expired)
 		
@@ -905,10 +1658,491 @@ class EmergencyMessage(Message):
 		
 		"""
 		
-		self._response, self.last_polled_at = self.user.app._request('cancel', url='{endpoint}{path}{receipt}/cancel.json'.format(
+		response, self.last_polled_at = self.user.app._request('cancel', url='{endpoint}{path}{receipt}/cancel.json'.format(
 			endpoint=ENDPOINT,
 			path=REQUESTS['receipt']['path'],
 			receipt=self.receipt,
 		))
 		
-		return bool(self._response['status'])
+		self.is_cancelled = bool(response['status'])
+		
+		return self.is_cancelled
+
+
+
+# Applications and users in use, so deserialized messages can share them.
+_shared_apps = weakref.WeakValueDictionary()
+_shared_users = weakref.WeakValueDictionary()
+
+
+def _shared_app(token):
+	app = _shared_apps.get(token)
+	
+	if app is None:
+		app = _shared_apps.setdefault(token, Application(token))
+	
+	return app
+
+
+def _shared_user(app, token):
+	user = _shared_users.get((app.token, token))
+	
+	if user is None or user.app is not app:
+		user = User(app, token)
+		_shared_users[(app.token, token)] = user
+	
+	return user
+
+
+class MessageTemplate(object):
+	"""
+	A message to be sent to many users. The fields shared between recipients
+	are taken from an unsent prototype message, (so are validated once, when
+	it was created), and urlencoded once. Messages created from the template
+	only validate and encode their recipient, device, and timestamp.
+	
+	:param message: The prototype message. Its recipient, device,
+		timestamp, and :attr:`~Message.idempotency_key` are ignored, (so
+		set each created message's own), and later changes to it don't
+		affect the template.
+	:type message: :class:`~chump.Message` or :class:`~chump.EmergencyMessage`
+	
+	"""
+	
+	def __init__(self, message):
+		if message.is_sent:
+			raise ValueError('Bad message: expected an unsent message, got {message!r}'.format(message=message))
+		
+		self._prototype = self._copy(message)
+		self._prototype._payload()
+		self._encoded = self._prototype._encoded
+	
+	def __unicode__(self):
+		return "Pushover Message Template: {message}".format(message=self._prototype)
+	
+	__str__ = __unicode__
+	
+	def __repr__(self):
+		return 'MessageTemplate(message={message!r})'.format(message=self._prototype)
+	
+	@staticmethod
+	def _copy(message):
+		"""
+		Copies a message without revalidating its fields, as unsent, and
+		without its :attr:`~Message.idempotency_key`, which would otherwise
+		make every recipient's send look like the first's.
+		
+		"""
+		
+		copy = message.__class__.__new__(message.__class__)
+		set_slots_state(copy, get_slots_state(message))
+		
+		copy.id = None
+		copy.is_sent = False
+		copy.sent_at = None
+		copy.error = None
+		copy.idempotency_key = None
+		
+		return copy
+	
+	def create_message(self, user, device=None, timestamp=None):
+		"""
+		Creates a message to ``user`` from the template.
+		
+		:param user: The user to send the message to.
+		:type user: :class:`~chump.User`
+		:param string device: (optional) As in :meth:`User.create_message`.
+		:param timestamp: (optional) As in :meth:`User.create_message`.
+		:type timestamp: :py:class:`~datetime.datetime` or :py:obj:`int`
+		
+		:returns: An unsent message.
+		:rtype: A :class:`~chump.Message` or :class:`~chump.EmergencyMessage`.
+		
+		"""
+		
+		message = self._copy(self._prototype)
+		message.user = user
+		
+		# Sounds belong to applications, so need checking against any other.
+		if message.sound is not None and user.app is not self._prototype.user.app and not message.is_deferred:
+			message._check_sound(message.sound)
+		
+		message.device = device
+		message.timestamp = timestamp
+		message._encoded = self._encoded
+		
+		return message
+	
+	def send_message(self, user, device=None, timestamp=None):
+		"""
+		Does the same as :meth:`.create_message`, but then sends the message.
+		
+		:returns: A sent message.
+		:rtype: A :class:`~chump.Message` or :class:`~chump.EmergencyMessage`.
+		
+		"""
+		
+		message = self.create_message(user, device, timestamp)
+		message.send()
+		
+		return message
+
+
+def _prefetch(checks, concurrency):
+	"""
+	Fetches what the deferred checks of many messages need, given as the
+	(``user``, ``device``, ``sound``) of each. Each application is
+	authenticated, (loading its sounds if any message has one), at most
+	once, and each user whose device needs checking is validated
+	concurrently with :meth:`Application.validate_users`, (consulting the
+	shared caches first). A failed fetch doesn't stop the rest.
+	
+	Returns a :py:class:`dict` of the errors of the fetches that failed,
+	keyed by ``id(app)`` for applications and by (``id(app)``, ``token``)
+	for users.
+	
+	"""
+	
+	from .idempotency import TRANSPORT_ERRORS
+	
+	apps = {}
+	sounds = set()
+	users = {}
+	failures = {}
+	
+	for user, device, sound in checks:
+		if device is not None or sound is not None:
+			apps.setdefault(id(user.app), user.app)
+		
+		if sound is not None:
+			sounds.add(id(user.app))
+		
+		if device is not None and user._is_authenticated is None:
+			users.setdefault(id(user.app), {}).setdefault(user.token, []).append(user)
+	
+	for app_id, app in apps.items():
+		if app._is_authenticated is None or app_id in sounds and app._sounds is None and app._is_authenticated is not False:
+			try:
+				failure = app._authenticate()
+			
+			except TRANSPORT_ERRORS as error:
+				failure = error
+			
+			if failure is not None:
+				failures[app_id] = failure
+	
+	for app_id, app_users in users.items():
+		app = apps[app_id]
+		
+		if app._is_authenticated is False or app_id in failures:
+			continue
+		
+		for token, validated in app.validate_users(list(app_users), concurrency):
+			if isinstance(validated, User):
+				for user in app_users[token]:
+					user._is_authenticated = validated._is_authenticated
+					user._devices = set(validated._devices) if validated._devices is not None else None
+			
+			elif validated is not None:
+				failures[(app_id, token)] = validated
+	
+	return failures
+
+
+def _prefetch_failure(failures, user, device, sound):
+	# The error of a fetch a message's checks needed, otherwise None.
+	if device is None and sound is None:
+		return None
+	
+	return failures.get(id(user.app)) or (failures.get((id(user.app), user.token)) if device is not None else None)
+
+
+def validate_messages(messages, concurrency=8):
+	"""
+	Runs the deferred validation of many messages at once. Each application
+	is authenticated at most once, and each user whose device needs
+	checking is validated concurrently with
+	:meth:`Application.validate_users`, (consulting the shared caches first),
+	before every message is checked against the results.
+	
+	:param messages: The messages to validate.
+	:type messages: An iterable of :class:`~chump.Message`
+	:param int concurrency: (optional) How many users to validate at once.
+		Defaults to 8.
+	
+	:returns: (``message``, ``error``) pairs for each message that
+		failed validation, or couldn't be checked, (with the exception,
+		such as a :exc:`~urllib.error.URLError`, that stopped it).
+	:rtype: A :py:obj:`list`.
+	
+	"""
+	
+	messages = list(messages)
+	failures = _prefetch(((message.user, message.device, message.sound) for message in messages), concurrency)
+	errors = []
+	
+	for message in messages:
+		failure = _prefetch_failure(failures, message.user, message.device, message.sound)
+		
+		if failure is not None:
+			errors.append((message, failure))
+			continue
+		
+		try:
+			message.validate()
+		
+		except ValueError as error:
+			errors.append((message, error))
+	
+	return errors
+
+
+def _as_int(value):
+	# Coerces as Message does, with int(), returning None if it can't.
+	try: return int(value)
+	except (TypeError, ValueError, OverflowError): return None
+
+
+def validate_batch(specs, app=None, concurrency=8):
+	"""
+	Checks many messages before any is made, such as the rows of a large
+	import, in one pass, collecting every problem with each rather than
+	stopping at the first. Each message is given as a :py:class:`dict` of
+	the arguments of :meth:`User.create_message`, with its ``user`` token,
+	and its application's ``token`` unless ``app`` is given.
+	
+	Fields are checked locally first, and only then are the devices and
+	sounds of the specs that passed checked against :attr:`User.devices`
+	and :attr:`Application.sounds`, fetching those not already cached just
+	as :func:`validate_messages` does. Messages are only made for the specs
+	that pass every check. As in :meth:`Message.validate`, devices and
+	sounds that can't be checked, as the user or application isn't
+	authenticated, pass, but a spec whose fetch failed, (such as with a
+	:exc:`~urllib.error.URLError`), fails with the error.
+	
+	:param specs: The messages' arguments.
+	:type specs: An iterable of :py:class:`dict`
+	:param app: (optional) The application of specs without a ``token``.
+		Defaults to :py:obj:`None`.
+	:type app: :class:`~chump.Application` or :py:obj:`string`
+	:param int concurrency: (optional) How many users to validate at once.
+		Defaults to 8.
+	
+	:returns: A (``message``, ``errors``) pair for each spec, in order,
+		where ``message`` is the unsent, validated message, or
+		:py:obj:`None` if ``errors``, a :py:obj:`list` of every
+		:exc:`ValueError` and :exc:`TypeError` found, (or the error of a
+		failed fetch), isn't empty.
+	:rtype: A :py:obj:`list`.
+	
+	"""
+	
+	apps = {}
+	users = {}
+	rows = []
+	
+	if isinstance(app, basestring):
+		app = _shared_app(app)
+	
+	if app is not None:
+		apps[app.token] = app
+	
+	for spec in specs:
+		if not isinstance(spec, dict):
+			rows.append((None, None, [TypeError('Bad spec: expected dict, got {value_type}'.format(value_type=type(spec)))]))
+			continue
+		
+		errors = []
+		user = None
+		kwargs = dict((key, value) for key, value in spec.items() if key in MESSAGE_FIELDS)
+		unexpected = set(spec) - MESSAGE_FIELDS - set(('token', 'user'))
+		
+		if unexpected:
+			errors.append(ValueError('Bad spec: unexpected keys {keys}'.format(keys=', '.join(sorted(unexpected)))))
+		
+		app_token = spec.get('token', app.token if app is not None else None)
+		user_token = spec.get('user')
+		
+		if app_token is None:
+			errors.append(ValueError('Bad spec: expected token, or an app for every spec'))
+		
+		elif not isinstance(app_token, basestring) or not TOKEN_RE.match(app_token):
+			errors.append(ValueError('Bad application token: expected string matching r{pattern!r}, got {value!r}'.format(pattern=TOKEN_RE.pattern, value=app_token)))
+		
+		if not isinstance(user_token, basestring) or not TOKEN_RE.match(user_token):
+			errors.append(ValueError('Bad user token: expected string matching r{pattern!r}, got {value!r}'.format(pattern=TOKEN_RE.pattern, value=user_token)))
+		
+		elif not errors:
+			user = users.get((app_token, user_token))
+			
+			if user is None:
+				if app_token not in apps:
+					apps[app_token] = _shared_app(app_token)
+				
+				user = users[(app_token, user_token)] = _shared_user(apps[app_token], user_token)
+		
+		for name, max_length in FIELD_LENGTHS:
+			value = kwargs.get(name)
+			
+			if value is None:
+				if name == 'message':
+					errors.append(ValueError('Bad spec: expected message'))
+			
+			elif not isinstance(value, basestring):
+				errors.append(TypeError('Bad {name}: expected string, got {type}'.format(name=name, type=type(value))))
+			
+			elif name == 'message' and not value:
+				errors.append(ValueError('Bad message: must be 0-{max_length} characters, was 0'.format(max_length=max_length)))
+			
+			elif max_length is not None and len(value) > max_length:
+				errors.append(ValueError('Bad {name}: must be <= {max_length} characters, was {length}'.format(name=name, max_length=max_length, length=len(value))))
+			
+			elif name == 'device' and not DEVICE_RE.match(value):
+				errors.append(ValueError('Bad device: expected string matching r{pattern!r}, got {value!r}'.format(pattern=DEVICE_RE.pattern, value=value)))
+		
+		html = kwargs.get('html', False)
+		
+		if not isinstance(html, bool) and _as_int(html) not in (0, 1):
+			errors.append(TypeError('Bad html: expected bool, got {value_type}'.format(value_type=type(html))))
+		
+		timestamp = kwargs.get('timestamp')
+		
+		if timestamp is not None and not isinstance(timestamp, datetime):
+			try: kwargs['timestamp'] = epoch_to_datetime(timestamp)
+			except (TypeError, ValueError, OverflowError, OSError): errors.append(TypeError('Bad timestamp: expected valid int or datetime, got {value_type}.'.format(value_type=type(timestamp))))
+		
+		priority = kwargs['priority'] = _as_int(kwargs.get('priority', NORMAL))
+		
+		if priority is None:
+			errors.append(TypeError('Bad priority: expected int, got {type}'.format(type=type(spec['priority']))))
+		
+		elif not LOWEST <= priority <= EMERGENCY:
+			errors.append(ValueError('Bad priority: must be between -2 and 2, was {value!r}'.format(value=priority)))
+		
+		elif priority == EMERGENCY:
+			retry = kwargs['retry'] = _as_int(kwargs.get('retry', 30))
+			expire = kwargs['expire'] = _as_int(kwargs.get('expire', 86400))
+			
+			if retry is None:
+				errors.append(TypeError('Bad retry: expected int, got {type}'.format(type=type(spec['retry']))))
+			
+			elif retry < 30:
+				errors.append(ValueError('Bad retry: must be >= 30, was {value}'.format(value=retry)))
+			
+			if expire is None:
+				errors.append(TypeError('Bad expire: expected int, got {type}'.format(type=type(spec['expire']))))
+			
+			elif not 0 < expire <= 86400:
+				errors.append(ValueError('Bad expire: must be 0-86400, was {value}'.format(value=expire)))
+			
+			tags = kwargs.get('tags')
+			
+			try:
+				tags = frozenset((tags,) if isinstance(tags, basestring) else tags or ())
+			
+			except TypeError:
+				errors.append(TypeError('Bad tags: expected iterable of strings, got {value_type}'.format(value_type=type(tags))))
+			
+			else:
+				for tag in tags:
+					if not isinstance(tag, basestring) or not TAG_RE.match(tag):
+						errors.append(ValueError('Bad tag: expected string matching r{pattern!r}, got {value!r}'.format(pattern=TAG_RE.pattern, value=tag)))
+		
+		if kwargs.get('attachment') is not None and not errors:
+			from .attachment import Attachment
+			
+			if not isinstance(kwargs['attachment'], Attachment):
+				try: kwargs['attachment'] = Attachment(kwargs['attachment'])
+				except (IOError, OSError, TypeError, ValueError) as error: errors.append(error)
+		
+		rows.append((kwargs, user, errors))
+	
+	# Only the specs that passed need their devices and sounds checked.
+	failures = _prefetch(((user, kwargs.get('device'), kwargs.get('sound')) for kwargs, user, errors in rows if not errors), concurrency)
+	results = []
+	
+	for kwargs, user, errors in rows:
+		if not errors:
+			device = kwargs.get('device')
+			sound = kwargs.get('sound')
+			failure = _prefetch_failure(failures, user, device, sound)
+			
+			if failure is not None:
+				errors.append(failure)
+			
+			else:
+				if device is not None and user.app._is_authenticated is True and user._is_authenticated and device not in user._devices:
+					errors.append(ValueError('Bad device: must be in ({devices}), was {value!r}'.format(
+						devices=', '.join(repr(s) for s in sorted(user._devices)),
+						value=device,
+					)))
+				
+				if sound is not None and user.app._is_authenticated is True and sound not in user.app.sounds:
+					errors.append(ValueError('Bad sound: must be in ({sounds}), was {value!r}'.format(
+						sounds=', '.join(repr(s) for s in sorted(user.app.sounds.keys())),
+						value=sound,
+					)))
+		
+		if errors:
+			results.append((None, errors))
+			continue
+		
+		# The checks above should catch anything create_message would raise,
+		# but a bad row mustn't stop the batch if they don't.
+		try:
+			message = user.create_message(defer_validation=True, **kwargs)
+		
+		except (TypeError, ValueError, OverflowError) as error:
+			results.append((None, [error]))
+			continue
+		
+		message.is_deferred = False
+		results.append((message, []))
+	
+	return results
+
+
+# Public names whose modules are only imported on first use.
+LAZY_ATTRIBUTES = {
+	'Attachment': '.attachment',
+	'MAX_ATTACHMENT_SIZE': '.attachment',
+	'MultipartBody': '.attachment',
+	'CallbackServer': '.callback',
+	'MetricsRegistry': '.metrics',
+	'ApplicationPool': '.application_pool',
+	'PushoverHandler': '.handlers',
+	'MemoryKeyStore': '.idempotency',
+	'FileKeyStore': '.idempotency',
+	'DeliveryAnalytics': '.analytics',
+	'QuantileSketch': '.analytics',
+	'pool': '.connection_pool',
+}
+
+# Submodules that are also only imported on first use, (as chump.metrics).
+LAZY_MODULES = frozenset(('metrics',))
+
+
+def __getattr__(name):
+	if name == 'utc':
+		load_timezone()
+		return utc
+	
+	elif name in LAZY_ATTRIBUTES:
+		value = getattr(importlib.import_module(LAZY_ATTRIBUTES[name], __name__), name)
+		globals()[name] = value
+		return value
+	
+	elif name in LAZY_MODULES:
+		return importlib.import_module('.' + name, __name__)
+	
+	raise AttributeError('module {module!r} has no attribute {name!r}'.format(module=__name__, name=name))
+
+
+if sys.version_info < (3, 7): # No module __getattr__, so load everything now.
+	load_timezone()
+	
+	for name in LAZY_ATTRIBUTES:
+		__getattr__(name)
+	
+	for name in LAZY_MODULES:
+		__getattr__(name)
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import math
+import threading
+from collections import OrderedDict
+
+from . import datetime_to_epoch
+
+
+#: Quantiles summarized by :meth:`DeliveryAnalytics.snapshot`.
+QUANTILES = (0.5, 0.9, 0.99)
+
+MIN_VALUE = 0.001 # Latencies, in seconds, counted as zero.
+
+# Dimensions latencies are kept by, and the messages' values of them.
+DIMENSIONS = (
+	('user', lambda message: message.user.token),
+	('device', lambda message: message.device or '*'),
+	('priority', lambda message: message.priority),
+)
+
+
+class QuantileSketch(object):
+	"""
+	A streaming estimate of the distribution of non-negative values, such
+	as latencies in seconds, from which any quantile can be read to within
+	``relative_accuracy`` of its true value. Values are counted in buckets
+	whose bounds grow geometrically, so its size depends on the range of
+	the values rather than on how many there are, and sketches with the
+	same accuracy can be merged exactly.
+	
+	:param float relative_accuracy: (optional) The largest error of a
+		quantile, relative to its value. Defaults to 0.01.
+	:param int max_buckets: (optional) Most buckets to keep. Once exceeded,
+		the lowest are merged, losing the accuracy of the lowest quantiles.
+		Defaults to 2048, which keeps 1% accuracy from a millisecond to
+		over a year.
+	
+	"""
+	
+	def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+		if not 0 < relative_accuracy < 1:
+			raise ValueError('Bad relative_accuracy: expected between 0 and 1, got {value!r}'.format(value=relative_accuracy))
+		
+		self.relative_accuracy = relative_accuracy #: A :py:obj:`float` of the largest error of a quantile, relative to its value.
+		self.max_buckets = max_buckets #: An :py:obj:`int` of the most buckets kept.
+		
+		self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+		self.log_gamma = math.log(self.gamma)
+		
+		self.buckets = {}
+		self.zeros = 0
+		
+		self.count = 0 #: An :py:obj:`int` of the values added.
+		self.sum = 0.0 #: A :py:obj:`float` of the sum of the values added.
+		self.min = None #: The smallest value added, otherwise :py:obj:`None`.
+		self.max = None #: The largest value added, otherwise :py:obj:`None`.
+	
+	def __len__(self):
+		return self.count
+	
+	def __repr__(self):
+		return 'QuantileSketch(relative_accuracy={relative_accuracy!r}, max_buckets={max_buckets!r})'.format(
+			relative_accuracy=self.relative_accuracy,
+			max_buckets=self.max_buckets,
+		)
+	
+	def add(self, value, count=1):
+		"""
+		Adds ``value``, ``count`` times. Negative values, (such as from clock
+		skew), are added as zero.
+		
+		"""
+		
+		value = max(0.0, value)
+		
+		self.count += count
+		self.sum += value * count
+		self.min = value if self.min is None else min(self.min, value)
+		self.max = value if self.max is None else max(self.max, value)
+		
+		if value < MIN_VALUE:
+			self.zeros += count
+		
+		else:
+			index = int(math.ceil(math.log(value) / self.log_gamma))
+			self.buckets[index] = self.buckets.get(index, 0) + count
+			
+			if len(self.buckets) > self.max_buckets:
+				self._collapse()
+	
+	def _collapse(self):
+		indexes = sorted(self.buckets)
+		excess = indexes[:len(indexes) - self.max_buckets + 1]
+		self.buckets[excess[-1]] += sum(self.buckets.pop(index) for index in excess[:-1])
+	
+	def quantile(self, q):
+		"""
+		Returns the estimated value at quantile ``q``, (from 0 to 1), or
+		:py:obj:`None` if no values have been added.
+		
+		"""
+		
+		if not self.count:
+			return None
+		
+		rank = q * (self.count - 1)
+		seen = self.zeros
+		
+		if rank < seen:
+			return self.min
+		
+		for index in sorted(self.buckets):
+			seen += self.buckets[index]
+			
+			if rank < seen:
+				value = 2 * self.gamma ** index / (self.gamma + 1)
+				return min(max(value, self.min), self.max)
+		
+		return self.max
+	
+	def merge(self, other):
+		"""
+		Adds the values of another sketch with the same accuracy.
+		
+		:raises: :exc:`ValueError` if the sketches' accuracies differ.
+		
+		"""
+		
+		if other.relative_accuracy != self.relative_accuracy:
+			raise ValueError('Bad sketch: expected relative_accuracy {expected!r}, got {value!r}'.format(expected=self.relative_accuracy, value=other.relative_accuracy))
+		
+		if not other.count:
+			return
+		
+		for index, count in other.buckets.items():
+			self.buckets[index] = self.buckets.get(index, 0) + count
+		
+		self.zeros += other.zeros
+		self.count += other.count
+		self.sum += other.sum
+		self.min = other.min if self.min is None else min(self.min, other.min)
+		self.max = other.max if self.max is None else max(self.max, other.max)
+		
+		if len(self.buckets) > self.max_buckets:
+			self._collapse()
+	
+	def to_dict(self):
+		"""
+		Returns the sketch as a ``json`` serializable :py:class:`dict`, that
+		:meth:`.from_dict` can load.
+		
+		"""
+		
+		return {
+			'relative_accuracy': self.relative_accuracy,
+			'max_buckets': self.max_buckets,
+			'buckets': dict((str(index), count) for index, count in self.buckets.items()),
+			'zeros': self.zeros,
+			'count': self.count,
+			'sum': self.sum,
+			'min': self.min,
+			'max': self.max,
+		}
+	
+	@classmethod
+	def from_dict(cls, data):
+		"""
+		Loads a sketch made by :meth:`.to_dict`.
+		
+		"""
+		
+		sketch = cls(data['relative_accuracy'], data['max_buckets'])
+		sketch.buckets = dict((int(index), count) for index, count in data['buckets'].items())
+		sketch.zeros = data['zeros']
+		sketch.count = data['count']
+		sketch.sum = data['sum']
+		sketch.min = data['min']
+		sketch.max = data['max']
+		
+		return sketch
+	
+	def summary(self, quantiles=QUANTILES):
+		"""
+		Returns a :py:class:`dict` of the ``count``, ``sum``, ``min``,
+		``max``, ``mean`` and ``quantiles``, (keyed as ``p50`` and so on).
+		
+		"""
+		
+		return {
+			'count': self.count,
+			'sum': self.sum,
+			'min': self.min,
+			'max': self.max,
+			'mean': self.sum / self.count if self.count else None,
+			'quantiles': dict(('p{percent:g}'.format(percent=q * 100), self.quantile(q)) for q in quantiles),
+		}
+
+
+class DeliveryAnalytics(object):
+	"""
+	Aggregates how long sent :class:`~chump.EmergencyMessage`\\s take to be
+	delivered, and then acknowledged, as :class:`QuantileSketch`\\es, over
+	all messages and by user, device, and priority, (and, for
+	acknowledgement, by who acknowledged). Each message's timestamps are
+	observed as it's polled or called back, and each latency is counted
+	once, however often the message is polled. Delivery latency is to the
+	first delivery seen, not Pushover's last.
+	
+	Memory is bounded: only the ``max_keys`` most recently updated values of
+	each dimension, and the ``max_receipts`` most recently observed
+	messages, are kept.
+	
+	:param float relative_accuracy: (optional) As in
+		:class:`QuantileSketch`. Defaults to 0.01.
+	:param int max_keys: (optional) Most values kept of each dimension.
+		Defaults to 1024.
+	:param int max_receipts: (optional) Most messages remembered, to count
+		their latencies once. Defaults to 65536.
+	
+	"""
+	
+	def __init__(self, relative_accuracy=0.01, max_keys=1024, max_receipts=65536):
+		self.relative_accuracy = relative_accuracy #: A :py:obj:`float` of the sketches' relative accuracy.
+		self.max_keys = max_keys #: An :py:obj:`int` of the most values kept of each dimension.
+		self.max_receipts = max_receipts #: An :py:obj:`int` of the most messages remembered.
+		
+		self.lock = threading.Lock()
+		self.reset()
+	
+	def __repr__(self):
+		return 'DeliveryAnalytics(relative_accuracy={relative_accuracy!r}, max_keys={max_keys!r})'.format(
+			relative_accuracy=self.relative_accuracy,
+			max_keys=self.max_keys,
+		)
+	
+	def reset(self):
+		"""
+		Forgets all observations.
+		
+		"""
+		
+		self.lock.acquire()
+		try:
+			self.receipts = OrderedDict()
+			self.latencies = {
+				'delivery': {'all': QuantileSketch(self.relative_accuracy)},
+				'acknowledgement': {'all': QuantileSketch(self.relative_accuracy)},
+			}
+			
+			for name, _ in DIMENSIONS:
+				self.latencies['delivery'][name] = OrderedDict()
+				self.latencies['acknowledgement'][name] = OrderedDict()
+			
+			self.latencies['acknowledgement']['acknowledged_by'] = OrderedDict()
+		
+		finally:
+			self.lock.release()
+	
+	def _add(self, latency, dimension, key, seconds):
+		sketches = self.latencies[latency][dimension]
+		sketch = sketches.pop(key, None)
+		
+		if sketch is None:
+			sketch = QuantileSketch(self.relative_accuracy)
+			
+			while len(sketches) >= self.max_keys:
+				sketches.popitem(last=False)
+		
+		sketches[key] = sketch
+		sketch.add(seconds)
+	
+	def _add_all(self, latency, message, seconds):
+		self.latencies[latency]['all'].add(seconds)
+		
+		for dimension, value_of in DIMENSIONS:
+			self._add(latency, dimension, value_of(message), seconds)
+	
+	def observe(self, message):
+		"""
+		Counts the latencies of a message not yet counted.
+		
+		:param message: A sent message.
+		:type message: :class:`~chump.EmergencyMessage`
+		
+		"""
+		
+		receipt = getattr(message, 'receipt', None)
+		
+		if not receipt or message.sent_at is None:
+			return
+		
+		sent_at = datetime_to_epoch(message.sent_at)
+		delivered_at = datetime_to_epoch(message.last_delivered_at) if message.last_delivered_at else None
+		acknowledged_at = datetime_to_epoch(message.acknowledged_at) if message.is_acknowledged and message.acknowledged_at else None
+		
+		self.lock.acquire()
+		try:
+			state = self.receipts.pop(receipt, None) or [None, False] # First delivered at, and acknowledgement counted.
+			self.receipts[receipt] = state
+			
+			while len(self.receipts) > self.max_receipts:
+				self.receipts.popitem(last=False)
+			
+			if state[0] is None and delivered_at is not None:
+				state[0] = delivered_at
+				self._add_all('delivery', message, delivered_at - sent_at)
+			
+			if not state[1] and acknowledged_at is not None:
+				state[1] = True
+				seconds = acknowledged_at - (state[0] if state[0] is not None else sent_at)
+				self._add_all('acknowledgement', message, seconds)
+				
+				if message.acknowledged_by is not None:
+					self._add('acknowledgement', 'acknowledged_by', message.acknowledged_by.token, seconds)
+		
+		finally:
+			self.lock.release()
+	
+	def snapshot(self, quantiles=QUANTILES, sketches=False):
+		"""
+		Returns a point in time summary of the latencies, in seconds, as a
+		``json`` serializable :py:class:`dict` with the keys ``delivery``
+		and ``acknowledgement``, each a :py:class:`dict` with:
+		
+		* ``all``: A summary of every message's latency, as in
+		  :meth:`QuantileSketch.summary`.
+		* ``user``, ``device``, and ``priority``: :py:class:`dict`\\s of
+		  summaries by each value of the dimension. Messages to all of a
+		  user's devices have the device ``*``.
+		
+		and ``acknowledgement`` also with ``acknowledged_by``.
+		
+		:param quantiles: (optional) Quantiles to summarize. Defaults to
+			:const:`QUANTILES`.
+		:param bool sketches: (optional) Whether to include each summary's
+			sketch, as in :meth:`QuantileSketch.to_dict`, under ``sketch``,
+			so that snapshots from several processes can be merged. Defaults
+			to :py:obj:`False`.
+		
+		:rtype: A :py:class:`dict`.
+		
+		"""
+		
+		def summarize(sketch):
+			summary = sketch.summary(quantiles)
+			
+			if sketches:
+				summary['sketch'] = sketch.to_dict()
+			
+			return summary
+		
+		self.lock.acquire()
+		try:
+			snapshot = {}
+			
+			for latency, dimensions in self.latencies.items():
+				snapshot[latency] = {}
+				
+				for dimension, values in dimensions.items():
+					if dimension == 'all':
+						snapshot[latency][dimension] = summarize(values)
+					
+					else:
+						snapshot[latency][dimension] = dict(('{key}'.format(key=key), summarize(sketch)) for key, sketch in values.items())
+			
+			return snapshot
+		
+		finally:
+			self.lock.release()
+
+
+#: The analytics all polled and called back emergency messages are observed by.
+delivery = DeliveryAnalytics()
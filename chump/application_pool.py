@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import threading
+import time
+import zlib
+
+from . import Application, datetime_to_epoch, logger
+from .cache import TTLCache
+
+try: basestring # Python 2
+except NameError: basestring = str # Python 3
+
+
+MAX_USERS = 4096 # Most users, across its applications, a pool keeps between messages.
+
+
+def affinity(app_token, user_token):
+	# Rendezvous hashing: a user's applications rank the same in every
+	# process, and only the users of an application that's removed move.
+	# A checksum rather than a cryptographic hash, as those may be refused
+	# in FIPS mode.
+	return zlib.crc32('{app}:{user}'.format(app=app_token, user=user_token).encode('utf-8')) & 0xffffffff
+
+
+class ApplicationPool(object):
+	"""
+	Sends messages through whichever of several applications has the most
+	of its monthly limit remaining, (as of its last message), to send more
+	than one application may. An application that's refused a message for
+	its limit is skipped until its limit resets, and the message is sent
+	through the next instead.
+	
+	:param apps: The applications, or their API tokens.
+	:type apps: An iterable of :class:`~chump.Application` or
+		:py:obj:`string`
+	:param bool sticky: (optional) Whether each user's messages should come
+		from the same application while it's available, (so they see the
+		same name, icon and sounds), rather than the one with the most
+		remaining. Defaults to :py:obj:`False`.
+	:param int cooldown: (optional) Seconds an application that's refused a
+		message for its limit is skipped for, if when its limit resets isn't
+		known. Defaults to 3600.
+	
+	:raises: :exc:`ValueError` if ``apps`` is empty.
+	
+	"""
+	
+	def __init__(self, apps, sticky=False, cooldown=3600):
+		self.apps = [Application(app) if isinstance(app, basestring) else app for app in apps] #: A :py:obj:`list` of the :class:`~chump.Application`\s.
+		self.sticky = sticky #: A :py:obj:`bool` indicating whether each user's messages come from the same application while it's available.
+		self.cooldown = cooldown #: An :py:obj:`int` of seconds an application refused for its limit is skipped for, if its reset isn't known.
+		
+		if not self.apps:
+			raise ValueError('Bad apps: expected at least one application')
+		
+		self.lock = threading.Lock()
+		self.exhausted = {} # Application token: when it may be used again.
+		self.users = TTLCache(maxsize=MAX_USERS)
+	
+	def __unicode__(self):
+		return "Pushover Application Pool: {tokens}".format(tokens=', '.join(app.token for app in self.apps))
+	
+	__str__ = __unicode__
+	
+	def __repr__(self):
+		return 'ApplicationPool(apps={apps!r}, sticky={sticky!r})'.format(apps=self.apps, sticky=self.sticky)
+	
+	@property
+	def remaining(self):
+		"""
+		An :py:obj:`int` of the messages the applications have remaining
+		between them, of those that have sent a message, otherwise
+		:py:obj:`None`.
+		
+		"""
+		
+		remaining = [app.remaining for app in self.apps if app.remaining is not None]
+		
+		return sum(remaining) if remaining else None
+	
+	def _available_at(self, app):
+		self.lock.acquire()
+		try: available_at = self.exhausted.get(app.token, 0)
+		finally: self.lock.release()
+		
+		if app.remaining == 0 and app.reset is not None:
+			available_at = max(available_at, datetime_to_epoch(app.reset))
+		
+		return available_at
+	
+	def _exhaust(self, app):
+		available_at = datetime_to_epoch(app.reset) if app.reset is not None else 0
+		
+		if available_at <= time.time():
+			available_at = time.time() + self.cooldown
+		
+		logger.warning('Application {token} is over its limit, skipping it until {available_at}'.format(
+			token=app.token,
+			available_at=time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime(available_at)),
+		))
+		
+		self.lock.acquire()
+		try: self.exhausted[app.token] = available_at
+		finally: self.lock.release()
+	
+	def route(self, user, sticky=None):
+		"""
+		Returns the applications to try sending a message to a user through,
+		in order: those available first, then those over their limit, by
+		when they'll next be available.
+		
+		:param string user: The user's API token.
+		:param bool sticky: (optional) Overrides :attr:`.sticky`.
+		
+		:rtype: A :py:obj:`list` of :class:`~chump.Application`.
+		
+		"""
+		
+		now = time.time()
+		sticky = self.sticky if sticky is None else sticky
+		
+		if sticky:
+			preference = lambda app: affinity(app.token, user)
+		
+		else:
+			preference = lambda app: app.remaining if app.remaining is not None else float('inf')
+		
+		ranked = sorted(self.apps, key=preference, reverse=True)
+		available_at = dict((app.token, self._available_at(app)) for app in ranked)
+		
+		return (
+			[app for app in ranked if available_at[app.token] <= now] +
+			sorted((app for app in ranked if available_at[app.token] > now), key=lambda app: available_at[app.token])
+		)
+	
+	def get_user(self, token):
+		"""
+		Returns a :class:`~chump.application_pool.PooledUser` that sends
+		through the pool.
+		
+		:param string token: User API token.
+		:rtype: A :class:`~chump.application_pool.PooledUser`.
+		
+		"""
+		
+		return PooledUser(self, token)
+	
+	def _user(self, app, token):
+		# One User per application, so each's validation is kept.
+		user = self.users.get((app.token, token))
+		
+		if user is None:
+			user = app.get_user(token)
+			self.users.set((app.token, token), user)
+		
+		return user
+	
+	def send_message(self, user, message, sticky=None, **kwargs):
+		"""
+		Does the same as :meth:`~chump.User.send_message`, through the first
+		application of :meth:`.route` that doesn't refuse the message for its
+		limit.
+		
+		:param string user: The user's API token.
+		:param string message: Body for the message.
+		:param bool sticky: (optional) Overrides :attr:`.sticky`.
+		
+		All other arguments are the same as in :meth:`~chump.User.send_message`.
+		
+		:returns: The message sent, or if every application refused it, the
+			last refused.
+		:rtype: A :class:`~chump.Message` or :class:`~chump.EmergencyMessage`.
+		
+		"""
+		
+		for app in self.route(user, sticky):
+			sent = self._user(app, user).send_message(message, **kwargs)
+			
+			if sent.error is None or not sent.error.is_over_limit:
+				return sent
+			
+			self._exhaust(app)
+		
+		return sent
+
+
+class PooledUser(object):
+	"""
+	A Pushover user whose messages are sent through an
+	:class:`~chump.application_pool.ApplicationPool`.
+	
+	:param pool: The pool to send messages through.
+	:type pool: :class:`~chump.application_pool.ApplicationPool`
+	:param string token: The user's API token.
+	
+	"""
+	
+	def __init__(self, pool, token):
+		self.pool = pool #: The :class:`~chump.application_pool.ApplicationPool` messages are sent through.
+		self.token = token #: A :py:obj:`string` of the user's API token.
+	
+	def __unicode__(self):
+		return "Pushover Pooled User: {token}".format(token=self.token)
+	
+	__str__ = __unicode__
+	
+	def __repr__(self):
+		return 'PooledUser(pool={pool!r}, token={token!r})'.format(pool=self.pool, token=self.token)
+	
+	def send_message(self, message, **kwargs):
+		"""
+		Does the same as :meth:`ApplicationPool.send_message
+		<chump.application_pool.ApplicationPool.send_message>` to this user.
+		
+		"""
+		
+		return self.pool.send_message(self.token, message, **kwargs)
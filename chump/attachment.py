@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import io
+import mimetypes
+import os
+import uuid
+
+
+try: basestring # Python 2
+except NameError: basestring = str # Python 3
+
+
+MAX_ATTACHMENT_SIZE = 5242880 #: The largest attachment Pushover accepts, in bytes.
+CHUNK_SIZE = 65536 #: Bytes read and sent at a time when streaming an attachment.
+
+# Leading bytes of the image formats Pushover displays.
+SIGNATURES = (
+	(b'\xff\xd8\xff', 'image/jpeg'),
+	(b'\x89PNG\r\n\x1a\n', 'image/png'),
+	(b'GIF87a', 'image/gif'),
+	(b'GIF89a', 'image/gif'),
+	(b'BM', 'image/bmp'),
+)
+
+
+def sniff_content_type(head):
+	for signature, content_type in SIGNATURES:
+		if head.startswith(signature):
+			return content_type
+	
+	if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+		return 'image/webp'
+
+
+class Attachment(object):
+	"""
+	An image to attach to a message. Its size and type are checked on
+	creation, but its contents are only read, in chunks, as it's sent.
+	
+	:param source: A path to the image, a seekable binary file object, or a
+		buffer, (such as :py:obj:`bytes` or :py:class:`mmap.mmap`), holding
+		it. Unseekable file objects are read into memory, up to
+		:const:`~chump.attachment.MAX_ATTACHMENT_SIZE`.
+	:param string filename: (optional) The filename to give Pushover.
+		Defaults to the source's filename if it has one, otherwise
+		``'image'``.
+	:param string content_type: (optional) The image's MIME type. Defaults
+		to that detected from its contents.
+	
+	:raises: :exc:`ValueError` if the image is too large or isn't an image.
+	
+	"""
+	
+	def __init__(self, source, filename=None, content_type=None):
+		self.source = source #: The path, file object, or buffer the image is read from.
+		
+		if isinstance(source, basestring):
+			self.size = os.path.getsize(source)
+			default_filename = source
+			
+			with open(source, 'rb') as source_file:
+				head = source_file.read(16)
+		
+		elif hasattr(source, 'read'):
+			try:
+				self._start = source.tell()
+				source.seek(0, io.SEEK_END)
+				self.size = source.tell() - self._start
+				source.seek(self._start)
+			
+			except (AttributeError, IOError, OSError, ValueError):
+				self.source = source = memoryview(source.read(MAX_ATTACHMENT_SIZE + 1))
+				self.size = len(source)
+				head = source[:16].tobytes()
+			
+			else:
+				head = source.read(16)
+				source.seek(self._start)
+			
+			default_filename = getattr(source, 'name', None)
+		
+		else:
+			try:
+				self.source = source = memoryview(source)
+			
+			except TypeError:
+				raise TypeError('Bad attachment: expected path, file, or buffer, got {value_type}'.format(value_type=type(source)))
+			
+			self.size = source.nbytes
+			head = source[:16].tobytes()
+			default_filename = None
+		
+		if not isinstance(default_filename, basestring):
+			default_filename = 'image'
+		
+		self.filename = os.path.basename(filename or default_filename) #: A :py:obj:`string` of the filename given to Pushover.
+		self.content_type = content_type or sniff_content_type(head) or mimetypes.guess_type(self.filename)[0] #: A :py:obj:`string` of the image's MIME type.
+		
+		if not 0 < self.size <= MAX_ATTACHMENT_SIZE:
+			raise ValueError('Bad attachment: must be 1-{max_size} bytes, was {size}'.format(max_size=MAX_ATTACHMENT_SIZE, size=self.size))
+		
+		if not (self.content_type or '').startswith('image/'):
+			raise ValueError('Bad attachment: expected an image, got {content_type!r}'.format(content_type=self.content_type))
+	
+	def __unicode__(self):
+		return "Pushover Attachment: {filename} ({content_type}, {size} bytes)".format(
+			filename=self.filename,
+			content_type=self.content_type,
+			size=self.size,
+		)
+	
+	__str__ = __unicode__
+	
+	def __repr__(self):
+		return 'Attachment(source={source!r}, filename={filename!r}, content_type={content_type!r})'.format(
+			source=self.source,
+			filename=self.filename,
+			content_type=self.content_type,
+		)
+	
+	def __len__(self):
+		return self.size
+	
+	def __iter__(self):
+		"""
+		Yields the image's contents in chunks of
+		:const:`~chump.attachment.CHUNK_SIZE` bytes, from the start each time.
+		
+		"""
+		
+		if isinstance(self.source, memoryview):
+			for offset in range(0, self.size, CHUNK_SIZE):
+				yield self.source[offset:offset + CHUNK_SIZE]
+		
+		elif isinstance(self.source, basestring):
+			with open(self.source, 'rb') as source_file:
+				for chunk in iter(lambda: source_file.read(CHUNK_SIZE), b''):
+					yield chunk
+		
+		else:
+			self.source.seek(self._start)
+			remaining = self.size
+			
+			while remaining > 0:
+				chunk = self.source.read(min(CHUNK_SIZE, remaining))
+				
+				if not chunk:
+					break
+				
+				remaining -= len(chunk)
+				yield chunk
+
+
+class MultipartBody(object):
+	"""
+	A ``multipart/form-data`` request body of form fields and an
+	:class:`~chump.attachment.Attachment`, which is streamed rather than read
+	into memory. It can be iterated over more than once, so that requests
+	can be retried.
+	
+	:param data: The form fields.
+	:type data: :py:class:`dict`
+	:param attachment: The attachment.
+	:type attachment: :class:`~chump.attachment.Attachment`
+	
+	"""
+	
+	def __init__(self, data, attachment):
+		boundary = uuid.uuid4().hex
+		
+		self.attachment = attachment
+		self.content_type = 'multipart/form-data; boundary={boundary}'.format(boundary=boundary)
+		
+		parts = []
+		
+		for name, value in sorted(data.items()):
+			parts.append('--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.format(
+				boundary=boundary,
+				name=name,
+				value=value,
+			))
+		
+		parts.append('--{boundary}\r\nContent-Disposition: form-data; name="attachment"; filename="{filename}"\r\nContent-Type: {content_type}\r\n\r\n'.format(
+			boundary=boundary,
+			filename=attachment.filename.replace('"', '%22'),
+			content_type=attachment.content_type,
+		))
+		
+		self.head = ''.join(parts).encode('utf-8')
+		self.tail = '\r\n--{boundary}--\r\n'.format(boundary=boundary).encode('utf-8')
+	
+	@property
+	def headers(self):
+		"""
+		A :py:class:`dict` of the headers to send the body with.
+		
+		"""
+		
+		return {
+			'Content-Type': self.content_type,
+			'Content-Length': str(len(self)),
+		}
+	
+	def __len__(self):
+		return len(self.head) + len(self.attachment) + len(self.tail)
+	
+	def __iter__(self):
+		yield self.head
+		
+		for chunk in self.attachment:
+			yield chunk
+		
+		yield self.tail
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try: import ujson as json
+except ImportError: import json
+
+
+try: replace = os.replace # Python >= 3.3
+except AttributeError: replace = os.rename
+
+
+try: clock = time.monotonic # Python >= 3.3
+except AttributeError: clock = time.time
+
+
+class TTLCache(object):
+	"""
+	A thread safe, size bounded mapping whose entries expire. Once full, the
+	least recently used entry is evicted.
+	
+	:param int maxsize: (optional) Maximum number of entries. Defaults
+		to 4096.
+	:param int ttl: (optional) Seconds an entry lives for. Defaults to 3600.
+	
+	"""
+	
+	def __init__(self, maxsize=4096, ttl=3600):
+		self.maxsize = maxsize #: An :py:obj:`int` of the maximum number of entries.
+		self.ttl = ttl #: An :py:obj:`int` of the default seconds an entry lives for.
+		
+		self.lock = threading.Lock()
+		self.entries = OrderedDict()
+	
+	def __len__(self):
+		return len(self.entries)
+	
+	def __repr__(self):
+		return 'TTLCache(maxsize={maxsize!r}, ttl={ttl!r})'.format(maxsize=self.maxsize, ttl=self.ttl)
+	
+	def get(self, key, default=None):
+		"""
+		Returns the live value for ``key``, otherwise ``default``.
+		
+		"""
+		
+		self.lock.acquire()
+		try:
+			try:
+				expires_at, value = self.entries.pop(key)
+			
+			except KeyError:
+				return default
+			
+			if expires_at <= clock():
+				return default
+			
+			self.entries[key] = (expires_at, value)
+			
+			return value
+		
+		finally:
+			self.lock.release()
+	
+	def set(self, key, value, ttl=None):
+		"""
+		Stores ``value`` for ``key`` for ``ttl`` seconds, (defaulting to
+		:attr:`.ttl`).
+		
+		"""
+		
+		if ttl is None:
+			ttl = self.ttl
+		
+		self.lock.acquire()
+		try:
+			self.entries.pop(key, None)
+			self.entries[key] = (clock() + ttl, value)
+			
+			while len(self.entries) > self.maxsize:
+				self.entries.popitem(last=False)
+		
+		finally:
+			self.lock.release()
+	
+	def invalidate(self, key):
+		"""
+		Removes ``key``, if present.
+		
+		"""
+		
+		self.lock.acquire()
+		try: self.entries.pop(key, None)
+		finally: self.lock.release()
+	
+	def clear(self):
+		"""
+		Removes all entries.
+		
+		"""
+		
+		self.lock.acquire()
+		try: self.entries.clear()
+		finally: self.lock.release()
+
+
+#: The process wide cache of user validations, keyed on (``app token``,
+#: ``user token``), with values of (``is_authenticated``, ``devices``).
+user_cache = TTLCache(maxsize=65536, ttl=3600)
+
+#: Seconds invalid users are cached for.
+USER_NEGATIVE_TTL = 300
+
+
+class FileCache(object):
+	"""
+	A small ``json`` backed cache on disk, shared between processes. Writes
+	go to a temporary file that then replaces the cache, so readers never see
+	a partial file.
+	
+	:param string path: Path of the cache file.
+	:param int ttl: (optional) Seconds an entry may be used for. Defaults
+		to 86400.
+	:param int refresh_after: (optional) Seconds after which a still usable
+		entry should be refreshed in the background. Defaults to half
+		of ``ttl``.
+	
+	"""
+	
+	def __init__(self, path, ttl=86400, refresh_after=None):
+		self.path = path #: A :py:obj:`string` of the path of the cache file.
+		self.ttl = ttl #: An :py:obj:`int` of seconds an entry may be used for.
+		self.refresh_after = ttl / 2 if refresh_after is None else refresh_after #: An :py:obj:`int` of seconds after which an entry should be refreshed.
+		
+		self.lock = threading.Lock()
+	
+	def __repr__(self):
+		return 'FileCache(path={path!r}, ttl={ttl!r}, refresh_after={refresh_after!r})'.format(
+			path=self.path,
+			ttl=self.ttl,
+			refresh_after=self.refresh_after,
+		)
+	
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		del state['lock']
+		
+		return state
+	
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.lock = threading.Lock()
+	
+	def _read(self):
+		try:
+			with open(self.path, 'r') as cache_file:
+				entries = json.loads(cache_file.read())
+		
+		except (IOError, OSError, ValueError):
+			return {}
+		
+		return entries if isinstance(entries, dict) else {}
+	
+	def get(self, key):
+		"""
+		Returns a :py:obj:`tuple` of (``value``, ``age``) for ``key`` if it
+		was stored within :attr:`.ttl` seconds, otherwise :py:obj:`None`.
+		
+		"""
+		
+		try: stored_at, value = self._read()[key]
+		except (KeyError, TypeError, ValueError): return None
+		
+		age = time.time() - stored_at
+		
+		if 0 <= age < self.ttl:
+			return (value, age)
+	
+	def set(self, key, value):
+		"""
+		Stores ``value`` for ``key``, atomically replacing the cache file.
+		
+		"""
+		
+		import tempfile
+		
+		directory = os.path.dirname(os.path.abspath(self.path))
+		
+		self.lock.acquire()
+		try:
+			entries = self._read()
+			entries[key] = (time.time(), value)
+			
+			descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.chump-', suffix='.tmp')
+			
+			try:
+				with os.fdopen(descriptor, 'w') as temp_file:
+					temp_file.write(json.dumps(entries))
+					temp_file.flush()
+					os.fsync(temp_file.fileno())
+				
+				replace(temp_path, self.path)
+			
+			except (IOError, OSError):
+				try: os.remove(temp_path)
+				except OSError: pass
+				
+				raise
+		
+		finally:
+			self.lock.release()
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import threading
+import weakref
+
+from . import APIError, epoch_to_datetime, logger, utc_now
+from .analytics import delivery
+
+try: # Python 3
+	from http.server import BaseHTTPRequestHandler, HTTPServer
+	from socketserver import ThreadingMixIn
+	from urllib.parse import parse_qs
+
+except ImportError: # Python 2
+	from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+	from SocketServer import ThreadingMixIn
+	from urlparse import parse_qs
+
+
+class CallbackRequestHandler(BaseHTTPRequestHandler):
+	def do_POST(self):
+		try:
+			length = int(self.headers.get('Content-Length') or 0)
+		
+		except ValueError:
+			length = 0
+		
+		body = self.rfile.read(length).decode('utf-8', 'replace') if length > 0 else ''
+		data = dict((key, values[-1]) for key, values in parse_qs(body).items())
+		
+		if self.server.receiver.receive(data):
+			self.send_response(200)
+		
+		else:
+			self.send_response(404)
+		
+		self.send_header('Content-Length', '0')
+		self.end_headers()
+	
+	def log_message(self, format, *args):
+		logger.debug('Callback request from {address}: {message}'.format(
+			address=self.address_string(),
+			message=format % args,
+		))
+
+
+class ThreadingCallbackHTTPServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+
+class CallbackServer(object):
+	"""
+	A lightweight, embeddable HTTP server that receives Pushover's
+	acknowledgement callbacks for emergency messages and updates the matching
+	:class:`~chump.EmergencyMessage` in place, so it needn't be polled.
+	
+	Messages are matched to callbacks by their receipt, and must be passed to
+	:meth:`.track` once sent. Only weak references are kept, so tracking a
+	message won't keep it alive.
+	
+	:param string host: (optional) Address to listen on. Defaults to
+		``'0.0.0.0'``.
+	:param int port: (optional) Port to listen on. Defaults to ``0``, which
+		picks a free port.
+	:param string url: (optional) The public URL Pushover should ping, to be
+		given as a message's ``callback``. Defaults to
+		``http://{host}:{port}/``.
+	:param int fallback_interval: (optional) Seconds between polls of tracked
+		messages that haven't been called back, in case a callback is lost.
+		:py:obj:`None` disables polling. Defaults to 300.
+	
+	"""
+	
+	def __init__(self, host='0.0.0.0', port=0, url=None, fallback_interval=300):
+		self.lock = threading.Lock()
+		self.messages = weakref.WeakValueDictionary()
+		
+		self.fallback_interval = fallback_interval #: An :py:obj:`int` of seconds between fallback polls, or :py:obj:`None`.
+		
+		self._server = ThreadingCallbackHTTPServer((host, port), CallbackRequestHandler)
+		self._server.receiver = self
+		self._url = url
+		self._threads = []
+		self._stopped = threading.Event()
+	
+	@property
+	def address(self):
+		"""
+		A :py:obj:`tuple` of the (``host``, ``port``) the server is bound to.
+		
+		"""
+		
+		return self._server.server_address[:2]
+	
+	@property
+	def url(self):
+		"""
+		A :py:obj:`string` of the URL to give as a message's ``callback``.
+		
+		"""
+		
+		if self._url is None:
+			return 'http://{host}:{port}/'.format(host=self.address[0], port=self.address[1])
+		
+		else:
+			return self._url
+	
+	def __unicode__(self):
+		return "Pushover Callback Server: {url}".format(url=self.url)
+	
+	__str__ = __unicode__
+	
+	def __repr__(self):
+		return 'CallbackServer(url={url!r})'.format(url=self.url)
+	
+	def __enter__(self):
+		self.start()
+		return self
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.stop()
+	
+	def start(self):
+		"""
+		Starts serving, (and polling, if :attr:`.fallback_interval` is set),
+		in background threads.
+		
+		"""
+		
+		self._stopped.clear()
+		self._threads = [threading.Thread(target=self._server.serve_forever)]
+		
+		if self.fallback_interval:
+			self._threads.append(threading.Thread(target=self._poll_forever))
+		
+		for thread in self._threads:
+			thread.daemon = True
+			thread.start()
+	
+	def stop(self):
+		"""
+		Stops serving and polling, and closes the listening socket.
+		
+		"""
+		
+		self._stopped.set()
+		
+		if self._threads:
+			self._server.shutdown()
+			
+			for thread in self._threads:
+				thread.join()
+			
+			self._threads = []
+		
+		self._server.server_close()
+	
+	def track(self, message):
+		"""
+		Starts tracking a sent :class:`~chump.EmergencyMessage`, so that
+		callbacks for its receipt update it.
+		
+		:param message: The message to track.
+		:type message: :class:`~chump.EmergencyMessage`
+		
+		:raises: :exc:`ValueError` if the message has no receipt.
+		
+		"""
+		
+		if not message.receipt:
+			raise ValueError('Bad message: expected a sent message with a receipt, got {message!r}'.format(message=message))
+		
+		self.lock.acquire()
+		try: self.messages[message.receipt] = message
+		finally: self.lock.release()
+	
+	def untrack(self, message):
+		"""
+		Stops tracking a :class:`~chump.EmergencyMessage`.
+		
+		:param message: The message to stop tracking.
+		:type message: :class:`~chump.EmergencyMessage`
+		
+		"""
+		
+		self.lock.acquire()
+		try: self.messages.pop(message.receipt, None)
+		finally: self.lock.release()
+	
+	def receive(self, data):
+		"""
+		Applies a callback's payload to the tracked message with the
+		matching receipt.
+		
+		:param dict data: The callback's form data.
+		
+		:returns: A :py:obj:`bool` indicating whether a tracked message
+			was updated.
+		:rtype: A :py:obj:`bool`.
+		
+		"""
+		
+		self.lock.acquire()
+		try: message = self.messages.pop(data.get('receipt'), None)
+		finally: self.lock.release()
+		
+		if message is None:
+			logger.debug('Callback received for untracked receipt: {data}'.format(data=data))
+			return False
+		
+		message.is_called_back = True
+		message.called_back_at = utc_now()
+		
+		if data.get('acknowledged') == '1':
+			message.is_acknowledged = True
+			
+			if data.get('acknowledged_at'):
+				message.acknowledged_at = epoch_to_datetime(data['acknowledged_at'])
+			
+			if data.get('acknowledged_by'):
+				if data['acknowledged_by'] == message.user.token:
+					message.acknowledged_by = message.user
+				
+				else:
+					message.acknowledged_by = message.user.app.get_user(data['acknowledged_by'])
+		
+		delivery.observe(message)
+		
+		logger.debug('Callback received for {receipt}: {data}'.format(receipt=message.receipt, data=data))
+		
+		return True
+	
+	def _poll_forever(self):
+		while not self._stopped.wait(self.fallback_interval):
+			self.lock.acquire()
+			try: messages = list(self.messages.values())
+			finally: self.lock.release()
+			
+			for message in messages:
+				try:
+					if not message.poll():
+						self.untrack(message)
+				
+				except (APIError, IOError, OSError) as error: # Including URLErrors.
+					logger.warning('Fallback poll failed for {receipt}: {error}'.format(receipt=message.receipt, error=error))
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sends a feed of messages, one ``json`` object per line, from one warm
+process, writing a ``json`` result per message as each is sent:
+	
+	$ export CHUMP_TOKEN=<app token>
+	$ echo '{"id": 1, "user": "<user token>", "message": "Disk full", "priority": 1}' | chump
+	{"id": 1, "request": "5042853c-402d-4a18-abcb-168734a801de", "receipt": null, "error": null}
+
+A message's keys are the arguments of :meth:`~chump.User.create_message`,
+with its ``user`` token, and optionally its application's ``token``, (which
+otherwise defaults to ``--token``), and an ``id`` to identify its result,
+(which otherwise defaults to its line number). Results are written in the
+order messages finish sending, not the order they were read.
+
+"""
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import argparse
+import io
+import os
+import sys
+import threading
+import time
+
+try: import ujson as json
+except ImportError: import json
+
+from . import MESSAGE_FIELDS, Application, logger
+from .cache import TTLCache
+
+try: # Python 3
+	from queue import Queue
+
+except ImportError: # Python 2
+	from Queue import Queue
+
+
+#: Environment variable giving the default application token.
+TOKEN_ENVIRONMENT_VARIABLE = 'CHUMP_TOKEN'
+
+# Most applications, and users, a feed keeps between their messages.
+MAX_MEMOIZED = 4096
+
+
+class Feed(object):
+	"""
+	Sends messages read from lines of ``json``, ``concurrency`` at a time,
+	writing a line of ``json`` to ``output`` as each is sent or fails.
+	
+	Lines are parsed and their messages checked locally as they're read,
+	(deferring the checks of devices and sounds, which may make requests,
+	until they're sent), and at most ``window`` read messages wait to be
+	sent, so memory stays bounded however long the feed is.
+	
+	:param output: A text file to write results to.
+	:param string token: (optional) Application token of messages that don't
+		give one. Defaults to :py:obj:`None`.
+	:param int concurrency: (optional) How many messages to send at once.
+		Defaults to 16.
+	:param int window: (optional) How many read messages may wait to be
+		sent. Defaults to 64.
+	:param bool dry_run: (optional) Whether to only check messages, not send
+		them. Defaults to :py:obj:`False`.
+	
+	"""
+	
+	def __init__(self, output, token=None, concurrency=16, window=64, dry_run=False):
+		self.output = output
+		self.token = token #: A :py:obj:`string` of the application token of messages that don't give one.
+		self.concurrency = concurrency #: An :py:obj:`int` of how many messages are sent at once.
+		self.window = window #: An :py:obj:`int` of how many read messages may wait to be sent.
+		self.dry_run = dry_run #: A :py:obj:`bool` indicating whether messages are only checked.
+		
+		self.sent = 0 #: An :py:obj:`int` of messages sent, (or checked, on a dry run).
+		self.failed = 0 #: An :py:obj:`int` of lines that failed.
+		
+		self.lock = threading.Lock()
+		self.apps = TTLCache(maxsize=MAX_MEMOIZED)
+		self.users = TTLCache(maxsize=MAX_MEMOIZED)
+	
+	def __repr__(self):
+		return 'Feed(token={token!r}, concurrency={concurrency!r}, window={window!r})'.format(
+			token=self.token,
+			concurrency=self.concurrency,
+			window=self.window,
+		)
+	
+	def get_user(self, app_token, user_token):
+		# Only the reading thread calls this, so needn't lock.
+		user = self.users.get((app_token, user_token))
+		
+		if user is None:
+			app = self.apps.get(app_token)
+			
+			if app is None:
+				app = Application(app_token)
+				self.apps.set(app_token, app)
+			
+			user = app.get_user(user_token)
+			self.users.set((app_token, user_token), user)
+		
+		return user
+	
+	def parse(self, line):
+		"""
+		Returns a :py:obj:`tuple` of (``id``, ``message``) for a line, where
+		``message`` is unsent.
+		
+		:raises: :exc:`ValueError` or :exc:`TypeError` if the line isn't a
+			valid message, or :exc:`IOError` if its attachment can't be read.
+		
+		"""
+		
+		try:
+			spec = json.loads(line)
+		
+		except ValueError as error:
+			raise ValueError('Bad line: {error}'.format(error=error))
+		
+		if not isinstance(spec, dict):
+			raise TypeError('Bad line: expected object, got {spec!r}'.format(spec=spec))
+		
+		unexpected = set(spec) - MESSAGE_FIELDS - set(('id', 'token', 'user'))
+		
+		if unexpected:
+			raise ValueError('Bad line: unexpected keys {keys}'.format(keys=', '.join(sorted(unexpected))))
+		
+		elif 'user' not in spec or 'message' not in spec:
+			raise ValueError('Bad line: expected user and message')
+		
+		token = spec.get('token', self.token)
+		
+		if token is None:
+			raise ValueError('Bad line: expected token, or a default with --token or ${variable}'.format(variable=TOKEN_ENVIRONMENT_VARIABLE))
+		
+		user = self.get_user(token, spec['user'])
+		kwargs = {key: value for key, value in spec.items() if key in MESSAGE_FIELDS}
+		
+		return spec.get('id'), user.create_message(defer_validation=True, **kwargs)
+	
+	def write(self, id, request=None, receipt=None, error=None):
+		line = json.dumps({'id': id, 'request': request, 'receipt': receipt, 'error': error})
+		
+		self.lock.acquire()
+		try:
+			if error is None:
+				self.sent += 1
+			
+			else:
+				self.failed += 1
+			
+			self.output.write(line + '\n')
+			self.output.flush()
+		
+		finally:
+			self.lock.release()
+	
+	def send(self, id, message):
+		"""
+		Sends a message, and writes its result.
+		
+		"""
+		
+		try:
+			if self.dry_run:
+				message.validate()
+			
+			else:
+				message.send()
+		
+		except (ValueError, IOError, OSError) as error:
+			self.write(id, error='{error}'.format(error=error))
+		
+		else:
+			error = message.error
+			self.write(
+				id,
+				request=message.id if error is None else error.id,
+				receipt=getattr(message, 'receipt', None) if error is None else error.receipt,
+				error='{error}'.format(error=error) if error is not None else None,
+			)
+	
+	def _work(self, queue):
+		while True:
+			item = queue.get()
+			
+			if item is None:
+				return
+			
+			try:
+				self.send(*item)
+			
+			except Exception as error:
+				logger.exception('Failed to send line {id!r}'.format(id=item[0]))
+				self.write(item[0], error='{error}'.format(error=error))
+	
+	def run(self, lines):
+		"""
+		Sends the messages of ``lines``, returning once every result
+		is written.
+		
+		:param lines: Lines of ``json``, each a message.
+		:type lines: An iterable of :py:obj:`string`
+		
+		:returns: A :py:obj:`bool` indicating whether every line was sent.
+		:rtype: A :py:obj:`bool`.
+		
+		"""
+		
+		queue = Queue(self.window)
+		workers = [threading.Thread(target=self._work, args=(queue,)) for _ in range(max(1, self.concurrency))]
+		
+		for worker in workers:
+			worker.daemon = True
+			worker.start()
+		
+		try:
+			for number, line in enumerate(lines, 1):
+				if not line.strip():
+					continue
+				
+				try:
+					id, message = self.parse(line)
+				
+				except (KeyError, TypeError, ValueError, IOError, OSError) as error: # Including unreadable attachments.
+					self.write(number, error='{error}'.format(error=error))
+					continue
+				
+				queue.put((number if id is None else id, message))
+		
+		finally:
+			for _ in workers:
+				queue.put(None)
+			
+			for worker in workers:
+				worker.join()
+		
+		return self.failed == 0
+
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description='Sends messages, one json object per line, writing a json result per message.')
+	parser.add_argument('input', nargs='?', default='-', help='file of messages (default: stdin)')
+	parser.add_argument('--token', default=os.environ.get(TOKEN_ENVIRONMENT_VARIABLE), help='application token of messages without one (default: ${variable})'.format(variable=TOKEN_ENVIRONMENT_VARIABLE))
+	parser.add_argument('--concurrency', type=int, default=16, help='messages to send at once (default: %(default)s)')
+	parser.add_argument('--window', type=int, default=64, help='read messages that may wait to be sent (default: %(default)s)')
+	parser.add_argument('--dry-run', action='store_true', help='check messages without sending them')
+	parser.add_argument('--quiet', action='store_true', help="don't summarize to stderr")
+	args = parser.parse_args(args)
+	
+	if args.concurrency < 1 or args.window < 1:
+		parser.error('--concurrency and --window must be at least 1')
+	
+	if args.input == '-':
+		lines = io.open(sys.stdin.fileno(), 'r', encoding='utf-8', closefd=False)
+	
+	else:
+		try:
+			lines = io.open(args.input, 'r', encoding='utf-8')
+		
+		except (IOError, OSError) as error:
+			parser.error(str(error))
+	
+	output = io.open(sys.stdout.fileno(), 'w', encoding='utf-8', closefd=False)
+	feed = Feed(output, args.token, args.concurrency, args.window, args.dry_run)
+	started_at = time.time()
+	
+	try:
+		succeeded = feed.run(lines)
+	
+	except KeyboardInterrupt:
+		succeeded = False
+	
+	finally:
+		lines.close()
+	
+	if not args.quiet:
+		elapsed = time.time() - started_at
+		
+		print('{verb} {sent}, failed {failed}, in {elapsed:.1f}s ({rate:.0f}/s)'.format(
+			verb='Checked' if args.dry_run else 'Sent',
+			sent=feed.sent,
+			failed=feed.failed,
+			elapsed=elapsed,
+			rate=(feed.sent + feed.failed) / elapsed if elapsed else 0,
+		), file=sys.stderr)
+	
+	sys.exit(0 if succeeded else 1)
+
+
+if __name__ == '__main__':
+	main()
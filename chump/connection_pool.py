@@ -2,17 +2,22 @@
 
 from __future__ import division, absolute_import, print_function, unicode_literals
 
+import os
 import socket
+import ssl
+import sys
 import threading
+from select import select
 
 
-HOST = 'api.pushover.net'
+# Overridable, with CHUMP_CA_FILE, to point chump at a stand-in such as
+# chump.fake.FakeServer.
+HOST = os.environ.get('CHUMP_HOST', 'api.pushover.net')
 
 
 try: # Python 3
 	from http.client import HTTPException, HTTPResponse, HTTPSConnection
 	from urllib.request import build_opener, HTTPSHandler, URLError
-	from urllib.response import addinfourl
 	
 	class FreeingHTTPResponse(HTTPResponse):
 		def _close_conn(self):
@@ -23,7 +28,6 @@ try: # Python 3
 
 except ImportError: # Python 2
 	from httplib import HTTPException, HTTPResponse, HTTPSConnection
-	from select import select
 	from urllib import addinfourl
 	from urllib2 import build_opener, HTTPSHandler, URLError
 	
@@ -70,30 +74,49 @@ class PushoverPooledConnectionHandler(HTTPSHandler):
 		self.lock = threading.Lock()
 		self.pool = set()
 		self.free = set()
+		
+		self.created = 0 # Connections opened.
+		self.reused = 0 # Requests made over an already open connection.
+		self.discarded = 0 # Free connections found stale and closed.
 	
 	def https_open(self, request):
 		try:
 			connection = self.get_free_connection()
 			while connection:
-				response = self.make_request(connection, request)
-				
-				if response is not None:
-					break
+				if not self.is_stale(connection):
+					try:
+						response = self.make_request(connection, request)
+					
+					except (socket.error, HTTPException):
+						connection.close()
+						self.remove_connection(connection)
+						raise
+					
+					if response is not None:
+						self.count('reused')
+						break
 				
-				else:
-					connection.close()
-					self.remove_connection(connection)
-					connection = self.get_free_connection()
+				connection.close()
+				self.remove_connection(connection)
+				self.count('discarded')
+				connection = self.get_free_connection()
 			
 			else:
 				connection = self.get_new_connection()
-				response = self.make_request(connection, request)
+				
+				try:
+					response = self.make_request(connection, request, fresh=True)
+				
+				except (socket.error, HTTPException):
+					connection.close()
+					self.remove_connection(connection)
+					raise
 		
 		except (socket.error, HTTPException) as exc:
 			raise URLError(exc)
 		
 		else:
-			if response.raw.will_close:
+			if response.will_close:
 				self.remove_connection(connection)
 			
 			return response
@@ -102,8 +125,12 @@ class PushoverPooledConnectionHandler(HTTPSHandler):
 		connection = FreeingHTTPSConnection(HOST, context=self._context)
 		connection.set_debuglevel(self._debuglevel)
 		self.lock.acquire()
-		try: self.pool.add(connection)
-		finally: self.lock.release()
+		try:
+			self.pool.add(connection)
+			self.created += 1
+		
+		finally:
+			self.lock.release()
 		
 		return connection
 	
@@ -117,18 +144,62 @@ class PushoverPooledConnectionHandler(HTTPSHandler):
 		try: self.free.add(connection)
 		finally: self.lock.release()
 	
+	def clear(self):
+		# Close idle connections, such as before pointing HOST elsewhere.
+		self.lock.acquire()
+		try:
+			connections = list(self.free)
+			self.free.clear()
+			self.pool.difference_update(connections)
+		
+		finally:
+			self.lock.release()
+		
+		for connection in connections:
+			connection.close()
+	
+	def count(self, event):
+		self.lock.acquire()
+		try: setattr(self, event, getattr(self, event) + 1)
+		finally: self.lock.release()
+	
+	def stats(self):
+		self.lock.acquire()
+		try:
+			return {
+				'total': len(self.pool),
+				'free': len(self.free),
+				'created': self.created,
+				'reused': self.reused,
+				'discarded': self.discarded,
+			}
+		
+		finally:
+			self.lock.release()
+	
 	def remove_connection(self, connection):
 		self.lock.acquire()
 		try: self.pool.remove(connection)
 		except KeyError: pass
 		finally: self.lock.release()
 	
-	def make_request(self, connection, request):
+	def is_stale(self, connection):
+		# An idle connection has nothing to read, unless it's been closed.
+		try: return connection.sock is not None and bool(select((connection.sock,), (), (), 0)[0])
+		except (socket.error, ValueError): return True
+	
+	def make_request(self, connection, request, fresh=False):
+		# Failures on reused connections, which may just have gone stale,
+		# return None to be retried on another, but only if the request
+		# can't have been acted on: if it wasn't written, or is a GET.
+		# Otherwise it's raised, rather than a message sent twice.
 		connection.timeout = request.timeout
+		method = request.get_method()
+		
 		try:
 			try: # Python 3
 				connection.request(
-					request.get_method(),
+					method,
 					request.selector,
 					request.data,
 					request.headers
@@ -136,43 +207,76 @@ class PushoverPooledConnectionHandler(HTTPSHandler):
 			
 			except AttributeError: # Python 2
 				connection.request(
-					request.get_method(),
+					method,
 					request.get_selector(),
 					request.data,
 					request.headers
 				)
+		
+		except (socket.error, HTTPException):
+			if fresh:
+				raise
 			
+			return None
+		
+		try:
 			try: raw_response = connection.getresponse(buffering=True)
 			except TypeError: raw_response = connection.getresponse()
 		
 		except (socket.error, HTTPException):
+			if fresh or method == 'POST':
+				raise
+			
 			return None
 		
 		raw_response._handler = self
 		raw_response._connection = connection
 		
-		try: # Python 3
-			response = addinfourl(
-				raw_response,
-				raw_response.msg,
-				request.get_full_url(),
-				raw_response.status
-			)
-		
-		except AttributeError: # Python 2
-			response = addinfourl(
-				socket._fileobject(raw_response, close=True),
-				raw_response.msg,
-				request.get_full_url(),
-				raw_response.status
-			)
+		if sys.version_info[0] >= 3:
+			# Returned as is, as by urllib's own handlers, rather than wrapped.
+			raw_response.url = request.get_full_url()
+			raw_response.msg = raw_response.reason
 			
-			raw_response.recv = raw_response.read
-			response.msg = raw_response.reason
+			return raw_response
 		
-		response.raw = raw_response
+		response = addinfourl(
+			socket._fileobject(raw_response, close=True),
+			raw_response.msg,
+			request.get_full_url(),
+			raw_response.status
+		)
+		
+		raw_response.recv = raw_response.read
+		response.msg = raw_response.reason
+		response.will_close = raw_response.will_close
 		
 		return response
 
 
-pool = build_opener(PushoverPooledConnectionHandler)
+handler = PushoverPooledConnectionHandler(
+	context=ssl.create_default_context(cafile=os.environ['CHUMP_CA_FILE']) if os.environ.get('CHUMP_CA_FILE') else None
+)
+
+_lock = threading.Lock()
+
+
+def __getattr__(name):
+	# build_opener instantiates every default handler, so wait for a request.
+	global pool
+	
+	if name == 'pool':
+		_lock.acquire()
+		try:
+			if 'pool' not in globals():
+				pool = build_opener(handler)
+		
+		finally:
+			_lock.release()
+		
+		return pool
+	
+	raise AttributeError('module {module!r} has no attribute {name!r}'.format(module=__name__, name=name))
+
+
+if sys.version_info < (3, 7): # No module __getattr__, so build it now.
+	pool = build_opener(handler)
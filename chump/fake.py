@@ -0,0 +1,828 @@
+# -*- coding: utf-8 -*-
+
+"""
+A local stand-in for Pushover's API, for testing and load testing code that
+uses chump without sending real notifications. It can be used in process as
+a :class:`FakeServer`, or run as a command:
+	
+	$ chump-fake-server --port 8443 --latency exponential:0.05 --reset-rate 0.01
+
+"""
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import argparse
+import calendar
+import math
+import os
+import random
+import re
+import shutil
+import socket
+import ssl
+import string
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+
+try: import ujson as json
+except ImportError: import json
+
+from . import DEVICE_RE, TOKEN_RE, logger
+from . import connection_pool
+
+try: # Python 3
+	from http.server import BaseHTTPRequestHandler, HTTPServer
+	from socketserver import ThreadingMixIn
+	from urllib.parse import parse_qsl, unquote, urlencode
+	from urllib.request import urlopen
+
+except ImportError: # Python 2
+	from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+	from SocketServer import ThreadingMixIn
+	from urllib import unquote, urlencode
+	from urllib2 import urlopen
+	from urlparse import parse_qsl
+
+
+try: basestring # Python 2
+except NameError: basestring = str # Python 3
+
+
+DEFAULT_DEVICES = ('phone', 'desktop') #: Devices of users not given to :class:`FakeServer`.
+
+SOUNDS = {
+	'pushover': 'Pushover (default)',
+	'bike': 'Bike',
+	'bugle': 'Bugle',
+	'cashregister': 'Cash Register',
+	'classical': 'Classical',
+	'cosmic': 'Cosmic',
+	'falling': 'Falling',
+	'gamelan': 'Gamelan',
+	'incoming': 'Incoming',
+	'intermission': 'Intermission',
+	'magic': 'Magic',
+	'mechanical': 'Mechanical',
+	'pianobar': 'Piano Bar',
+	'siren': 'Siren',
+	'spacealarm': 'Space Alarm',
+	'tugboat': 'Tug Boat',
+	'alien': 'Alien Alarm (long)',
+	'climb': 'Climb (long)',
+	'persistent': 'Persistent (long)',
+	'echo': 'Pushover Echo (long)',
+	'updown': 'Up Down (long)',
+	'vibrate': 'Vibrate Only',
+	'none': 'None (silent)',
+}
+
+# Limits Pushover enforces on message fields.
+MAX_LENGTHS = (('message', 1024), ('title', 250), ('url', 512), ('url_title', 100))
+MIN_RETRY = 30
+MAX_EXPIRE = 86400
+
+PRUNE_INTERVAL = 1 # Seconds between sweeps of ended receipts.
+
+ROUTES = (
+	('POST', re.compile(r'^/1/messages\.json$'), 'message'),
+	('POST', re.compile(r'^/1/users/validate\.json$'), 'validate'),
+	('GET', re.compile(r'^/1/sounds\.json$'), 'sound'),
+	('POST', re.compile(r'^/1/receipts/cancel_by_tag/(?P<tag>[^/]+)\.json$'), 'cancel_by_tag'),
+	('POST', re.compile(r'^/1/receipts/(?P<receipt>[A-Za-z0-9]+)/cancel\.json$'), 'cancel'),
+	('GET', re.compile(r'^/1/receipts/(?P<receipt>[A-Za-z0-9]+)\.json$'), 'receipt'),
+)
+
+SERVER_ERRORS = (500, 502, 503)
+
+
+def latency_distribution(spec):
+	"""
+	Returns a function of a :py:class:`random.Random` that draws a latency,
+	in seconds, from the distribution described by ``spec``.
+	
+	:param spec: A number of seconds, or a :py:obj:`string` of either one,
+		``'uniform:low,high'``, ``'exponential:mean'`` or
+		``'lognormal:median,sigma'``.
+	
+	:raises: :exc:`ValueError` if ``spec`` can't be parsed.
+	
+	"""
+	
+	if not isinstance(spec, basestring):
+		seconds = float(spec)
+		return lambda rng: seconds
+	
+	name, _, args = spec.partition(':')
+	
+	try:
+		if not args:
+			seconds = float(name)
+			return lambda rng: seconds
+		
+		args = [float(arg) for arg in args.split(',')]
+		
+		if name == 'uniform':
+			low, high = args
+			return lambda rng: rng.uniform(low, high)
+		
+		elif name == 'exponential':
+			mean, = args
+			return lambda rng: rng.expovariate(1 / mean)
+		
+		elif name == 'lognormal':
+			median, sigma = args
+			return lambda rng: rng.lognormvariate(math.log(median), sigma)
+	
+	except (TypeError, ValueError, ZeroDivisionError):
+		pass
+	
+	raise ValueError('Bad latency: expected seconds, uniform:low,high, exponential:mean or lognormal:median,sigma, got {value!r}'.format(value=spec))
+
+
+def make_certificate(directory):
+	"""
+	Makes a throwaway self-signed certificate for ``localhost`` and
+	``127.0.0.1`` with ``openssl``, returning the paths of the certificate
+	and its key.
+	
+	"""
+	
+	certfile = os.path.join(directory, 'cert.pem')
+	keyfile = os.path.join(directory, 'key.pem')
+	
+	with open(os.devnull, 'w') as devnull:
+		subprocess.check_call(
+			[
+				'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '30',
+				'-subj', '/CN=localhost', '-addext', 'subjectAltName=DNS:localhost,IP:127.0.0.1',
+				'-keyout', keyfile, '-out', certfile,
+			],
+			stdout=devnull,
+			stderr=devnull,
+		)
+	
+	return certfile, keyfile
+
+
+def next_month(now):
+	year, month = time.gmtime(now)[:2]
+	year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+	
+	return calendar.timegm((year, month, 1, 0, 0, 0))
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+	disable_nagle_algorithm = True
+	
+	def respond(self):
+		fake = self.server.fake
+		
+		length = int(self.headers.get('Content-Length') or 0)
+		body = self.rfile.read(length) if length > 0 else b''
+		path, _, query = self.path.partition('?')
+		
+		fault, delay = fake.fault()
+		
+		if delay:
+			time.sleep(delay)
+		
+		if fault == 'reset':
+			# Close without a response, and with a RST rather than a FIN.
+			self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack(b'ii', 1, 0))
+			self.close_connection = True
+			return
+		
+		elif fault == 'error':
+			code = fake.rng_choice(SERVER_ERRORS)
+			content = '<html><body><h1>{code}</h1></body></html>'.format(code=code).encode('utf-8')
+			headers = [('Content-Type', 'text/html; charset=utf-8')]
+		
+		else:
+			if fault == 'throttle':
+				code, response, headers = 429, {'status': 0, 'errors': ['too many requests, slow down'], 'request': uuid.uuid4().hex}, []
+			
+			else:
+				code, response, headers = fake.handle(self.command, path, self.parse(body, query))
+			
+			content = json.dumps(response).encode('utf-8')
+			headers = [('Content-Type', 'application/json; charset=utf-8')] + headers
+		
+		self.send_response(code) # Which sends the Date header.
+		self.send_header('Content-Length', str(len(content)))
+		
+		for key, value in headers:
+			self.send_header(key, value)
+		
+		self.end_headers()
+		self.wfile.write(content)
+		
+		if fault == 'drop':
+			# Close once answered, without warning the client that we would.
+			self.close_connection = True
+	
+	do_GET = do_POST = respond
+	
+	def setup(self):
+		BaseHTTPRequestHandler.setup(self)
+		self.server.track(self.connection)
+	
+	def finish(self):
+		self.server.untrack(self.connection)
+		BaseHTTPRequestHandler.finish(self)
+	
+	def parse(self, body, query):
+		data = dict(parse_qsl(query))
+		content_type = self.headers.get('Content-Type') or ''
+		
+		if content_type.startswith('multipart/form-data'):
+			boundary = content_type.partition('boundary=')[2].strip('"').encode('utf-8')
+			
+			for part in body.split(b'--' + boundary)[1:-1]:
+				head, _, value = part.strip(b'\r\n').partition(b'\r\n\r\n')
+				name = re.search(br'name="([^"]*)"', head)
+				
+				if name is not None:
+					name = name.group(1).decode('utf-8')
+					data[name] = len(value) if name == 'attachment' else value.decode('utf-8')
+		
+		elif body:
+			data.update(parse_qsl(body.decode('utf-8'), True))
+		
+		return data
+	
+	def log_message(self, format, *args):
+		logger.debug('Fake Pushover request from {address}: {message}'.format(
+			address=self.address_string(),
+			message=format % args,
+		))
+
+
+class ThreadingFakeHTTPServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+	request_queue_size = 128
+	
+	def __init__(self, *args, **kwargs):
+		HTTPServer.__init__(self, *args, **kwargs)
+		
+		self.lock = threading.Lock()
+		self.connections = set()
+	
+	def track(self, connection):
+		self.lock.acquire()
+		try: self.connections.add(connection)
+		finally: self.lock.release()
+	
+	def untrack(self, connection):
+		self.lock.acquire()
+		try: self.connections.discard(connection)
+		finally: self.lock.release()
+	
+	def close_connections(self):
+		self.lock.acquire()
+		try: connections, self.connections = self.connections, set()
+		finally: self.lock.release()
+		
+		for connection in connections:
+			try: connection.shutdown(socket.SHUT_RDWR)
+			except (IOError, OSError): pass
+
+
+class FakeServer(object):
+	"""
+	A local HTTPS server that behaves like Pushover's API: it validates
+	messages, users and devices, counts down each application's monthly
+	allotment in ``X-Limit-App-*`` headers, and moves emergency messages'
+	receipts through delivery, acknowledgement, callback, cancellation and
+	expiry. Faults can be injected at random into any response.
+	
+	Used as a context manager, the server starts and chump's shared
+	connection pool is pointed at it until it stops.
+	
+	:param string host: (optional) Address to listen on. Defaults to
+		``'127.0.0.1'``.
+	:param int port: (optional) Port to listen on. Defaults to ``0``, which
+		picks a free port.
+	:param string certfile: (optional) Path of the TLS certificate to serve.
+		Defaults to a throwaway self-signed one.
+	:param string keyfile: (optional) Path of ``certfile``'s key.
+	:param apps: (optional) Application tokens to accept. Defaults to any
+		well formed token.
+	:param dict users: (optional) Device names, keyed on user tokens to
+		accept. Defaults to any well formed token, with
+		:const:`~chump.fake.DEFAULT_DEVICES`.
+	:param int limit: (optional) Messages each application may send a month.
+		Defaults to 10000.
+	:param float acknowledge_after: (optional) Seconds after which emergency
+		messages are acknowledged by their user. Defaults to :py:obj:`None`,
+		when only :meth:`.acknowledge` does so.
+	:param latency: (optional) Seconds to wait before each response, or a
+		distribution of them, as taken by
+		:func:`~chump.fake.latency_distribution`. Defaults to 0.
+	:param float reset_rate: (optional) Fraction of requests whose connection
+		is reset instead of answered. Defaults to 0.
+	:param float drop_rate: (optional) Fraction of requests whose connection
+		is closed, without warning, once answered. Defaults to 0.
+	:param float throttle_rate: (optional) Fraction of requests answered with
+		a ``429``. Defaults to 0.
+	:param float error_rate: (optional) Fraction of requests answered with a
+		``5xx`` and an HTML page. Defaults to 0.
+	:param int seed: (optional) Seed of the faults, latencies and receipts
+		drawn, for repeatable runs. Defaults to :py:obj:`None`.
+	:param float receipt_retention: (optional) Seconds a receipt can still be
+		polled once acknowledged, cancelled or expired, before it's
+		forgotten. Defaults to 3600.
+	
+	"""
+	
+	def __init__(self, host='127.0.0.1', port=0, certfile=None, keyfile=None, apps=None, users=None, limit=10000,
+			acknowledge_after=None, latency=0, reset_rate=0, drop_rate=0, throttle_rate=0, error_rate=0, seed=None,
+			receipt_retention=3600):
+		self.apps = None if apps is None else frozenset(apps) #: A :py:class:`frozenset` of the application tokens accepted, or :py:obj:`None` for any.
+		self.users = None if users is None else dict((token, tuple(devices)) for token, devices in users.items()) #: A :py:class:`dict` of device names keyed on the user tokens accepted, or :py:obj:`None` for any.
+		self.limit = limit #: An :py:obj:`int` of the messages each application may send a month.
+		self.acknowledge_after = acknowledge_after #: A :py:obj:`float` of seconds after which emergency messages are acknowledged, or :py:obj:`None`.
+		self.receipt_retention = receipt_retention #: A :py:obj:`float` of seconds ended receipts are kept for.
+		
+		self.latency = latency_distribution(latency) if not callable(latency) else latency
+		self.rates = (('reset', reset_rate), ('drop', drop_rate), ('throttle', throttle_rate), ('error', error_rate))
+		
+		self.lock = threading.Lock()
+		self.rng = random.Random(seed)
+		self.remaining = {}
+		self.receipts = {}
+		self.pruned_at = time.time()
+		self.messages = deque(maxlen=10000) #: The last 10000 messages accepted, as :py:class:`dict` of their fields.
+		self.stats = dict((name, 0) for name in ('requests', 'messages', 'reset', 'drop', 'throttle', 'error')) #: A :py:class:`dict` of counts of requests, messages accepted and each fault injected.
+		
+		self._directory = None
+		
+		if certfile is None:
+			self._directory = tempfile.mkdtemp(prefix='chump-fake-')
+			certfile, keyfile = make_certificate(self._directory)
+		
+		self.certfile = certfile #: A :py:obj:`string` of the path of the certificate served, for clients to trust.
+		
+		context = ssl.SSLContext(getattr(ssl, 'PROTOCOL_TLS_SERVER', ssl.PROTOCOL_SSLv23))
+		context.load_cert_chain(certfile, keyfile)
+		
+		self._server = ThreadingFakeHTTPServer((host, port), FakeRequestHandler)
+		self._server.socket = context.wrap_socket(self._server.socket, server_side=True)
+		self._server.fake = self
+		self._thread = None
+		self._redirected = None
+	
+	@property
+	def address(self):
+		"""
+		A :py:obj:`tuple` of the (``host``, ``port``) the server is bound to.
+		
+		"""
+		
+		return self._server.server_address[:2]
+	
+	@property
+	def host(self):
+		"""
+		A :py:obj:`string` of the ``host:port`` to send requests to.
+		
+		"""
+		
+		host, port = self.address
+		
+		return '{host}:{port}'.format(host='localhost' if host in ('127.0.0.1', '0.0.0.0') else host, port=port)
+	
+	def __unicode__(self):
+		return "Fake Pushover Server: {host}".format(host=self.host)
+	
+	__str__ = __unicode__
+	
+	def __repr__(self):
+		return 'FakeServer(host={host!r})'.format(host=self.host)
+	
+	def __enter__(self):
+		self.start()
+		self.redirect()
+		return self
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.restore()
+		self.stop()
+	
+	def start(self):
+		"""
+		Starts serving in a background thread.
+		
+		"""
+		
+		self._thread = threading.Thread(target=self._server.serve_forever)
+		self._thread.daemon = True
+		self._thread.start()
+	
+	def stop(self):
+		"""
+		Stops serving, closes the listening socket, and removes the throwaway
+		certificate, if one was made.
+		
+		"""
+		
+		if self._thread is not None:
+			self._server.shutdown()
+			self._server.close_connections()
+			self._thread.join()
+			self._thread = None
+		
+		self._server.server_close()
+		
+		if self._directory is not None:
+			shutil.rmtree(self._directory, ignore_errors=True)
+			self._directory = None
+	
+	def redirect(self):
+		"""
+		Points chump's shared connection pool at the server, trusting its
+		certificate, until :meth:`.restore` is called.
+		
+		"""
+		
+		self._redirected = (connection_pool.HOST, connection_pool.handler._context)
+		
+		connection_pool.HOST = self.host
+		connection_pool.handler._context = ssl.create_default_context(cafile=self.certfile)
+		connection_pool.handler.clear()
+	
+	def restore(self):
+		"""
+		Points chump's shared connection pool back where it was before
+		:meth:`.redirect`.
+		
+		"""
+		
+		if self._redirected is not None:
+			connection_pool.HOST, connection_pool.handler._context = self._redirected
+			connection_pool.handler.clear()
+			self._redirected = None
+	
+	def fault(self):
+		"""
+		Draws the fault, (or :py:obj:`None`), and the latency, in seconds, of
+		a request.
+		
+		"""
+		
+		self.lock.acquire()
+		try:
+			self.stats['requests'] += 1
+			delay = self.latency(self.rng)
+			draw = self.rng.random()
+			
+			for name, rate in self.rates:
+				if draw < rate:
+					self.stats[name] += 1
+					return name, delay
+				
+				draw -= rate
+			
+			return None, delay
+		
+		finally:
+			self.lock.release()
+	
+	def rng_choice(self, choices):
+		self.lock.acquire()
+		try: return self.rng.choice(choices)
+		finally: self.lock.release()
+	
+	def handle(self, method, path, data):
+		"""
+		Answers a request, returning a :py:obj:`tuple` of (``code``,
+		``response``, ``headers``), where ``response`` is a :py:class:`dict`
+		to send as ``json`` and ``headers`` a :py:obj:`list` of extra
+		(``name``, ``value``) headers.
+		
+		"""
+		
+		for route_method, pattern, request in ROUTES:
+			match = pattern.match(path)
+			
+			if match is not None and route_method == method:
+				break
+		
+		else:
+			return 404, {'status': 0, 'errors': ['not found'], 'request': uuid.uuid4().hex}, []
+		
+		token = data.get('token')
+		
+		if not (isinstance(token, basestring) and TOKEN_RE.match(token) and (self.apps is None or token in self.apps)):
+			return self.invalid('token', 'application token is invalid')
+		
+		self.lock.acquire()
+		try:
+			return getattr(self, 'handle_' + request)(token, data, **dict((key, unquote(value)) for key, value in match.groupdict().items()))
+		
+		finally:
+			self.lock.release()
+	
+	def invalid(self, field, error, code=400, headers=()):
+		return code, {field: 'invalid', 'status': 0, 'errors': [error], 'request': uuid.uuid4().hex}, list(headers)
+	
+	def ok(self, **response):
+		response.update(status=1, request=uuid.uuid4().hex)
+		return 200, response, []
+	
+	def devices_of(self, user):
+		if not (isinstance(user, basestring) and TOKEN_RE.match(user)):
+			return None
+		
+		elif self.users is None:
+			return DEFAULT_DEVICES
+		
+		else:
+			return self.users.get(user)
+	
+	def limit_headers(self, token):
+		return [
+			('X-Limit-App-Limit', str(self.limit)),
+			('X-Limit-App-Remaining', str(self.remaining.get(token, self.limit))),
+			('X-Limit-App-Reset', str(next_month(time.time()))),
+		]
+	
+	def handle_message(self, token, data):
+		headers = self.limit_headers(token)
+		devices = self.devices_of(data.get('user'))
+		
+		if self.remaining.get(token, self.limit) <= 0:
+			return self.invalid('token', 'application has exceeded its monthly message limit', 429, headers)
+		
+		if devices is None:
+			return self.invalid('user', 'user identifier is not a valid user, group, or subscribed user key', headers=headers)
+		
+		if not data.get('message'):
+			return self.invalid('message', 'message cannot be blank', headers=headers)
+		
+		for field, max_length in MAX_LENGTHS:
+			if len(data.get(field) or '') > max_length:
+				return self.invalid(field, '{field} is too long, limit is {max_length}'.format(field=field, max_length=max_length), headers=headers)
+		
+		for device in (data.get('device') or '').split(','):
+			if device and (not DEVICE_RE.match(device) or device not in devices):
+				return self.invalid('device', 'device name is not valid for user', headers=headers)
+		
+		if data.get('sound') and data['sound'] not in SOUNDS:
+			return self.invalid('sound', 'sound is invalid', headers=headers)
+		
+		try:
+			priority = int(data.get('priority') or 0)
+			retry = int(data.get('retry') or 0)
+			expire = int(data.get('expire') or 0)
+		
+		except ValueError:
+			return self.invalid('priority', 'priority, retry and expire must be integers', headers=headers)
+		
+		if not -2 <= priority <= 2:
+			return self.invalid('priority', 'priority must be between -2 and 2', headers=headers)
+		
+		response = {}
+		
+		if priority == 2:
+			if retry < MIN_RETRY:
+				return self.invalid('retry', 'retry must be at least {seconds} seconds'.format(seconds=MIN_RETRY), headers=headers)
+			
+			if not 0 < expire <= MAX_EXPIRE:
+				return self.invalid('expire', 'expire must be at most {seconds} seconds'.format(seconds=MAX_EXPIRE), headers=headers)
+			
+			response['receipt'] = receipt = ''.join(self.rng.choice(string.ascii_letters + string.digits) for _ in range(30))
+			self.receipts[receipt] = {
+				'token': token,
+				'user': data['user'],
+				'device': (data.get('device') or ','.join(devices)).split(',')[0],
+				'callback': data.get('callback'),
+				'tags': frozenset(tag for tag in (data.get('tags') or '').split(',') if tag),
+				'sent_at': time.time(),
+				'retry': retry,
+				'expire': expire,
+				'acknowledged_at': None,
+				'called_back_at': None,
+				'cancelled_at': None,
+			}
+			
+			if self.acknowledge_after is not None:
+				timer = threading.Timer(self.acknowledge_after, self.acknowledge, (receipt,))
+				timer.daemon = True
+				timer.start()
+		
+		self.prune()
+		self.remaining[token] = self.remaining.get(token, self.limit) - 1
+		self.stats['messages'] += 1
+		self.messages.append(data)
+		
+		code, response, _ = self.ok(**response)
+		
+		return code, response, self.limit_headers(token)
+	
+	def handle_validate(self, token, data):
+		devices = self.devices_of(data.get('user'))
+		
+		if devices is None:
+			return self.invalid('user', 'user key is invalid')
+		
+		if data.get('device') and data['device'] not in devices:
+			return self.invalid('device', 'device name is not valid for user')
+		
+		return self.ok(group=0, devices=list(devices), licenses=['Android', 'iOS', 'Desktop'])
+	
+	def handle_sound(self, token, data):
+		return self.ok(sounds=SOUNDS)
+	
+	def handle_receipt(self, token, data, receipt):
+		state = self.receipts.get(receipt)
+		
+		if state is None or state['token'] != token:
+			return self.invalid('receipt', 'receipt not found; may be invalid or expired', 404)
+		
+		now = time.time()
+		expires_at = state['sent_at'] + state['expire']
+		ended_at = min(at for at in (now, expires_at, state['acknowledged_at'], state['cancelled_at']) if at is not None)
+		
+		return self.ok(
+			acknowledged=int(state['acknowledged_at'] is not None),
+			acknowledged_at=int(state['acknowledged_at'] or 0),
+			acknowledged_by=state['user'] if state['acknowledged_at'] is not None else '',
+			acknowledged_by_device=state['device'] if state['acknowledged_at'] is not None else '',
+			last_delivered_at=int(state['sent_at'] + (ended_at - state['sent_at']) // state['retry'] * state['retry']),
+			expired=int(now >= expires_at),
+			expires_at=int(expires_at),
+			called_back=int(state['called_back_at'] is not None),
+			called_back_at=int(state['called_back_at'] or 0),
+		)
+	
+	def handle_cancel(self, token, data, receipt):
+		state = self.receipts.get(receipt)
+		
+		if state is None or state['token'] != token:
+			return self.invalid('receipt', 'receipt not found; may be invalid or expired', 404)
+		
+		if state['cancelled_at'] is None:
+			state['cancelled_at'] = time.time()
+		
+		return self.ok()
+	
+	def handle_cancel_by_tag(self, token, data, tag):
+		now = time.time()
+		cancelled = 0
+		
+		for state in self.receipts.values():
+			if state['token'] == token and tag in state['tags'] and self.is_active(state, now):
+				state['cancelled_at'] = now
+				cancelled += 1
+		
+		return self.ok(canceled=cancelled)
+	
+	@staticmethod
+	def is_active(state, now):
+		return state['acknowledged_at'] is None and state['cancelled_at'] is None and now < state['sent_at'] + state['expire']
+	
+	def prune(self):
+		# Forgets receipts ended longer ago than the retention, (as Pushover
+		# does), at most once every PRUNE_INTERVAL, under the lock.
+		now = time.time()
+		
+		if now - self.pruned_at < PRUNE_INTERVAL:
+			return
+		
+		self.pruned_at = now
+		
+		for receipt, state in list(self.receipts.items()):
+			ended_at = min(at for at in (state['sent_at'] + state['expire'], state['acknowledged_at'], state['cancelled_at']) if at is not None)
+			
+			if ended_at + self.receipt_retention <= now:
+				del self.receipts[receipt]
+	
+	def acknowledge(self, receipt):
+		"""
+		Acknowledges an emergency message as its user, on its first device,
+		and pings its callback, if it has one.
+		
+		:param string receipt: The message's receipt.
+		
+		:returns: A :py:obj:`bool` indicating whether the message was still
+			awaiting acknowledgement.
+		:rtype: A :py:obj:`bool`.
+		
+		"""
+		
+		self.lock.acquire()
+		try:
+			state = self.receipts.get(receipt)
+			now = time.time()
+			
+			if state is None or not self.is_active(state, now):
+				return False
+			
+			state['acknowledged_at'] = now
+		
+		finally:
+			self.lock.release()
+		
+		if state['callback']:
+			thread = threading.Thread(target=self._call_back, args=(receipt, state))
+			thread.daemon = True
+			thread.start()
+		
+		return True
+	
+	def _call_back(self, receipt, state):
+		data = urlencode({
+			'receipt': receipt,
+			'acknowledged': 1,
+			'acknowledged_at': int(state['acknowledged_at']),
+			'acknowledged_by': state['user'],
+			'acknowledged_by_device': state['device'],
+		}).encode('utf-8')
+		
+		try:
+			urlopen(state['callback'], data, timeout=10).close()
+		
+		except (IOError, OSError) as error:
+			logger.debug('Fake Pushover callback to {url} failed: {error}'.format(url=state['callback'], error=error))
+		
+		else:
+			self.lock.acquire()
+			try: state['called_back_at'] = time.time()
+			finally: self.lock.release()
+
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description='Serves a fake Pushover API, with injected faults, for testing.')
+	parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: %(default)s)')
+	parser.add_argument('--port', type=int, default=8443, help='port to listen on (default: %(default)s)')
+	parser.add_argument('--certfile', help='TLS certificate to serve (default: a throwaway self-signed one)')
+	parser.add_argument('--keyfile', help="the certificate's key")
+	parser.add_argument('--app', action='append', dest='apps', metavar='TOKEN', help='accept only these application tokens (repeatable)')
+	parser.add_argument('--user', action='append', dest='users', metavar='TOKEN[:DEVICE,...]', help='accept only these users, with these devices (repeatable)')
+	parser.add_argument('--limit', type=int, default=10000, help="each application's monthly message limit (default: %(default)s)")
+	parser.add_argument('--acknowledge-after', type=float, metavar='SECONDS', help='acknowledge emergency messages after this long')
+	parser.add_argument('--latency', default='0', help='seconds, uniform:low,high, exponential:mean or lognormal:median,sigma (default: %(default)s)')
+	parser.add_argument('--reset-rate', type=float, default=0, help='fraction of connections to reset instead of answering')
+	parser.add_argument('--drop-rate', type=float, default=0, help='fraction of keep-alive connections to close once answered')
+	parser.add_argument('--throttle-rate', type=float, default=0, help='fraction of requests to answer with a 429')
+	parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests to answer with a 5xx')
+	parser.add_argument('--seed', type=int, help='seed for repeatable faults')
+	args = parser.parse_args(args)
+	
+	users = None
+	
+	if args.users:
+		users = {}
+		
+		for user in args.users:
+			token, _, devices = user.partition(':')
+			users[token] = devices.split(',') if devices else DEFAULT_DEVICES
+	
+	try:
+		latency = latency_distribution(args.latency)
+	
+	except ValueError as error:
+		parser.error(str(error))
+	
+	server = FakeServer(
+		host=args.host,
+		port=args.port,
+		certfile=args.certfile,
+		keyfile=args.keyfile,
+		apps=args.apps,
+		users=users,
+		limit=args.limit,
+		acknowledge_after=args.acknowledge_after,
+		latency=latency,
+		reset_rate=args.reset_rate,
+		drop_rate=args.drop_rate,
+		throttle_rate=args.throttle_rate,
+		error_rate=args.error_rate,
+		seed=args.seed,
+	)
+	
+	print('Serving a fake Pushover API on https://{host}/1/, point chump at it with:'.format(host=server.host))
+	print('\texport CHUMP_HOST={host} CHUMP_CA_FILE={certfile}'.format(host=server.host, certfile=server.certfile))
+	
+	server.start()
+	
+	try:
+		while True:
+			time.sleep(3600)
+	
+	except KeyboardInterrupt:
+		pass
+	
+	finally:
+		server.stop()
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from . import EMERGENCY, HIGH, LOW, LOWEST, MAX_MESSAGE_LENGTH, MAX_TITLE_LENGTH, NORMAL
+from .cache import clock
+
+try: # Python 3
+	from queue import Full, Queue
+
+except ImportError: # Python 2
+	from Queue import Full, Queue
+
+
+#: Message priorities of log levels, by the lowest level each applies to.
+LEVEL_PRIORITIES = (
+	(logging.CRITICAL, EMERGENCY),
+	(logging.ERROR, HIGH),
+	(logging.WARNING, NORMAL),
+	(logging.INFO, LOW),
+	(logging.NOTSET, LOWEST),
+)
+
+ELLIPSIS = '…'
+
+# Most distinct records remembered for suppressing repeats.
+MAX_REPEATS = 4096
+
+
+def truncate(text, max_length):
+	return text if len(text) <= max_length else text[:max_length - len(ELLIPSIS)] + ELLIPSIS
+
+
+class PushoverHandler(logging.Handler):
+	"""
+	A :py:class:`logging.Handler` that sends log records to a
+	:class:`~chump.User` as messages. Records are formatted and queued by the
+	logging thread, and sent by a background thread, so logging never waits
+	on the network. If the queue is full, records are dropped.
+	
+	Records are rate limited per logger, and repeats of a sent record, (from
+	the same logger and line, with the same message), are suppressed for
+	``dedupe_interval`` seconds, the next one sent noting how many were.
+	Records from chump's own loggers are ignored, so failures to send can't
+	feed back into more messages.
+	
+	:param user: The user to send messages to.
+	:type user: :class:`~chump.User`
+	:param int level: (optional) The lowest level to send. Defaults to
+		:py:data:`logging.ERROR`.
+	:param priorities: (optional) Message priorities of log levels, as
+		:py:obj:`tuple`\\s of (``level``, ``priority``), highest level first,
+		each applying to records at or above its level. Defaults to
+		:const:`~chump.handlers.LEVEL_PRIORITIES`.
+	:param int rate: (optional) Messages each logger may send per ``per``
+		seconds. Defaults to 10.
+	:param int per: (optional) Seconds over which ``rate`` applies. Defaults
+		to 60.
+	:param int dedupe_interval: (optional) Seconds for which repeats of a
+		sent record are suppressed. Defaults to 300.
+	:param int capacity: (optional) Most records to queue before dropping
+		them. Defaults to 1000.
+	:param message_kwargs: (optional) Further keyword arguments to
+		:meth:`~chump.User.send_message`, such as ``sound``, ``device``,
+		``retry`` or ``expire``.
+	
+	"""
+	
+	def __init__(self, user, level=logging.ERROR, priorities=LEVEL_PRIORITIES, rate=10, per=60, dedupe_interval=300, capacity=1000, **message_kwargs):
+		logging.Handler.__init__(self, level)
+		
+		self.user = user #: The :class:`~chump.User` messages are sent to.
+		self.priorities = priorities #: A :py:obj:`tuple` of (``level``, ``priority``), highest level first.
+		self.rate = rate #: An :py:obj:`int` of messages each logger may send per :attr:`.per` seconds.
+		self.per = per #: An :py:obj:`int` of seconds over which :attr:`.rate` applies.
+		self.dedupe_interval = dedupe_interval #: An :py:obj:`int` of seconds for which repeats of a sent record are suppressed.
+		self.message_kwargs = message_kwargs #: A :py:class:`dict` of further keyword arguments to :meth:`~chump.User.send_message`.
+		
+		self.dropped = 0 #: An :py:obj:`int` of records dropped for a full queue or by rate limiting.
+		self.suppressed = 0 #: An :py:obj:`int` of repeated records suppressed.
+		
+		self.queue = Queue(capacity)
+		self.allowances = {}
+		self.repeats = OrderedDict()
+		
+		self._thread = threading.Thread(target=self._listen)
+		self._thread.daemon = True
+		self._thread.start()
+	
+	def __repr__(self):
+		return 'PushoverHandler(user={user!r}, level={level!r})'.format(user=self.user, level=logging.getLevelName(self.level))
+	
+	def priority(self, levelno):
+		"""
+		Returns the message priority of a log level.
+		
+		"""
+		
+		for level, priority in self.priorities:
+			if levelno >= level:
+				return priority
+		
+		return LOWEST
+	
+	def allow(self, name):
+		# A token bucket per logger, refilling at rate per per seconds.
+		now = clock()
+		allowance, checked_at = self.allowances.get(name, (self.rate, now))
+		allowance = min(self.rate, allowance + (now - checked_at) * self.rate / self.per)
+		
+		if allowance < 1:
+			self.allowances[name] = (allowance, now)
+			return False
+		
+		self.allowances[name] = (allowance - 1, now)
+		
+		return True
+	
+	def emit(self, record):
+		# Called with the handler's lock held, by Handler.handle.
+		if record.name == 'chump' or record.name.startswith('chump.'):
+			return
+		
+		try:
+			message = self.format(record)
+			key = (record.name, record.levelno, record.pathname, record.lineno, message)
+			now = clock()
+			
+			sent_at, repeats = self.repeats.get(key, (None, 0))
+			
+			if sent_at is not None and now - sent_at < self.dedupe_interval:
+				self.repeats[key] = (sent_at, repeats + 1)
+				self.suppressed += 1
+				return
+			
+			if not self.allow(record.name):
+				self.dropped += 1
+				return
+			
+			self.repeats.pop(key, None)
+			self.repeats[key] = (now, 0)
+			
+			while len(self.repeats) > MAX_REPEATS:
+				self.repeats.popitem(last=False)
+			
+			title = '{levelname}: {name}'.format(levelname=record.levelname, name=record.name)
+			
+			if repeats:
+				title = '{title} (+{repeats} repeats)'.format(title=title, repeats=repeats)
+			
+			self.queue.put_nowait((
+				truncate(message, MAX_MESSAGE_LENGTH),
+				truncate(title, MAX_TITLE_LENGTH),
+				self.priority(record.levelno),
+				record,
+			))
+		
+		except Full:
+			self.dropped += 1
+		
+		except Exception:
+			self.handleError(record)
+	
+	def _listen(self):
+		while True:
+			item = self.queue.get()
+			
+			try:
+				if item is None:
+					return
+				
+				message, title, priority, record = item
+				
+				try:
+					sent = self.user.send_message(message, title=title, priority=priority, **self.message_kwargs)
+					
+					if sent.error is not None:
+						raise sent.error
+				
+				except Exception:
+					self.handleError(record)
+			
+			finally:
+				self.queue.task_done()
+	
+	def flush(self, timeout=10):
+		"""
+		Waits up to ``timeout`` seconds, (or forever, if :py:obj:`None`), for
+		queued records to be sent.
+		
+		"""
+		
+		deadline = None if timeout is None else clock() + timeout
+		
+		while self.queue.unfinished_tasks and self._thread.is_alive() and (deadline is None or clock() < deadline):
+			time.sleep(0.01)
+	
+	def close(self):
+		"""
+		Sends queued records, waiting up to 10 seconds, and stops the
+		background thread.
+		
+		"""
+		
+		if self._thread.is_alive():
+			try:
+				self.queue.put(None, timeout=10)
+				self._thread.join(10)
+			
+			except Full:
+				pass
+		
+		logging.Handler.close(self)
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import errno
+import io
+import os
+import socket
+import threading
+from collections import OrderedDict
+
+try: import ujson as json
+except ImportError: import json
+
+try: from http.client import HTTPException # Python 3
+except ImportError: from httplib import HTTPException # Python 2
+
+from .cache import replace
+
+
+PENDING = 'pending' #: State of a send that's been started but hasn't finished.
+SENT = 'sent' #: State of a send Pushover has confirmed.
+AMBIGUOUS = 'ambiguous' #: State of a send that failed in a way that may or may not have reached Pushover.
+
+# Errnos of connections that failed before any request could be sent.
+UNSENT_ERRNOS = (errno.ECONNREFUSED, errno.ENOENT, errno.ENETUNREACH, errno.EHOSTUNREACH)
+
+# Errors of requests that failed in transit, (including URLErrors and timeouts).
+TRANSPORT_ERRORS = (IOError, OSError, HTTPException)
+
+
+def is_unsent(error):
+	"""
+	Returns whether a request that failed with ``error`` certainly
+	wasn't received, (as when its connection was refused, or its host
+	couldn't be resolved), rather than possibly having been.
+	
+	"""
+	
+	reason = getattr(error, 'reason', error)
+	
+	return isinstance(reason, socket.gaierror) or getattr(reason, 'errno', None) in UNSENT_ERRNOS
+
+
+class MemoryKeyStore(object):
+	"""
+	Records the outcomes of sends by their messages'
+	:attr:`~chump.Message.idempotency_key`\\s, in memory. Once full, the
+	least recently used record is evicted.
+	
+	Records are :py:class:`dict`\\s with a ``state`` of :const:`PENDING`,
+	:const:`SENT` or :const:`AMBIGUOUS`, and for sent messages, the
+	``request`` id, ``receipt``, (if an emergency message), and ``sent_at``
+	as seconds since the epoch.
+	
+	:param int maxsize: (optional) Maximum number of records. Defaults
+		to 65536.
+	
+	"""
+	
+	def __init__(self, maxsize=65536):
+		self.maxsize = maxsize #: An :py:obj:`int` of the maximum number of records.
+		
+		self.lock = threading.Lock()
+		self.records = OrderedDict()
+	
+	def __len__(self):
+		return len(self.records)
+	
+	def __repr__(self):
+		return 'MemoryKeyStore(maxsize={maxsize!r})'.format(maxsize=self.maxsize)
+	
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		del state['lock']
+		
+		return state
+	
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.lock = threading.Lock()
+	
+	def _touch(self, key):
+		self.records[key] = self.records.pop(key)
+	
+	def _store(self, key, record):
+		self.records.pop(key, None)
+		
+		if record is not None:
+			self.records[key] = record
+			
+			while len(self.records) > self.maxsize:
+				self.records.popitem(last=False)
+	
+	def get(self, key):
+		"""
+		Returns the record for ``key``, otherwise :py:obj:`None`.
+		
+		"""
+		
+		self.lock.acquire()
+		try:
+			record = self.records.get(key)
+			
+			if record is not None:
+				self._touch(key)
+			
+			return record
+		
+		finally:
+			self.lock.release()
+	
+	def claim(self, key):
+		"""
+		Returns the record for ``key`` if there is one, otherwise records
+		``key`` as :const:`PENDING`, (so that no other send of it starts),
+		and returns :py:obj:`None`.
+		
+		"""
+		
+		self.lock.acquire()
+		try:
+			record = self.records.get(key)
+			
+			if record is not None:
+				self._touch(key)
+			
+			else:
+				self._store(key, {'state': PENDING})
+			
+			return record
+		
+		finally:
+			self.lock.release()
+	
+	def set(self, key, record):
+		"""
+		Stores ``record`` for ``key``.
+		
+		"""
+		
+		self.lock.acquire()
+		try: self._store(key, record)
+		finally: self.lock.release()
+	
+	def invalidate(self, key):
+		"""
+		Removes the record for ``key``, if present, so that its message may
+		be sent again, such as once an :const:`AMBIGUOUS` send is found not
+		to have been received.
+		
+		"""
+		
+		self.set(key, None)
+
+
+class FileKeyStore(MemoryKeyStore):
+	"""
+	A :class:`MemoryKeyStore` that's also kept in a file, so that the
+	outcomes of sends survive restarts. Changes are appended to the file as
+	lines of ``json``, which is compacted once it's grown to twice
+	``maxsize`` lines. It should only be used by one process at a time.
+	
+	:param string path: Path of the file.
+	:param int maxsize: (optional) Maximum number of records. Defaults
+		to 65536.
+	:param bool sync: (optional) Whether to flush each change to disk
+		before the send continues, rather than leaving it to the operating
+		system. Defaults to :py:obj:`False`.
+	
+	"""
+	
+	def __init__(self, path, maxsize=65536, sync=False):
+		super(FileKeyStore, self).__init__(maxsize)
+		
+		self.path = path #: A :py:obj:`string` of the path of the file.
+		self.sync = sync #: A :py:obj:`bool` indicating whether each change is flushed to disk.
+		
+		self.lines = 0
+		
+		try:
+			with io.open(path, 'r', encoding='utf-8') as records_file:
+				for line in records_file:
+					try: change = json.loads(line)
+					except ValueError: continue # A line cut short by a crash.
+					
+					MemoryKeyStore._store(self, change['k'], change['r'])
+					self.lines += 1
+		
+		except (IOError, OSError) as error:
+			if error.errno != errno.ENOENT:
+				raise
+		
+		self._file = io.open(path, 'a', encoding='utf-8')
+	
+	def __repr__(self):
+		return 'FileKeyStore(path={path!r}, maxsize={maxsize!r})'.format(path=self.path, maxsize=self.maxsize)
+	
+	def __getstate__(self):
+		raise TypeError("FileKeyStore can't be pickled, as only one process may use its file")
+	
+	def _store(self, key, record):
+		MemoryKeyStore._store(self, key, record)
+		
+		self._write(self._file, key, record)
+		self.lines += 1
+		
+		if self.lines > 2 * self.maxsize:
+			self._compact()
+	
+	def _write(self, records_file, key, record):
+		records_file.write(json.dumps({'k': key, 'r': record}) + '\n')
+		records_file.flush()
+		
+		if self.sync:
+			os.fsync(records_file.fileno())
+	
+	def _compact(self):
+		import tempfile
+		
+		descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), prefix='.chump-', suffix='.tmp')
+		
+		try:
+			with io.open(descriptor, 'w', encoding='utf-8') as temp_file:
+				for key, record in self.records.items():
+					temp_file.write(json.dumps({'k': key, 'r': record}) + '\n')
+				
+				temp_file.flush()
+				os.fsync(temp_file.fileno())
+			
+			replace(temp_path, self.path)
+		
+		except BaseException:
+			os.remove(temp_path)
+			raise
+		
+		self._file.close()
+		self._file = io.open(self.path, 'a', encoding='utf-8')
+		self.lines = len(self.records)
+	
+	def close(self):
+		"""
+		Closes the file.
+		
+		"""
+		
+		self.lock.acquire()
+		try: self._file.close()
+		finally: self.lock.release()
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import threading
+import weakref
+from calendar import timegm
+
+from .cache import clock
+
+
+#: Upper bounds, in seconds, of the request latency histogram's buckets.
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+
+class MetricsRegistry(object):
+	"""
+	Collects counts and latencies of requests to Pushover, by request type
+	and status code, alongside gauges of the connection pool and of each
+	application's message allotment. Recording is cheap and thread safe.
+	
+	:param handler: (optional) The connection pool to report on. Defaults to
+		the one all requests are made with, (which is only imported once
+		reported on, so that requests sent through a relay don't import the
+		transport to record themselves).
+	:type handler: :class:`~chump.connection_pool.PushoverPooledConnectionHandler`
+	
+	"""
+	
+	def __init__(self, handler=None):
+		self.handler = handler
+		
+		self.lock = threading.Lock()
+		self.started_at = clock()
+		self.requests = {}
+		self.latencies = {}
+		self.apps = weakref.WeakValueDictionary()
+	
+	def __repr__(self):
+		return 'MetricsRegistry(handler={handler!r})'.format(handler=self.handler)
+	
+	def observe(self, request, code, seconds):
+		"""
+		Records a completed request.
+		
+		:param string request: The type of request, as in
+			:data:`~chump.REQUESTS`.
+		:param int code: The response's HTTP status code, or 0 if there
+			was none.
+		:param float seconds: How long the request took.
+		
+		"""
+		
+		bucket = 0
+		
+		while seconds > LATENCY_BUCKETS[bucket]:
+			bucket += 1
+		
+		self.lock.acquire()
+		try:
+			self.requests[(request, code)] = self.requests.get((request, code), 0) + 1
+			
+			if request not in self.latencies:
+				self.latencies[request] = [[0] * len(LATENCY_BUCKETS), 0.0]
+			
+			latency = self.latencies[request]
+			latency[0][bucket] += 1
+			latency[1] += seconds
+		
+		finally:
+			self.lock.release()
+	
+	def track(self, app):
+		"""
+		Reports the message allotment of ``app`` for as long as it's alive.
+		
+		:param app: The application to report on.
+		:type app: :class:`~chump.Application`
+		
+		"""
+		
+		self.apps[id(app)] = app
+	
+	def reset(self):
+		"""
+		Forgets all recorded requests.
+		
+		"""
+		
+		self.lock.acquire()
+		try:
+			self.started_at = clock()
+			self.requests = {}
+			self.latencies = {}
+		
+		finally:
+			self.lock.release()
+	
+	def snapshot(self):
+		"""
+		Returns a point in time copy of the metrics, as a :py:class:`dict`
+		with the keys:
+		
+		* ``requests``: A :py:class:`dict` of request counts by
+		  (``request``, ``code``).
+		* ``latencies``: A :py:class:`dict` by request type of
+		  :py:class:`dict`\\s with ``buckets``, (cumulative counts by upper
+		  bound in seconds, as in :data:`LATENCY_BUCKETS`), ``count``, and
+		  ``sum``.
+		* ``pool``: A :py:class:`dict` of the connection pool's ``total`` and
+		  ``free`` connections, and of connections ``created``, ``reused``, and
+		  ``discarded`` as stale.
+		* ``apps``: A :py:class:`dict` by application token of
+		  :py:class:`dict`\\s with ``limit``, ``remaining``, and ``reset``.
+		* ``uptime``: Seconds since the registry was created or reset.
+		
+		:rtype: A :py:class:`dict`.
+		
+		"""
+		
+		self.lock.acquire()
+		try:
+			requests = dict(self.requests)
+			latencies = dict((request, (list(buckets), total)) for request, (buckets, total) in self.latencies.items())
+			uptime = clock() - self.started_at
+		
+		finally:
+			self.lock.release()
+		
+		if self.handler is None:
+			from .connection_pool import handler
+		
+		else:
+			handler = self.handler
+		
+		snapshot = {
+			'requests': requests,
+			'latencies': {},
+			'pool': handler.stats(),
+			'apps': {},
+			'uptime': uptime,
+		}
+		
+		for request, (buckets, total) in latencies.items():
+			cumulative = 0
+			snapshot['latencies'][request] = {'buckets': [], 'count': sum(buckets), 'sum': total}
+			
+			for bound, count in zip(LATENCY_BUCKETS, buckets):
+				cumulative += count
+				snapshot['latencies'][request]['buckets'].append((bound, cumulative))
+		
+		for app in list(self.apps.values()):
+			if app.limit is not None:
+				snapshot['apps'][app.token] = {'limit': app.limit, 'remaining': app.remaining, 'reset': app.reset}
+		
+		return snapshot
+	
+	def to_prometheus(self):
+		"""
+		Returns the metrics in Prometheus' text exposition format.
+		Applications are labelled by the first 6 characters of their tokens,
+		so that the tokens aren't exposed.
+		
+		:rtype: A :py:obj:`string`.
+		
+		"""
+		
+		snapshot = self.snapshot()
+		lines = [
+			'# HELP chump_requests_total Requests made to the Pushover API.',
+			'# TYPE chump_requests_total counter',
+		]
+		
+		for (request, code), count in sorted(snapshot['requests'].items()):
+			lines.append('chump_requests_total{{request="{request}",code="{code}"}} {count}'.format(request=request, code=code, count=count))
+		
+		lines.extend((
+			'# HELP chump_request_duration_seconds Latency of requests made to the Pushover API.',
+			'# TYPE chump_request_duration_seconds histogram',
+		))
+		
+		for request, latency in sorted(snapshot['latencies'].items()):
+			for bound, count in latency['buckets']:
+				lines.append('chump_request_duration_seconds_bucket{{request="{request}",le="{bound}"}} {count}'.format(
+					request=request,
+					bound='+Inf' if bound == float('inf') else repr(bound),
+					count=count,
+				))
+			
+			lines.append('chump_request_duration_seconds_sum{{request="{request}"}} {sum!r}'.format(request=request, sum=latency['sum']))
+			lines.append('chump_request_duration_seconds_count{{request="{request}"}} {count}'.format(request=request, count=latency['count']))
+		
+		lines.extend((
+			'# HELP chump_pool_connections Connections in the pool.',
+			'# TYPE chump_pool_connections gauge',
+			'chump_pool_connections{{state="total"}} {total}'.format(total=snapshot['pool']['total']),
+			'chump_pool_connections{{state="free"}} {free}'.format(free=snapshot['pool']['free']),
+			'# HELP chump_pool_connection_events_total Connections created, reused, and discarded as stale.',
+			'# TYPE chump_pool_connection_events_total counter',
+		))
+		
+		for event in ('created', 'reused', 'discarded'):
+			lines.append('chump_pool_connection_events_total{{event="{event}"}} {count}'.format(event=event, count=snapshot['pool'][event]))
+		
+		lines.extend((
+			'# HELP chump_app_limit Monthly message limit of the application.',
+			'# TYPE chump_app_limit gauge',
+		))
+		lines.extend(
+			'chump_app_limit{{app="{app}"}} {limit}'.format(app=token[:6], limit=quota['limit'])
+			for token, quota in sorted(snapshot['apps'].items())
+		)
+		lines.extend((
+			'# HELP chump_app_remaining Messages remaining in the application\'s monthly allotment.',
+			'# TYPE chump_app_remaining gauge',
+		))
+		lines.extend(
+			'chump_app_remaining{{app="{app}"}} {remaining}'.format(app=token[:6], remaining=quota['remaining'])
+			for token, quota in sorted(snapshot['apps'].items())
+		)
+		lines.extend((
+			'# HELP chump_app_reset_timestamp_seconds When the application\'s monthly allotment resets.',
+			'# TYPE chump_app_reset_timestamp_seconds gauge',
+		))
+		lines.extend(
+			'chump_app_reset_timestamp_seconds{{app="{app}"}} {reset}'.format(app=token[:6], reset=timegm(quota['reset'].utctimetuple()))
+			for token, quota in sorted(snapshot['apps'].items())
+			if quota['reset'] is not None
+		)
+		
+		return '\n'.join(lines) + '\n'
+
+
+#: The registry all requests are recorded in.
+registry = MetricsRegistry()
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import io
+import threading
+import time
+from collections import deque
+from email.message import Message as Headers
+
+try: import ujson as json
+except ImportError: import json
+
+from . import TOKEN_RE
+from .cache import clock
+from .connection_pool import pool
+
+try: basestring # Python 2
+except NameError: basestring = str # Python 3
+
+try: # Python 3
+	from http.client import HTTPException
+	from urllib.error import HTTPError, URLError
+	from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+except ImportError: # Python 2
+	from httplib import HTTPException
+	from urllib import urlencode
+	from urllib2 import HTTPError, URLError
+	from urlparse import parse_qsl, urlsplit, urlunsplit
+
+
+REDACTED = 'REDACTED' #: What secrets are replaced with in recordings.
+SECRET_KEYS = ('token', 'user', 'acknowledged_by') # Keys whose values are tokens.
+
+
+def redact_query(query):
+	return urlencode([(key, REDACTED if key in SECRET_KEYS else value) for key, value in parse_qsl(query, True)])
+
+
+def redact_json(content):
+	try:
+		response = json.loads(content)
+	
+	except ValueError:
+		return content
+	
+	if isinstance(response, dict):
+		for key in SECRET_KEYS:
+			# Only tokens, not errors about them, (like {"user": "invalid"}).
+			if isinstance(response.get(key), basestring) and TOKEN_RE.match(response[key]):
+				response[key] = REDACTED
+	
+	return json.dumps(response)
+
+
+class RecordedResponse(object):
+	"""
+	A response read from, or to be written to, a recording. It quacks like
+	the responses of :py:mod:`urllib`.
+	
+	"""
+	
+	def __init__(self, url, code, headers, content):
+		self.url = url
+		self.code = code
+		self.headers = Headers()
+		
+		for key, value in headers:
+			self.headers[key] = value
+		
+		self._content = io.BytesIO(content)
+	
+	def __repr__(self):
+		return 'RecordedResponse(url={url!r}, code={code!r})'.format(url=self.url, code=self.code)
+	
+	def read(self, *args):
+		return self._content.read(*args)
+	
+	def close(self):
+		self._content.close()
+	
+	def info(self):
+		return self.headers
+	
+	def getcode(self):
+		return self.code
+	
+	def geturl(self):
+		return self.url
+	
+	def to_error(self):
+		return HTTPError(self.url, self.code, 'HTTP Error {code}'.format(code=self.code), self.headers, self)
+
+
+class Recorder(object):
+	"""
+	A transport for :class:`~chump.Application` that makes requests with
+	another, (by default the shared connection pool), and appends each
+	request, its response, (or why it failed, if it didn't get one), and how
+	long it took to a log file, one ``json`` object per line. Application and
+	user tokens are redacted.
+	
+	:param string path: Path of the log file to append to.
+	:param opener: (optional) The opener to make requests with. Defaults to
+		the shared connection pool.
+	
+	"""
+	
+	def __init__(self, path, opener=pool):
+		self.path = path #: A :py:obj:`string` of the path of the log file.
+		self.opener = opener
+		
+		self.lock = threading.Lock()
+		self.started_at = clock()
+		self._file = io.open(path, 'ab')
+	
+	def __repr__(self):
+		return 'Recorder(path={path!r})'.format(path=self.path)
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+	
+	def close(self):
+		"""
+		Closes the log file.
+		
+		"""
+		
+		self.lock.acquire()
+		try: self._file.close()
+		finally: self.lock.release()
+	
+	def open(self, request, data=None):
+		"""
+		Makes and records a request, as :py:meth:`urllib.request.OpenerDirector.open`.
+		
+		"""
+		
+		if isinstance(request, basestring):
+			url = request
+			method = 'POST' if data is not None else 'GET'
+		
+		else:
+			url = request.get_full_url()
+			method = request.get_method()
+			data = request.data
+		
+		started_at = clock()
+		
+		try:
+			try:
+				response = self.opener.open(request, data)
+			
+			except HTTPError as error:
+				response = error
+				headers = error.hdrs
+			
+			else:
+				headers = response.headers
+			
+			recorded = RecordedResponse(url, response.code, headers.items(), response.read())
+			response.close()
+		
+		except (URLError, IOError, OSError, HTTPException) as error:
+			self.record_failure(method, url, data, error, started_at, clock() - started_at)
+			raise
+		
+		self.record(method, url, data, recorded, started_at, clock() - started_at)
+		
+		if recorded.code >= 400:
+			raise recorded.to_error()
+		
+		return recorded
+	
+	def _entry(self, method, url, data, started_at, duration):
+		scheme, netloc, path, query, fragment = urlsplit(url)
+		
+		if isinstance(data, type(b'')):
+			body = redact_query(data.decode('utf-8'))
+		
+		elif data is not None:
+			body = '<{length} bytes>'.format(length=len(data))
+		
+		else:
+			body = None
+		
+		return {
+			't': round(started_at - self.started_at, 6),
+			'd': round(duration, 6),
+			'm': method,
+			'u': urlunsplit((scheme, netloc, path, redact_query(query), fragment)),
+			'b': body,
+		}
+	
+	def _write(self, entry):
+		line = json.dumps(entry)
+		
+		self.lock.acquire()
+		try:
+			self._file.write(line.encode('utf-8') + b'\n')
+			self._file.flush()
+		
+		finally:
+			self.lock.release()
+	
+	def record(self, method, url, data, response, started_at, duration):
+		content = response.read()
+		response._content.seek(0)
+		
+		entry = self._entry(method, url, data, started_at, duration)
+		entry.update({
+			'c': response.code,
+			'h': [[key, value] for key, value in response.headers.items()],
+			'r': redact_json(content.decode('utf-8')),
+		})
+		
+		self._write(entry)
+	
+	def record_failure(self, method, url, data, error, started_at, duration):
+		# Requests that got no response are recorded with why, under f.
+		entry = self._entry(method, url, data, started_at, duration)
+		entry['f'] = '{reason}'.format(reason=getattr(error, 'reason', error))
+		
+		self._write(entry)
+
+
+class ReplayTransport(object):
+	"""
+	A transport for :class:`~chump.Application` that serves the responses of
+	a :class:`~chump.recorder.Recorder`'s log instead of making requests.
+	Each request is answered with the next recorded response to the same
+	method and path, (ignoring the query, and so the redacted tokens), or
+	fails with a :exc:`~urllib.error.URLError` if the recorded request did,
+	after waiting as long as it originally took.
+	
+	:param string path: Path of the log file to replay.
+	:param float speed: (optional) How many times faster than recorded to
+		respond, or :py:obj:`None` to respond immediately. Defaults to 1.
+	:param bool loop: (optional) Whether to start over once a path's
+		recordings run out, for load testing. Defaults to :py:obj:`False`.
+	
+	"""
+	
+	def __init__(self, path, speed=1.0, loop=False):
+		self.path = path #: A :py:obj:`string` of the path of the log file.
+		self.speed = speed #: A :py:obj:`float` of how many times faster than recorded to respond, or :py:obj:`None`.
+		self.loop = loop #: A :py:obj:`bool` of whether recordings are reused once they run out.
+		
+		self.lock = threading.Lock()
+		self.recordings = {}
+		
+		with io.open(path, 'rb') as log:
+			for line in log:
+				if line.strip():
+					recording = json.loads(line.decode('utf-8'))
+					self.recordings.setdefault(self._key(recording['m'], recording['u']), deque()).append(recording)
+	
+	def __repr__(self):
+		return 'ReplayTransport(path={path!r}, speed={speed!r}, loop={loop!r})'.format(path=self.path, speed=self.speed, loop=self.loop)
+	
+	@staticmethod
+	def _key(method, url):
+		return (method, urlsplit(url).path)
+	
+	def open(self, request, data=None):
+		"""
+		Replays the response to a request, as
+		:py:meth:`urllib.request.OpenerDirector.open`.
+		
+		:raises: :exc:`~urllib.error.URLError` if no recording is left for the
+			request, or the recorded request failed.
+		
+		"""
+		
+		if isinstance(request, basestring):
+			url = request
+			method = 'POST' if data is not None else 'GET'
+		
+		else:
+			url = request.get_full_url()
+			method = request.get_method()
+		
+		key = self._key(method, url)
+		
+		self.lock.acquire()
+		try:
+			recordings = self.recordings.get(key)
+			
+			if not recordings:
+				raise URLError('No recording left for {method} {path}'.format(method=key[0], path=key[1]))
+			
+			recording = recordings.popleft()
+			
+			if self.loop:
+				recordings.append(recording)
+		
+		finally:
+			self.lock.release()
+		
+		if self.speed:
+			time.sleep(recording['d'] / self.speed)
+		
+		if 'f' in recording:
+			raise URLError(recording['f'])
+		
+		response = RecordedResponse(url, recording['c'], recording['h'], recording['r'].encode('utf-8'))
+		
+		if response.code >= 400:
+			raise response.to_error()
+		
+		return response
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+
+"""
+A local daemon that holds one warm connection pool, and validated
+applications and users, for the short lived processes on a host to send
+through, so that each needn't import the transport and open its own TLS
+connection just to send a message.
+	
+	$ chump-relay --socket /run/chump/relay.sock
+	$ CHUMP_RELAY_SOCKET=/run/chump/relay.sock ./send-alert.py
+
+Clients and the relay exchange ``json`` objects, one per line, over a Unix
+domain socket. A request is::
+	
+	{"id": 1, "token": "<app token>", "request": "message", "url": null, "data": {...}, "body": "..."}
+
+and its reply is one of::
+	
+	{"id": 1, "response": {...}, "timestamp": 1700000000, "limit": 10000, "remaining": 9999, "reset": 1700000000}
+	{"id": 1, "error": {...}, "code": 400, "timestamp": 1700000000}
+	{"id": 1, "failure": "<reason>"}
+
+for a success, an error from Pushover, and a failure to reach it.
+
+"""
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import argparse
+import errno
+import logging
+import os
+import select
+import socket
+import threading
+
+try: import ujson as json
+except ImportError: import json
+
+from . import ENDPOINT, REQUESTS, APIError, Application, datetime_to_epoch, epoch_to_datetime, logger
+from .cache import TTLCache, USER_NEGATIVE_TTL, clock
+
+try: # Python 3
+	from socketserver import StreamRequestHandler, ThreadingMixIn, UnixStreamServer
+	from urllib.error import URLError
+	from urllib.parse import parse_qsl
+
+except ImportError: # Python 2
+	from SocketServer import StreamRequestHandler, ThreadingMixIn, UnixStreamServer
+	from urllib2 import URLError
+	from urlparse import parse_qsl
+
+
+#: Environment variable naming the relay socket applications send through.
+SOCKET_ENVIRONMENT_VARIABLE = 'CHUMP_RELAY_SOCKET'
+
+# Requests whose successful responses the relay shares between clients.
+CACHED_REQUESTS = ('sound', 'validate')
+
+
+class RelayRequestHandler(StreamRequestHandler):
+	def handle(self):
+		for line in iter(self.rfile.readline, b''):
+			try:
+				request = json.loads(line.decode('utf-8'))
+			
+			except ValueError:
+				logger.warning('Relay received a malformed request: {line!r}'.format(line=line))
+				return
+			
+			reply = self.server.relay.relay(request)
+			
+			self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+			self.wfile.flush()
+
+
+class ThreadingRelayServer(ThreadingMixIn, UnixStreamServer):
+	daemon_threads = True
+
+
+class RelayServer(object):
+	"""
+	Relays requests from :class:`~chump.Application`\\s in other processes
+	to Pushover over the shared connection pool, keeping one application
+	per token, and sharing responses to sound and user validation requests
+	between clients for an hour, (or :const:`~chump.cache.USER_NEGATIVE_TTL`
+	seconds for invalid users).
+	
+	:param string path: Path of the Unix domain socket to listen on. A
+		stale socket left by a relay that's no longer running is replaced.
+	:param int mode: (optional) Permissions of the socket. Defaults to
+		``0o600``, so only its owner may send through it.
+	
+	:raises: :exc:`ValueError` if another relay is listening on ``path``.
+	
+	"""
+	
+	def __init__(self, path, mode=0o600):
+		self.path = path #: A :py:obj:`string` of the path of the socket.
+		
+		self.lock = threading.Lock()
+		self.apps = {}
+		self.responses = TTLCache(maxsize=65536, ttl=3600)
+		
+		if os.path.exists(path):
+			probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			
+			try:
+				probe.connect(path)
+			
+			except socket.error:
+				os.remove(path)
+			
+			else:
+				raise ValueError('Bad path: a relay is already listening on {path!r}'.format(path=path))
+			
+			finally:
+				probe.close()
+		
+		# The socket is made with the umask's permissions as it's bound, so
+		# it's never, even briefly, more open than mode.
+		umask = os.umask(0o777 & ~mode)
+		try: self._server = ThreadingRelayServer(path, RelayRequestHandler)
+		finally: os.umask(umask)
+		
+		self._server.relay = self
+		self._thread = None
+	
+	def __unicode__(self):
+		return "Pushover Relay: {path}".format(path=self.path)
+	
+	__str__ = __unicode__
+	
+	def __repr__(self):
+		return 'RelayServer(path={path!r})'.format(path=self.path)
+	
+	def __enter__(self):
+		self.start()
+		return self
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.stop()
+	
+	def start(self):
+		"""
+		Starts relaying in a background thread.
+		
+		"""
+		
+		self._thread = threading.Thread(target=self._server.serve_forever)
+		self._thread.daemon = True
+		self._thread.start()
+	
+	def serve_forever(self):
+		"""
+		Relays in this thread until interrupted.
+		
+		"""
+		
+		self._server.serve_forever()
+	
+	def stop(self):
+		"""
+		Stops relaying, and removes the socket.
+		
+		"""
+		
+		if self._thread is not None:
+			self._server.shutdown()
+			self._thread.join()
+			self._thread = None
+		
+		self._server.server_close()
+		
+		try: os.remove(self.path)
+		except OSError: pass
+	
+	def get_app(self, token):
+		self.lock.acquire()
+		try:
+			if token not in self.apps:
+				self.apps[token] = Application(token, relay=False)
+			
+			return self.apps[token]
+		
+		finally:
+			self.lock.release()
+	
+	def relay(self, request):
+		"""
+		Makes a client's request, returning the reply to send it.
+		
+		"""
+		
+		reply = {'id': request.get('id')}
+		
+		try:
+			app = self.get_app(request['token'])
+			body = request.get('body')
+			key = (request['token'], request['request'], request.get('url'), body, tuple(sorted((request.get('data') or {}).items())))
+			
+			if request['request'] in CACHED_REQUESTS:
+				cached = self.responses.get(key)
+				
+				if cached is not None:
+					reply.update(cached)
+					return reply
+			
+			response, timestamp = app._request(
+				request['request'],
+				request.get('data') or {},
+				url=request.get('url'),
+				body=body.encode('utf-8') if body is not None else None,
+			)
+		
+		except APIError as error:
+			reply.update(error=error.response, code=error.code, timestamp=datetime_to_epoch(error.timestamp))
+			
+			if request['request'] == 'validate':
+				self.responses.set(key, {'error': error.response, 'code': error.code, 'timestamp': reply['timestamp']}, USER_NEGATIVE_TTL)
+		
+		except (KeyError, TypeError, ValueError) as error:
+			reply.update(failure='Bad relay request: {error!r}'.format(error=error))
+		
+		except (URLError, socket.error) as error:
+			reply.update(failure='{error}'.format(error=error))
+		
+		else:
+			reply.update(response=response, timestamp=datetime_to_epoch(timestamp))
+			
+			if request['request'] == 'message' and app.reset is not None:
+				reply.update(limit=app.limit, remaining=app.remaining, reset=datetime_to_epoch(app.reset))
+			
+			elif request['request'] in CACHED_REQUESTS:
+				self.responses.set(key, {'response': response, 'timestamp': reply['timestamp']})
+		
+		return reply
+
+
+class RelayClient(object):
+	"""
+	A connection, per thread, to a :class:`~chump.relay.RelayServer`.
+	
+	:param string path: Path of the relay's socket.
+	
+	"""
+	
+	def __init__(self, path):
+		self.path = path #: A :py:obj:`string` of the path of the relay's socket.
+		
+		self.local = threading.local()
+		self.lock = threading.Lock()
+		self.count = 0
+	
+	def __repr__(self):
+		return 'RelayClient(path={path!r})'.format(path=self.path)
+	
+	def _connection(self):
+		connection = getattr(self.local, 'connection', None)
+		
+		# A readable idle connection has been closed by the relay.
+		if connection is not None and select.select((connection,), (), (), 0)[0]:
+			connection.close()
+			connection = None
+		
+		if connection is None:
+			connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			
+			try:
+				connection.connect(self.path)
+			
+			except socket.error:
+				connection.close()
+				raise
+			
+			self.local.connection = connection
+			self.local.file = connection.makefile('rb')
+		
+		return connection
+	
+	def request(self, message):
+		"""
+		Sends ``message`` to the relay, returning its reply, or
+		:py:obj:`None` if the relay isn't running.
+		
+		:raises: :exc:`~urllib.error.URLError` if the relay was reached but
+			didn't reply, so the request may or may not have been made.
+		
+		"""
+		
+		try:
+			connection = self._connection()
+		
+		except socket.error as error:
+			if error.errno not in (errno.ENOENT, errno.ECONNREFUSED, errno.ENOTSOCK):
+				logger.warning('Relay at {path} is unreachable: {error}'.format(path=self.path, error=error))
+			
+			return None
+		
+		self.lock.acquire()
+		try:
+			self.count += 1
+			message['id'] = self.count
+		
+		finally:
+			self.lock.release()
+		
+		try:
+			connection.sendall(json.dumps(message).encode('utf-8') + b'\n')
+			line = self.local.file.readline()
+		
+		except socket.error as error:
+			line = None
+			reason = error
+		
+		else:
+			reason = 'Relay closed the connection'
+		
+		if not line:
+			connection.close()
+			self.local.connection = None
+			raise URLError(reason)
+		
+		return json.loads(line.decode('utf-8'))
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def relay_request(app, request, data, url, body):
+	"""
+	Makes a request of :meth:`~chump.Application._request` through the relay
+	at ``app.relay``, returning its result, or :py:obj:`None` if the relay
+	isn't running, so the request should be made directly. Requests, their
+	errors and the application's allotment are recorded in
+	:data:`~chump.metrics.registry` just as direct requests are, though the
+	latency recorded includes the relay's.
+	
+	"""
+	
+	if not hasattr(socket, 'AF_UNIX'):
+		return None
+	
+	from .metrics import registry
+	
+	_clients_lock.acquire()
+	try: client = _clients.setdefault(app.relay, RelayClient(app.relay))
+	finally: _clients_lock.release()
+	
+	started_at = clock()
+	
+	try:
+		reply = client.request({
+			'token': app.token,
+			'request': request,
+			'url': url,
+			'data': data,
+			'body': body.decode('utf-8') if body is not None else None,
+		})
+	
+	except URLError:
+		registry.observe(request, 0, clock() - started_at)
+		raise
+	
+	if reply is None:
+		return None
+	
+	elif 'failure' in reply:
+		registry.observe(request, 0, clock() - started_at)
+		raise URLError(reply['failure'])
+	
+	registry.observe(request, reply.get('code', 200), clock() - started_at)
+	timestamp = epoch_to_datetime(reply['timestamp'])
+	
+	if 'error' in reply:
+		# As Application._request raises it, with the URL and token it sent.
+		data = dict(data, token=app.token)
+		
+		if body is not None:
+			data.update(parse_qsl(body.decode('utf-8')))
+		
+		raise APIError(url if url is not None else ENDPOINT + REQUESTS[request]['path'], data, reply['error'], timestamp, reply.get('code'))
+	
+	if 'reset' in reply:
+		app.limit = reply['limit']
+		app.remaining = reply['remaining']
+		app.reset = epoch_to_datetime(reply['reset'])
+		registry.track(app)
+	
+	return (reply['response'], timestamp)
+
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description='Relays Pushover requests from local processes over one warm connection pool.')
+	parser.add_argument('--socket', default=os.environ.get(SOCKET_ENVIRONMENT_VARIABLE), required=SOCKET_ENVIRONMENT_VARIABLE not in os.environ, help='path of the Unix domain socket to listen on (default: ${variable})'.format(variable=SOCKET_ENVIRONMENT_VARIABLE))
+	parser.add_argument('--mode', type=lambda mode: int(mode, 8), default=0o600, help='permissions of the socket, in octal (default: 600)')
+	parser.add_argument('--log-level', default='WARNING', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'), help='(default: %(default)s)')
+	args = parser.parse_args(args)
+	
+	logging.basicConfig(level=args.log_level, format='%(asctime)s %(levelname)s %(message)s')
+	
+	try:
+		server = RelayServer(args.socket, args.mode)
+	
+	except (ValueError, socket.error) as error:
+		parser.error(str(error))
+	
+	logger.info('Relaying on {path}'.format(path=server.path))
+	
+	try:
+		server.serve_forever()
+	
+	except KeyboardInterrupt:
+		pass
+	
+	finally:
+		server.stop()
+
+
+if __name__ == '__main__':
+	main()
@@ -27,6 +27,13 @@ setup(
 	package_data={'': ['README.rst', 'HISTORY.rst', 'LICENSE']},
 	include_package_data=True,
 	zip_safe=False,
+	entry_points={
+		'console_scripts': [
+			'chump = chump.cli:main',
+			'chump-fake-server = chump.fake:main',
+			'chump-relay = chump.relay:main',
+		],
+	},
 	python_requires='>=2.7',
 	project_urls={
 		'Source': chump.__homepage__,
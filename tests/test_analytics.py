@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import json
+import random
+import unittest
+from datetime import timedelta
+
+import chump
+from chump.analytics import DeliveryAnalytics, QuantileSketch
+
+
+APP_TOKEN = 'a' * 30
+USER_TOKEN = 'u' * 30
+OTHER_TOKEN = 'o' * 30
+
+
+def exact_quantile(values, q):
+	# Matches QuantileSketch's rank, of q * (count - 1).
+	return sorted(values)[int(q * (len(values) - 1))]
+
+
+class QuantileSketchTest(unittest.TestCase):
+	def setUp(self):
+		rng = random.Random(1)
+		self.values = [rng.lognormvariate(0, 1.5) for _ in range(20000)]
+	
+	def test_relative_accuracy(self):
+		sketch = QuantileSketch(relative_accuracy=0.01)
+		
+		for value in self.values:
+			sketch.add(value)
+		
+		for q in (0, 0.01, 0.25, 0.5, 0.9, 0.99, 0.999, 1):
+			expected = exact_quantile(self.values, q)
+			self.assertLessEqual(abs(sketch.quantile(q) - expected), 0.01 * expected + 1e-9, q)
+		
+		self.assertEqual(len(sketch), len(self.values))
+		self.assertAlmostEqual(sketch.sum, sum(self.values))
+	
+	def test_empty_and_zeros(self):
+		sketch = QuantileSketch()
+		
+		self.assertIsNone(sketch.quantile(0.5))
+		self.assertIsNone(sketch.summary()['mean'])
+		
+		sketch.add(-1) # As from clock skew.
+		sketch.add(0)
+		
+		self.assertEqual(sketch.quantile(0.5), 0)
+	
+	def test_merge_matches_single_sketch(self):
+		single, first, second = QuantileSketch(), QuantileSketch(), QuantileSketch()
+		
+		for index, value in enumerate(self.values):
+			single.add(value)
+			(first if index % 2 else second).add(value)
+		
+		first.merge(second)
+		
+		self.assertEqual(first.buckets, single.buckets)
+		self.assertEqual((first.count, first.zeros, first.min, first.max), (single.count, single.zeros, single.min, single.max))
+		
+		for q in (0.5, 0.9, 0.99):
+			self.assertEqual(first.quantile(q), single.quantile(q))
+		
+		with self.assertRaises(ValueError):
+			first.merge(QuantileSketch(relative_accuracy=0.02))
+	
+	def test_dict_round_trip(self):
+		sketch = QuantileSketch()
+		
+		for value in self.values[:1000]:
+			sketch.add(value)
+		
+		loaded = QuantileSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+		
+		self.assertEqual(loaded.to_dict(), sketch.to_dict())
+		self.assertEqual(loaded.quantile(0.9), sketch.quantile(0.9))
+	
+	def test_collapse_at_max_buckets(self):
+		sketch = QuantileSketch(max_buckets=100) # Spanning about 7x below the largest value.
+		
+		for value in self.values:
+			sketch.add(value)
+		
+		self.assertEqual(len(sketch.buckets), 100)
+		self.assertEqual(sum(sketch.buckets.values()) + sketch.zeros, len(self.values))
+		
+		# The highest quantiles keep their accuracy; the lowest are merged up.
+		expected = exact_quantile(self.values, 0.999)
+		self.assertLessEqual(abs(sketch.quantile(0.999) - expected), 0.01 * expected)
+		self.assertGreater(sketch.quantile(0.01), 1.01 * exact_quantile(self.values, 0.01))
+
+
+class DeliveryAnalyticsTest(unittest.TestCase):
+	def setUp(self):
+		self.user = chump.Application(APP_TOKEN).get_user(USER_TOKEN)
+		self.analytics = DeliveryAnalytics()
+	
+	def message(self, receipt, delivered_after=None, acknowledged_after=None):
+		message = self.user.create_message('Disk full', priority=chump.EMERGENCY, defer_validation=True)
+		message.receipt = receipt
+		message.sent_at = chump.epoch_to_datetime(1500000000)
+		
+		if delivered_after is not None:
+			message.last_delivered_at = chump.epoch_to_datetime(1500000000 + delivered_after)
+		
+		if acknowledged_after is not None:
+			message.is_acknowledged = True
+			message.acknowledged_at = chump.epoch_to_datetime(1500000000 + acknowledged_after)
+			message.acknowledged_by = self.user.app.get_user(OTHER_TOKEN)
+		
+		return message
+	
+	def test_counts_each_receipt_once(self):
+		message = self.message('r' * 30)
+		self.analytics.observe(message) # Polled before delivery.
+		
+		message.last_delivered_at = message.sent_at + timedelta(seconds=5)
+		self.analytics.observe(message)
+		self.analytics.observe(message)
+		
+		message.last_delivered_at = message.sent_at + timedelta(seconds=50) # Pushover's last delivery.
+		message.is_acknowledged = True
+		message.acknowledged_at = message.sent_at + timedelta(seconds=65)
+		
+		for _ in range(3):
+			self.analytics.observe(message)
+		
+		snapshot = self.analytics.snapshot()
+		
+		self.assertEqual(snapshot['delivery']['all']['count'], 1)
+		self.assertAlmostEqual(snapshot['delivery']['all']['max'], 5)
+		self.assertEqual(snapshot['acknowledgement']['all']['count'], 1)
+		self.assertAlmostEqual(snapshot['acknowledgement']['all']['max'], 60) # From the first delivery seen.
+	
+	def test_dimensions(self):
+		self.analytics.observe(self.message('a' * 30, delivered_after=2, acknowledged_after=10))
+		self.analytics.observe(self.message('b' * 30, delivered_after=4))
+		
+		snapshot = self.analytics.snapshot(sketches=True)
+		
+		self.assertEqual(snapshot['delivery']['user'][USER_TOKEN]['count'], 2)
+		self.assertEqual(snapshot['delivery']['device']['*']['count'], 2)
+		self.assertEqual(snapshot['delivery']['priority']['2']['count'], 2)
+		self.assertEqual(snapshot['acknowledgement']['acknowledged_by'][OTHER_TOKEN]['count'], 1)
+		self.assertIn('sketch', snapshot['delivery']['all'])
+		json.dumps(snapshot)
+	
+	def test_unsent_ignored(self):
+		message = self.message('r' * 30, delivered_after=1)
+		message.sent_at = None
+		self.analytics.observe(message)
+		
+		self.assertEqual(self.analytics.snapshot()['delivery']['all']['count'], 0)
+	
+	def test_bounded(self):
+		analytics = DeliveryAnalytics(max_keys=2, max_receipts=3)
+		
+		for index in range(5):
+			message = self.message('{index:030d}'.format(index=index), delivered_after=1)
+			message.device = 'device{index}'.format(index=index)
+			analytics.observe(message)
+		
+		self.assertEqual(len(analytics.receipts), 3)
+		self.assertEqual(sorted(analytics.snapshot()['delivery']['device']), ['device3', 'device4'])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import unittest
+
+import chump
+from chump import application_pool
+from chump.application_pool import ApplicationPool
+from chump.fake import FakeServer
+
+
+TOKENS = ('a' * 30, 'b' * 30, 'c' * 30)
+USER_TOKEN = 'u' * 30
+
+
+def user_token(index):
+	return '{index:030d}'.format(index=index)
+
+
+class ApplicationPoolTest(unittest.TestCase):
+	def test_empty(self):
+		with self.assertRaises(ValueError):
+			ApplicationPool([])
+	
+	def test_routes_by_remaining(self):
+		pool = ApplicationPool(TOKENS)
+		pool.apps[0].remaining, pool.apps[1].remaining = 5, 10
+		
+		self.assertEqual([app.token for app in pool.route(USER_TOKEN)], [TOKENS[2], TOKENS[1], TOKENS[0]]) # Unknown first.
+		
+		pool.apps[2].remaining = 1
+		
+		self.assertEqual(pool.route(USER_TOKEN)[0].token, TOKENS[1])
+		self.assertEqual(pool.remaining, 16)
+	
+	def test_sticky_routes(self):
+		pool = ApplicationPool(TOKENS, sticky=True)
+		firsts = dict((user_token(index), pool.route(user_token(index))[0].token) for index in range(60))
+		
+		self.assertEqual(set(firsts.values()), set(TOKENS)) # Users are spread over every application.
+		self.assertEqual(firsts, dict((token, ApplicationPool(TOKENS, sticky=True).route(token)[0].token) for token in firsts))
+		
+		# Removing an application only moves its own users.
+		smaller = ApplicationPool(TOKENS[:2], sticky=True)
+		
+		for token, first in firsts.items():
+			if first != TOKENS[2]:
+				self.assertEqual(smaller.route(token)[0].token, first)
+	
+	def test_fails_over_past_exhausted(self):
+		pool = ApplicationPool(TOKENS[:2])
+		
+		with FakeServer() as fake:
+			fake.remaining[TOKENS[0]] = 0
+			pool.apps[1].remaining = 0 # Stale, so the exhausted one is tried first.
+			
+			message = pool.get_user(USER_TOKEN).send_message('Disk full')
+			
+			self.assertTrue(message.is_sent)
+			self.assertIs(message.user.app, pool.apps[1])
+			self.assertIn(TOKENS[0], pool.exhausted)
+			self.assertEqual(pool.route(USER_TOKEN)[-1].token, TOKENS[0]) # Skipped until its reset.
+			
+			fake.remaining[TOKENS[1]] = 0
+			message = pool.send_message(USER_TOKEN, 'Disk full')
+		
+		self.assertFalse(message.is_sent)
+		self.assertTrue(message.error.is_over_limit)
+	
+	def test_users_bounded(self):
+		max_users, application_pool.MAX_USERS = application_pool.MAX_USERS, 3
+		
+		try:
+			pool = ApplicationPool(TOKENS[:1])
+		
+		finally:
+			application_pool.MAX_USERS = max_users
+		
+		with FakeServer():
+			for index in range(5):
+				self.assertTrue(pool.send_message(user_token(index), 'Disk full').is_sent)
+			
+			user = pool._user(pool.apps[0], user_token(4))
+		
+		self.assertEqual(len(pool.users), 3)
+		self.assertIs(pool._user(pool.apps[0], user_token(4)), user) # Recent users are kept.
+		self.assertIsInstance(user, chump.User)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import unittest
+
+import chump
+from chump.cache import FileCache
+from chump.fake import SOUNDS, FakeServer
+
+
+def wait_for(condition, timeout=5):
+	deadline = time.time() + timeout
+	
+	while not condition() and time.time() < deadline:
+		time.sleep(0.01)
+	
+	return condition()
+
+
+class FileCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix='chump-test-')
+		self.path = os.path.join(self.directory, 'cache.json')
+	
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+	
+	def test_set_and_get(self):
+		cache = FileCache(self.path)
+		cache.set('a', [True, {'bike': 'Bike'}])
+		cache.set('b', [False, None])
+		
+		value, age = FileCache(self.path).get('a')
+		
+		self.assertEqual(value, [True, {'bike': 'Bike'}])
+		self.assertTrue(0 <= age < 1)
+		self.assertEqual(cache.get('b')[0], [False, None])
+		self.assertIsNone(cache.get('c'))
+		self.assertEqual(os.listdir(self.directory), ['cache.json']) # No temporary files left.
+	
+	def test_expired(self):
+		cache = FileCache(self.path, ttl=0.05)
+		cache.set('a', 1)
+		time.sleep(0.1)
+		
+		self.assertIsNone(cache.get('a'))
+	
+	def test_missing_or_corrupt(self):
+		cache = FileCache(self.path)
+		
+		self.assertIsNone(cache.get('a'))
+		
+		with open(self.path, 'w') as cache_file:
+			cache_file.write('{"a": ')
+		
+		self.assertIsNone(cache.get('a'))
+		
+		cache.set('a', 1)
+		
+		self.assertEqual(cache.get('a')[0], 1)
+	
+	def test_pickle(self):
+		cache = pickle.loads(pickle.dumps(FileCache(self.path, ttl=60)))
+		cache.set('a', 1)
+		
+		self.assertEqual((cache.ttl, cache.refresh_after), (60, 30))
+		self.assertEqual(cache.get('a')[0], 1)
+
+
+class ApplicationCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix='chump-test-')
+		self.cache = FileCache(os.path.join(self.directory, 'cache.json'), refresh_after=0)
+		self.token = 'c' * 30
+		self.cache.set(self.token, (True, {'stale': 'Stale'}))
+	
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+	
+	def test_stale_while_refresh(self):
+		with FakeServer() as fake:
+			app = chump.Application(self.token, cache=self.cache)
+			
+			self.assertTrue(app._is_authenticated)
+			self.assertIn('stale', app._sounds) # Used while it's refreshed.
+			self.assertTrue(wait_for(lambda: self.cache.get(self.token)[0][1] == SOUNDS))
+		
+		self.assertEqual(fake.stats['requests'], 1)
+		self.assertEqual(app.sounds, SOUNDS)
+	
+	def test_refresh_failure_logged(self):
+		with FakeServer(reset_rate=1):
+			with self.assertLogs('chump', 'WARNING') as logs:
+				app = chump.Application(self.token, cache=self.cache)
+				
+				self.assertTrue(wait_for(lambda: logs.records))
+		
+		self.assertIn('Could not refresh application cache', logs.output[0])
+		self.assertIn('stale', app._sounds)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import threading
+import unittest
+
+import chump
+from chump.callback import CallbackServer
+
+try: # Python 3
+	from urllib.error import HTTPError
+	from urllib.parse import urlencode
+	from urllib.request import urlopen
+
+except ImportError: # Python 2
+	from urllib import urlencode
+	from urllib2 import HTTPError, urlopen
+
+
+APP_TOKEN = 'a' * 30
+USER_TOKEN = 'u' * 30
+OTHER_TOKEN = 'o' * 30
+RECEIPT = 'r' * 30
+
+
+class CallbackServerTest(unittest.TestCase):
+	def setUp(self):
+		self.server = CallbackServer(host='127.0.0.1', fallback_interval=None)
+		self.server.start()
+		
+		self.user = chump.Application(APP_TOKEN).get_user(USER_TOKEN)
+		self.message = self.user.create_message('Disk full', priority=chump.EMERGENCY, callback=self.server.url, defer_validation=True)
+		self.message.receipt = RECEIPT
+	
+	def tearDown(self):
+		self.server.stop()
+	
+	def post(self, data):
+		return urlopen(self.server.url, urlencode(data).encode('utf-8'), timeout=5).getcode()
+	
+	def test_acknowledgement(self):
+		self.server.track(self.message)
+		
+		self.assertEqual(self.post({
+			'receipt': RECEIPT,
+			'acknowledged': '1',
+			'acknowledged_at': '1500000000',
+			'acknowledged_by': OTHER_TOKEN,
+		}), 200)
+		
+		self.assertTrue(self.message.is_called_back)
+		self.assertTrue(self.message.is_acknowledged)
+		self.assertEqual(chump.datetime_to_epoch(self.message.acknowledged_at), 1500000000)
+		self.assertEqual(self.message.acknowledged_by.token, OTHER_TOKEN)
+		self.assertEqual(len(self.server.messages), 0)
+	
+	def test_acknowledged_by_recipient(self):
+		self.server.track(self.message)
+		self.post({'receipt': RECEIPT, 'acknowledged': '1', 'acknowledged_by': USER_TOKEN})
+		
+		self.assertIs(self.message.acknowledged_by, self.user)
+	
+	def test_untracked_receipt(self):
+		with self.assertRaises(HTTPError) as context:
+			self.post({'receipt': RECEIPT, 'acknowledged': '1'})
+		
+		self.assertEqual(context.exception.code, 404)
+		self.assertFalse(self.message.is_acknowledged)
+	
+	def test_stop_unstarted(self):
+		server = CallbackServer(host='127.0.0.1')
+		thread = threading.Thread(target=server.stop)
+		thread.daemon = True
+		thread.start()
+		thread.join(5)
+		
+		self.assertFalse(thread.is_alive())
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import io
+import json
+import unittest
+
+from chump.cli import Feed
+from chump.fake import FakeServer
+
+
+APP_TOKEN = 'a' * 30
+USER_TOKEN = 'u' * 30
+
+
+class FeedTest(unittest.TestCase):
+	def run_feed(self, *specs):
+		output = io.StringIO()
+		feed = Feed(output, token=APP_TOKEN, concurrency=2)
+		
+		with FakeServer():
+			succeeded = feed.run(json.dumps(spec) for spec in specs)
+		
+		results = dict((result['id'], result) for result in map(json.loads, output.getvalue().splitlines()))
+		
+		return feed, succeeded, results
+	
+	def test_sends(self):
+		feed, succeeded, results = self.run_feed(
+			{'id': 'a', 'user': USER_TOKEN, 'message': 'Disk full'},
+			{'id': 'b', 'user': USER_TOKEN, 'message': 'Disk full', 'priority': 1},
+		)
+		
+		self.assertTrue(succeeded)
+		self.assertEqual(feed.sent, 2)
+		self.assertIsNone(results['a']['error'])
+		self.assertIsNotNone(results['b']['request'])
+	
+	def test_bad_line_doesnt_stop_feed(self):
+		feed, succeeded, results = self.run_feed(
+			{'user': USER_TOKEN},
+			{'user': USER_TOKEN, 'message': 'Disk full'},
+		)
+		
+		self.assertFalse(succeeded)
+		self.assertIn('Bad line', results[1]['error'])
+		self.assertIsNone(results[2]['error'])
+	
+	def test_unreadable_attachment_doesnt_stop_feed(self):
+		feed, succeeded, results = self.run_feed(
+			{'user': USER_TOKEN, 'message': 'Disk full', 'attachment': '/nonexistent/chart.png'},
+			{'user': USER_TOKEN, 'message': 'Disk full'},
+		)
+		
+		self.assertFalse(succeeded)
+		self.assertEqual((feed.sent, feed.failed), (1, 1))
+		self.assertIsNotNone(results[1]['error'])
+		self.assertIsNone(results[2]['error'])
+
+
+if __name__ == '__main__':
+	unittest.main()
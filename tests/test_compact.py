@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import json
+import unittest
+
+import chump
+from chump.fake import FakeServer
+
+
+APP_TOKEN = 'a' * 30
+USER_TOKEN = 'u' * 30
+
+
+class CompactTest(unittest.TestCase):
+	def setUp(self):
+		self.app = chump.Application(APP_TOKEN)
+		self.user = self.app.get_user(USER_TOKEN)
+	
+	def round_trip(self, message):
+		return chump.Message.from_compact(tuple(json.loads(json.dumps(message.to_compact()))), self.app)
+	
+	def test_message(self):
+		message = self.user.create_message('Disk full', title='db1', url='https://example.com', priority=chump.HIGH, timestamp=1500000000, defer_validation=True)
+		copy = self.round_trip(message)
+		
+		self.assertIs(copy.__class__, chump.Message)
+		self.assertIs(copy.user.app, self.app)
+		self.assertEqual(copy.user.token, USER_TOKEN)
+		
+		for name in chump.Message._compact_fields:
+			self.assertEqual(getattr(copy, name), getattr(message, name), name)
+	
+	def test_sent_emergency_message(self):
+		with FakeServer():
+			message = self.user.send_message('Disk full', priority=chump.EMERGENCY, tags=('db', 'disk'))
+		
+		copy = self.round_trip(message)
+		
+		self.assertIs(copy.__class__, chump.EmergencyMessage)
+		
+		for name in chump.EmergencyMessage._compact_fields:
+			self.assertEqual(getattr(copy, name), getattr(message, name), name)
+	
+	def test_cancel_by_tag_marks_original_and_copy(self):
+		with FakeServer():
+			message = self.user.send_message('Disk full', priority=chump.EMERGENCY, tags='disk')
+			copy = self.round_trip(message)
+			
+			self.app.cancel_by_tag('disk')
+		
+		self.assertTrue(message.is_cancelled)
+		self.assertTrue(copy.is_cancelled)
+	
+	def test_other_app_rejected(self):
+		message = self.user.create_message('Disk full', defer_validation=True)
+		
+		with self.assertRaises(ValueError):
+			chump.Message.from_compact(message.to_compact(), chump.Application('b' * 30))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import logging
+import threading
+import unittest
+
+import chump
+from chump.handlers import PushoverHandler
+
+
+class Sent(object):
+	error = None
+
+
+class StubUser(object):
+	# Records messages rather than sending them, optionally waiting until released.
+	def __init__(self, blocking=False):
+		self.sent = []
+		self.entered = threading.Event()
+		self.released = threading.Event()
+		
+		if not blocking:
+			self.released.set()
+	
+	def send_message(self, message, **kwargs):
+		self.entered.set()
+		self.released.wait(10)
+		self.sent.append(dict(kwargs, message=message))
+		
+		return Sent()
+
+
+class PushoverHandlerTest(unittest.TestCase):
+	def setUp(self):
+		self.logger = logging.getLogger('tests.handlers')
+		self.logger.propagate = False
+		self.handlers = []
+	
+	def tearDown(self):
+		for handler in self.handlers:
+			self.logger.removeHandler(handler)
+			handler.close()
+	
+	def handler(self, user, **kwargs):
+		handler = PushoverHandler(user, **kwargs)
+		self.logger.addHandler(handler)
+		self.handlers.append(handler)
+		
+		return handler
+	
+	def test_sends_with_priority(self):
+		user = StubUser()
+		handler = self.handler(user)
+		
+		self.logger.warning('Below the level')
+		self.logger.error('Disk full')
+		self.logger.critical('Disk gone')
+		handler.flush()
+		
+		self.assertEqual([(sent['message'], sent['priority'], sent['title']) for sent in user.sent], [
+			('Disk full', chump.HIGH, 'ERROR: tests.handlers'),
+			('Disk gone', chump.EMERGENCY, 'CRITICAL: tests.handlers'),
+		])
+	
+	def test_rate_limited(self):
+		user = StubUser()
+		handler = self.handler(user, rate=2, per=60)
+		
+		for index in range(5):
+			self.logger.error('Disk {index} full'.format(index=index))
+		
+		handler.flush()
+		
+		self.assertEqual(len(user.sent), 2)
+		self.assertEqual(handler.dropped, 3)
+	
+	def test_repeats_suppressed_and_counted(self):
+		user = StubUser()
+		handler = self.handler(user)
+		log = lambda: self.logger.error('Disk full') # Repeats are from the same line.
+		
+		for _ in range(3):
+			log()
+		
+		handler.flush()
+		
+		self.assertEqual(len(user.sent), 1)
+		self.assertEqual(handler.suppressed, 2)
+		
+		handler.dedupe_interval = 0 # As if it's passed.
+		log()
+		handler.flush()
+		
+		self.assertEqual(len(user.sent), 2)
+		self.assertEqual(user.sent[1]['title'], 'ERROR: tests.handlers (+2 repeats)')
+	
+	def test_chump_loggers_skipped(self):
+		user = StubUser()
+		handler = self.handler(user)
+		chump.logger.addHandler(handler)
+		
+		try: logging.getLogger('chump.tests').error('Failed to send')
+		finally: chump.logger.removeHandler(handler)
+		
+		handler.flush()
+		
+		self.assertEqual(user.sent, [])
+	
+	def test_full_queue_drops(self):
+		user = StubUser(blocking=True)
+		handler = self.handler(user, capacity=1)
+		
+		self.logger.error('Disk 1 full')
+		self.assertTrue(user.entered.wait(5)) # Taken off the queue, and being sent.
+		
+		self.logger.error('Disk 2 full') # Queued.
+		self.logger.error('Disk 3 full') # Dropped.
+		
+		self.assertEqual(handler.dropped, 1)
+		
+		user.released.set()
+		handler.flush()
+		
+		self.assertEqual([sent['message'] for sent in user.sent], ['Disk 1 full', 'Disk 2 full'])
+
+
+if __name__ == '__main__':
+	unittest.main()
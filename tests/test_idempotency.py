@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import time
+import unittest
+
+import chump
+from chump import connection_pool
+from chump.fake import FakeServer
+from chump.idempotency import AMBIGUOUS, MemoryKeyStore
+
+try: from urllib.error import URLError # Python 3
+except ImportError: from urllib2 import URLError # Python 2
+
+
+APP_TOKEN = 'a' * 30
+USER_TOKEN = 'u' * 30
+
+
+class IdempotencyTest(unittest.TestCase):
+	def setUp(self):
+		self.key_store = MemoryKeyStore()
+		self.user = chump.Application(APP_TOKEN, key_store=self.key_store).get_user(USER_TOKEN)
+	
+	def test_reset_after_write_not_retried(self):
+		with FakeServer() as fake:
+			self.assertTrue(self.user.send_message('Disk full').is_sent) # Leaves a free connection to reuse.
+			
+			fake.rates = (('reset', 1),)
+			requests = fake.stats['requests']
+			message = self.user.create_message('Disk full')
+			
+			with self.assertRaises(URLError):
+				message.send()
+		
+		self.assertEqual(fake.stats['requests'], requests + 1)
+		self.assertEqual(self.key_store.get(message.idempotency_key)['state'], AMBIGUOUS)
+	
+	def test_stale_connection_discarded(self):
+		with FakeServer(drop_rate=1):
+			self.assertTrue(self.user.send_message('Disk full').is_sent)
+			time.sleep(0.1) # For the close to arrive.
+			
+			discarded = connection_pool.handler.discarded
+			
+			self.assertTrue(self.user.send_message('Disk full').is_sent)
+			self.assertEqual(connection_pool.handler.discarded, discarded + 1)
+	
+	def test_local_error_not_ambiguous(self):
+		def fail(message):
+			raise ValueError('Bad payload')
+		
+		message = self.user.create_message('Disk full')
+		payload, chump.Message._payload = chump.Message._payload, fail
+		
+		try:
+			with self.assertRaises(ValueError):
+				message.send()
+		
+		finally:
+			chump.Message._payload = payload
+		
+		self.assertIsNone(self.key_store.get(message.idempotency_key))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+from importtime import DEFERRED, ROOT, measure
+
+
+# Milliseconds import chump may take, of its own modules and in all. Far
+# above what it takes, (a few ms, and tens), so only regressions fail.
+OWN_BUDGET = 25
+TOTAL_BUDGET = 250
+
+
+class ImportTimeTest(unittest.TestCase):
+	def test_deferred_modules_not_imported(self):
+		output = subprocess.check_output(
+			[sys.executable, '-c', 'import json, sys, chump; print(json.dumps(sorted(sys.modules)))'],
+			env=dict(os.environ, PYTHONPATH=ROOT),
+		)
+		
+		self.assertEqual(sorted(set(json.loads(output.decode('utf-8'))) & set(DEFERRED)), [])
+	
+	def test_budget(self):
+		measure() # Once to write bytecode, so compiling isn't measured.
+		
+		microseconds, modules = min((measure() for _ in range(3)), key=lambda result: result[0])
+		own = sum(self_microseconds for name, self_microseconds in modules if name == 'chump' or name.startswith('chump.'))
+		
+		self.assertLess(own / 1000, OWN_BUDGET)
+		self.assertLess(microseconds / 1000, TOTAL_BUDGET)
+		self.assertEqual(sorted(set(name for name, _ in modules) & set(DEFERRED)), [])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import unittest
+
+import chump
+from chump.fake import FakeServer
+
+
+APP_TOKEN = 'a' * 30
+USER_TOKEN = 'u' * 30
+
+
+class MetricsTest(unittest.TestCase):
+	def test_snapshot_after_send(self):
+		with FakeServer():
+			message = chump.Application(APP_TOKEN).get_user(USER_TOKEN).send_message('Disk full')
+		
+		self.assertTrue(message.is_sent)
+		
+		snapshot = chump.metrics.registry.snapshot()
+		
+		self.assertGreaterEqual(snapshot['requests'][('message', 200)], 1)
+		self.assertGreaterEqual(snapshot['latencies']['message']['count'], 1)
+		self.assertIn('chump_requests_total{request="message",code="200"}', chump.metrics.registry.to_prometheus())
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import chump
+from chump.fake import FakeServer
+from chump.recorder import Recorder, ReplayTransport
+
+try: from urllib.error import URLError # Python 3
+except ImportError: from urllib2 import URLError # Python 2
+
+
+APP_TOKEN = 'a' * 30
+USER_TOKEN = 'u' * 30
+UNKNOWN_TOKEN = 'x' * 30
+
+
+class RecorderTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix='chump-test-')
+		self.path = os.path.join(self.directory, 'requests.log')
+	
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+	
+	def send_all(self, app, fake=None):
+		# The outcomes of a success, an error from Pushover, and a failure to reach it.
+		outcomes = [
+			app.get_user(USER_TOKEN).send_message('Disk full').id,
+			app.get_user(UNKNOWN_TOKEN).send_message('Disk full', defer_validation=True).error.bad_inputs,
+		]
+		
+		if fake is not None:
+			fake.rates = (('reset', 1),)
+		
+		with self.assertRaises(URLError):
+			app.get_user(USER_TOKEN).send_message('Disk full')
+		
+		return outcomes
+	
+	def test_record_then_replay(self):
+		with FakeServer(users={USER_TOKEN: ['phone']}) as fake:
+			with Recorder(self.path) as recorder:
+				recorded = self.send_all(chump.Application(APP_TOKEN, transport=recorder), fake)
+		
+		with io.open(self.path, 'rb') as log:
+			content = log.read().decode('utf-8')
+		
+		entries = [json.loads(line) for line in content.splitlines()]
+		
+		self.assertEqual([entry.get('c') for entry in entries], [200, 400, None])
+		self.assertIn('f', entries[2])
+		self.assertNotIn(APP_TOKEN, content)
+		self.assertNotIn(USER_TOKEN, content)
+		
+		replayed = self.send_all(chump.Application(APP_TOKEN, transport=ReplayTransport(self.path, speed=None)))
+		
+		self.assertEqual(replayed, recorded)
+		self.assertIsNotNone(replayed[0])
+	
+	def test_replay_runs_out(self):
+		with io.open(self.path, 'wb'):
+			pass
+		
+		with self.assertRaises(URLError):
+			chump.Application(APP_TOKEN, transport=ReplayTransport(self.path)).get_user(USER_TOKEN).send_message('Disk full', defer_validation=True)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import unittest
+
+import chump
+from chump.cache import USER_NEGATIVE_TTL, clock, user_cache
+from chump.fake import SOUNDS, FakeServer
+from chump.relay import RelayServer
+
+
+APP_TOKEN = 'a' * 30
+USER_TOKEN = 'u' * 30
+UNKNOWN_TOKEN = 'x' * 30
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'needs Unix domain sockets')
+class RelayTest(unittest.TestCase):
+	def setUp(self):
+		user_cache.clear()
+		
+		self.directory = tempfile.mkdtemp(prefix='chump-test-')
+		self.path = os.path.join(self.directory, 'relay.sock')
+		
+		self.fake = FakeServer(users={USER_TOKEN: ['phone']}).__enter__()
+	
+	def tearDown(self):
+		self.fake.__exit__(None, None, None)
+		shutil.rmtree(self.directory)
+	
+	def app(self):
+		return chump.Application(APP_TOKEN, relay=self.path)
+	
+	def test_send(self):
+		with RelayServer(self.path) as server:
+			app = self.app()
+			message = app.get_user(USER_TOKEN).send_message('Disk full')
+		
+		self.assertIn(APP_TOKEN, server.apps) # Sent through the relay.
+		self.assertTrue(message.is_sent)
+		self.assertIsNotNone(message.id)
+		self.assertEqual(self.fake.stats['messages'], 1)
+		self.assertEqual(app.remaining, app.limit - 1)
+	
+	def test_socket_mode(self):
+		with RelayServer(self.path):
+			self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+	
+	def test_api_error_passthrough(self):
+		with RelayServer(self.path):
+			message = self.app().get_user(UNKNOWN_TOKEN).send_message('Disk full', defer_validation=True)
+		
+		self.assertFalse(message.is_sent)
+		self.assertIsInstance(message.error, chump.APIError)
+		self.assertEqual(message.error.code, 400)
+		self.assertIn('user', message.error.bad_inputs)
+		self.assertEqual(message.error.url, chump.ENDPOINT + chump.REQUESTS['message']['path'])
+		self.assertEqual(message.error.request['token'], APP_TOKEN)
+	
+	def test_cached_responses(self):
+		with RelayServer(self.path) as server:
+			self.assertEqual(self.app().sounds, SOUNDS)
+			self.assertEqual(self.app().sounds, SOUNDS)
+			
+			self.assertTrue(self.app().get_user(USER_TOKEN).is_authenticated)
+			user_cache.clear()
+			self.assertEqual(self.app().get_user(USER_TOKEN).devices, set(['phone']))
+			
+			self.assertFalse(self.app().get_user(UNKNOWN_TOKEN).is_authenticated)
+			user_cache.clear()
+			self.assertFalse(self.app().get_user(UNKNOWN_TOKEN).is_authenticated)
+			
+			self.assertEqual(self.fake.stats['requests'], 3) # One each of the sounds, and of the users.
+			
+			expiries = dict((key[3] or dict(key[4]).get('user'), expires_at - clock()) for key, (expires_at, _) in server.responses.entries.items())
+		
+		self.assertLessEqual(expiries[UNKNOWN_TOKEN], USER_NEGATIVE_TTL)
+		self.assertGreater(expiries[USER_TOKEN], USER_NEGATIVE_TTL)
+	
+	def test_stale_socket_replaced(self):
+		stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		stale.bind(self.path)
+		stale.close() # Leaving the socket file, with nothing listening.
+		
+		with RelayServer(self.path):
+			self.assertTrue(self.app().get_user(USER_TOKEN).send_message('Disk full').is_sent)
+			
+			with self.assertRaises(ValueError):
+				RelayServer(self.path)
+	
+	def test_fallback_without_relay(self):
+		message = self.app().get_user(USER_TOKEN).send_message('Disk full')
+		
+		self.assertTrue(message.is_sent)
+		self.assertEqual(self.fake.stats['messages'], 1)
+		self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+	unittest.main()
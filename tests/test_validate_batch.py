@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+import unittest
+
+import chump
+from chump.cache import user_cache
+from chump.fake import FakeServer
+
+try: from urllib.error import URLError # Python 3
+except ImportError: from urllib2 import URLError # Python 2
+
+
+USER_TOKEN = 'u' * 30
+
+
+class ValidateBatchTest(unittest.TestCase):
+	def setUp(self):
+		user_cache.clear()
+	
+	def test_sound_after_validate_users(self):
+		app = chump.Application('b' * 30)
+		
+		with FakeServer(users={USER_TOKEN: ['phone']}):
+			dict(app.validate_users([USER_TOKEN])) # Authenticates the application, without loading its sounds.
+			
+			results = chump.validate_batch([
+				{'user': USER_TOKEN, 'message': 'Disk full', 'sound': 'bike'},
+				{'user': USER_TOKEN, 'message': 'Disk full', 'sound': 'nosuch'},
+			], app=app)
+		
+		self.assertEqual(results[0][1], [])
+		self.assertIsNotNone(results[0][0])
+		self.assertIsNone(results[1][0])
+		self.assertIn('Bad sound', '{error}'.format(error=results[1][1][0]))
+	
+	def test_server_error_authenticates_once(self):
+		app = chump.Application('c' * 30)
+		
+		with FakeServer(error_rate=1) as fake:
+			results = chump.validate_batch([{'user': USER_TOKEN, 'message': 'Disk full', 'sound': 'bike'}] * 5, app=app)
+		
+		self.assertEqual(fake.stats['requests'], 1)
+		
+		for message, errors in results:
+			self.assertIsNone(message)
+			self.assertIsInstance(errors[0], chump.APIError)
+	
+	def test_transport_error_recorded(self):
+		app = chump.Application('d' * 30)
+		
+		with FakeServer(reset_rate=1):
+			results = chump.validate_batch([
+				{'user': USER_TOKEN, 'message': 'Disk full', 'device': 'phone'},
+				{'user': USER_TOKEN, 'message': 'Disk full'},
+			], app=app)
+		
+		self.assertIsNone(results[0][0])
+		self.assertIsInstance(results[0][1][0], URLError)
+		self.assertIsNotNone(results[1][0]) # Needed nothing fetched.
+	
+	def test_priority_range_agrees(self):
+		user = chump.Application('e' * 30).get_user(USER_TOKEN)
+		
+		with self.assertRaises(ValueError):
+			user.create_message('Disk full', priority=7, defer_validation=True)
+		
+		self.assertIsInstance(chump.validate_batch([{'user': USER_TOKEN, 'message': 'Disk full', 'priority': 7}], app=user.app)[0][1][0], ValueError)
+	
+	def test_bad_rows_dont_stop_batch(self):
+		results = chump.validate_batch([
+			{'user': USER_TOKEN, 'message': 'Disk full', 'priority': chump.EMERGENCY, 'tags': 5},
+			{'user': USER_TOKEN, 'message': 'Disk full', 'timestamp': 10 ** 20},
+			{'user': USER_TOKEN, 'message': 'Disk full', 'priority': 1.0},
+		], app='f' * 30)
+		
+		self.assertIsInstance(results[0][1][0], TypeError)
+		self.assertIsInstance(results[1][1][0], TypeError)
+		self.assertEqual(results[2][1], [])
+		self.assertEqual(results[2][0].priority, chump.HIGH)
+
+
+if __name__ == '__main__':
+	unittest.main()